@@ -0,0 +1,159 @@
+// Mosaicos vectoriales de los municipios (/tiles/{z}/{x}/{y}.mvt, mosaicos.py) dibujados en canvas.
+// dash-leaflet no trae una capa de mosaicos vectoriales, así que aquí se decodifica el protobuf y una
+// capa L.GridLayer dibuja cada mosaico; app.py la agrega con el evento 'add' de un dl.LayerGroup
+(function() {
+    function leerVarint(lector) {
+        let valor = 0, factor = 1, byte;
+        do {
+            byte = lector.bytes[lector.pos++];
+            valor += (byte & 0x7f) * factor;
+            factor *= 128;
+        } while (byte & 0x80);
+        return valor;
+    }
+
+    // Recorre los campos de un mensaje: los varint llegan como valor y los de longitud como [inicio, fin)
+    function campos(bytes, inicio, fin, alLeer) {
+        const lector = {bytes: bytes, pos: inicio};
+        while (lector.pos < fin) {
+            const llave = leerVarint(lector);
+            const numero = Math.floor(llave / 8), tipo = llave & 7;
+            if (tipo === 0) {
+                alLeer(numero, leerVarint(lector));
+            } else if (tipo === 2) {
+                const largo = leerVarint(lector);
+                alLeer(numero, null, lector.pos, lector.pos + largo);
+                lector.pos += largo;
+            } else {
+                lector.pos += tipo === 1 ? 8 : 4;
+            }
+        }
+    }
+
+    function empaquetados(bytes, inicio, fin) {
+        const lector = {bytes: bytes, pos: inicio}, valores = [];
+        while (lector.pos < fin) {
+            valores.push(leerVarint(lector));
+        }
+        return valores;
+    }
+
+    // Capas del mosaico con sus features (propiedades y comandos de geometría sin decodificar)
+    function decodificar(buffer) {
+        const bytes = new Uint8Array(buffer), texto = new TextDecoder();
+        const capas = [];
+        campos(bytes, 0, bytes.length, function(numero, _, inicio, fin) {
+            if (numero !== 3) {
+                return;
+            }
+            const capa = {nombre: '', extension: 4096, llaves: [], valores: [], features: []};
+            campos(bytes, inicio, fin, function(campo, valor, desde, hasta) {
+                if (campo === 1) {
+                    capa.nombre = texto.decode(bytes.subarray(desde, hasta));
+                } else if (campo === 5) {
+                    capa.extension = valor;
+                } else if (campo === 3) {
+                    capa.llaves.push(texto.decode(bytes.subarray(desde, hasta)));
+                } else if (campo === 4) {
+                    let dato = null;
+                    campos(bytes, desde, hasta, function(tipo, entero, a, b) {
+                        dato = tipo === 1 ? texto.decode(bytes.subarray(a, b)) : entero;
+                    });
+                    capa.valores.push(dato);
+                } else if (campo === 2) {
+                    const feature = {etiquetas: [], geometria: []};
+                    campos(bytes, desde, hasta, function(tipo, entero, a, b) {
+                        if (tipo === 2) {
+                            feature.etiquetas = empaquetados(bytes, a, b);
+                        } else if (tipo === 4) {
+                            feature.geometria = empaquetados(bytes, a, b);
+                        }
+                    });
+                    capa.features.push(feature);
+                }
+            });
+            capa.features.forEach(function(feature) {
+                feature.propiedades = {};
+                for (let i = 0; i < feature.etiquetas.length; i += 2) {
+                    feature.propiedades[capa.llaves[feature.etiquetas[i]]] = capa.valores[feature.etiquetas[i + 1]];
+                }
+            });
+            capas.push(capa);
+        });
+        return capas;
+    }
+
+    function zigzag(valor) {
+        return valor % 2 ? -(valor + 1) / 2 : valor / 2;
+    }
+
+    // Traza los anillos de un polígono (comandos MoveTo, LineTo y ClosePath) escalados al canvas
+    function trazar(contexto, geometria, escala) {
+        let x = 0, y = 0, i = 0;
+        while (i < geometria.length) {
+            const comando = geometria[i] & 7, cuenta = Math.floor(geometria[i] / 8);
+            i++;
+            if (comando === 7) {
+                contexto.closePath();
+                continue;
+            }
+            for (let k = 0; k < cuenta; k++) {
+                x += zigzag(geometria[i++]);
+                y += zigzag(geometria[i++]);
+                if (comando === 1) {
+                    contexto.moveTo(x * escala, y * escala);
+                } else {
+                    contexto.lineTo(x * escala, y * escala);
+                }
+            }
+        }
+    }
+
+    const CapaMosaicos = L.GridLayer.extend({
+        createTile: function(coords, done) {
+            const tamano = this.getTileSize();
+            const canvas = L.DomUtil.create('canvas', 'leaflet-tile');
+            canvas.width = tamano.x;
+            canvas.height = tamano.y;
+            const estilo = this.options.estilo;
+            fetch(L.Util.template(this.options.url, coords))
+                .then(function(respuesta) {
+                    return respuesta.status === 200 ? respuesta.arrayBuffer() : new ArrayBuffer(0);
+                })
+                .then(function(buffer) {
+                    const contexto = canvas.getContext('2d');
+                    contexto.strokeStyle = estilo.color;
+                    contexto.lineWidth = estilo.weight;
+                    contexto.fillStyle = estilo.color;
+                    decodificar(buffer).forEach(function(capa) {
+                        capa.features.forEach(function(feature) {
+                            contexto.beginPath();
+                            trazar(contexto, feature.geometria, tamano.x / capa.extension);
+                            contexto.globalAlpha = estilo.fillOpacity;
+                            contexto.fill('evenodd');
+                            contexto.globalAlpha = 1;
+                            contexto.stroke();
+                        });
+                    });
+                    done(null, canvas);
+                })
+                .catch(function(error) {
+                    done(error, canvas);
+                });
+            return canvas;
+        }
+    });
+
+    window.capasMapa = Object.assign({}, window.capasMapa, {
+        decodificarMosaico: decodificar,
+        // Handler del evento 'add' de un dl.LayerGroup: le agrega la capa de mosaicos, que se quita junto
+        // con el grupo
+        mosaicosMunicipios: function(evento) {
+            evento.target.addLayer(new CapaMosaicos({
+                url: '/tiles/{z}/{x}/{y}.mvt',
+                maxNativeZoom: 14,
+                estilo: {color: '#af751d', weight: 1, fillOpacity: 0.2}
+            }));
+        }
+    });
+})();
@@ -0,0 +1,179 @@
+// Funciones que corren en el navegador (clientside callbacks de app.py e inter.py)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    tablero: {
+        // Arma las tarjetas a partir de las estadísticas que manda el servidor; los colores
+        // y las clases son solo formato, así que no hace falta ir al servidor por ellos
+        tarjetas: function(datos) {
+            if (!datos) {
+                return [];
+            }
+            const colores = {
+                'Total de Hombres': '#e09f3e',
+                'Total de Mujeres': '#84a59d',
+                'Total de Unidades': '#95b2ab'
+            };
+            const sufijo = datos.estatal ? '' : ' card-title-custom';
+            return Object.entries(datos.valores).map(function([indicador, valor]) {
+                const card = {className: 'mb-3'};
+                if (!datos.estatal) {
+                    card.style = {backgroundColor: colores[indicador] || '#af751d'};
+                }
+                card.children = {
+                    namespace: 'dash_bootstrap_components',
+                    type: 'CardBody',
+                    props: {
+                        children: [
+                            {namespace: 'dash_html_components', type: 'H5',
+                             props: {children: indicador, className: 'card-title' + sufijo}},
+                            {namespace: 'dash_html_components', type: 'P',
+                             props: {children: String(valor), className: datos.estatal ? 'card-text' : 'card-text card-text-custom'}}
+                        ]
+                    }
+                };
+                return {
+                    namespace: 'dash_bootstrap_components',
+                    type: 'Col',
+                    props: {width: 3, children: {namespace: 'dash_bootstrap_components', type: 'Card', props: card}}
+                };
+            });
+        },
+        // Leyenda del mapa coroplético con los rangos de cada clase del hideout de la capa
+        leyendaIndicador: function(escala) {
+            if (!escala || !escala.valores) {
+                return [];
+            }
+            const formato = numeroIndicador(escala.decimales);
+            const {limites, colores} = escala;
+            const clases = colores.map(function(color, i) {
+                let rango;
+                if (!limites.length) {
+                    rango = 'Todos';
+                } else if (i === 0) {
+                    rango = '≤ ' + formato(limites[0]);
+                } else if (i === limites.length) {
+                    rango = '> ' + formato(limites[i - 1]);
+                } else {
+                    rango = formato(limites[i - 1]) + ' – ' + formato(limites[i]);
+                }
+                return [color, rango];
+            }).concat([[escala.sin_dato, 'Sin dato']]);
+            return [{namespace: 'dash_html_components', type: 'Strong', props: {children: escala.nombre + ': '}}].concat(
+                clases.map(function([color, rango]) {
+                    return {
+                        namespace: 'dash_html_components',
+                        type: 'Span',
+                        props: {
+                            style: {marginRight: '10px', whiteSpace: 'nowrap'},
+                            children: [
+                                {namespace: 'dash_html_components', type: 'Span', props: {style: {
+                                    display: 'inline-block', width: '12px', height: '12px', marginRight: '4px',
+                                    backgroundColor: color, border: '1px solid #999'
+                                }}},
+                                rango
+                            ]
+                        }
+                    };
+                })
+            );
+        },
+        // TopoJSON cuantizado de topologia.py -> FeatureCollection para dl.GeoJSON: cada arco se
+        // decodifica una vez (diferencias acumuladas y transform) y los anillos se arman con sus arcos
+        geojsonTopologia: function(topologia) {
+            if (!topologia) {
+                return {type: 'FeatureCollection', features: []};
+            }
+            const [kx, ky] = topologia.transform.scale;
+            const [tx, ty] = topologia.transform.translate;
+            const arcos = topologia.arcs.map(function(arco) {
+                let x = 0, y = 0;
+                return arco.map(function(punto) {
+                    x += punto[0];
+                    y += punto[1];
+                    return [x * kx + tx, y * ky + ty];
+                });
+            });
+            function anillo(referencias) {
+                const puntos = [];
+                referencias.forEach(function(referencia, i) {
+                    const arco = referencia >= 0 ? arcos[referencia] : arcos[~referencia].slice().reverse();
+                    puntos.push.apply(puntos, i ? arco.slice(1) : arco);
+                });
+                return puntos;
+            }
+            return {
+                type: 'FeatureCollection',
+                features: topologia.objects.municipios.geometries.map(function(geometria) {
+                    return {
+                        type: 'Feature',
+                        id: geometria.id,
+                        properties: geometria.properties,
+                        geometry: {
+                            type: 'MultiPolygon',
+                            coordinates: geometria.arcs.map(function(poligono) { return poligono.map(anillo); })
+                        }
+                    };
+                })
+            };
+        }
+    }
+});
+
+function numeroIndicador(decimales) {
+    return function(valor) {
+        return valor.toLocaleString('es-MX', {minimumFractionDigits: decimales, maximumFractionDigits: decimales});
+    };
+}
+
+// Funciones que dash-leaflet llama al dibujar las capas GeoJSON de app.py ({variable: 'capasMapa...'})
+window.capasMapa = Object.assign({}, window.capasMapa, {
+    // Localidades con el color del rango de distancia a su unidad más cercana (hideout: limites en km y
+    // colores, uno más que los límites)
+    puntoCobertura: function(feature, latlng, context) {
+        const propiedades = feature.properties;
+        const {limites, colores} = context.hideout;
+        let rango = colores.length - 1;
+        if (propiedades.km !== null) {
+            rango = limites.findIndex(function(limite) { return propiedades.km <= limite; });
+            rango = rango < 0 ? colores.length - 1 : rango;
+        }
+        return L.circleMarker(latlng, {radius: 4, weight: 0, fillColor: colores[rango], fillOpacity: 0.8});
+    },
+    // Grupos de unidades que arma el servidor (clusters.py): un círculo con el número de unidades, o un
+    // punto si el grupo es de una sola unidad
+    grupoUnidades: function(feature, latlng) {
+        const n = feature.properties.n;
+        if (n === 1) {
+            return L.circleMarker(latlng, {radius: 5, color: '#333', weight: 1, fillColor: '#333', fillOpacity: 0.9});
+        }
+        const tamano = n < 10 ? 26 : n < 100 ? 32 : 40;
+        return L.marker(latlng, {icon: L.divIcon({
+            html: '<div><span>' + n + '</span></div>',
+            className: 'grupo-unidades',
+            iconSize: L.point(tamano, tamano)
+        })});
+    },
+    // Municipios del mapa coroplético con el color de la clase de su valor (hideout de
+    // indicadores.escala_indicador: valores por clave, límites de las clases y colores, uno más que los límites)
+    estiloCoropleta: function(feature, context) {
+        const escala = context.hideout;
+        if (!escala || !escala.valores) {
+            return {stroke: false, fillOpacity: 0};
+        }
+        const valor = escala.valores[feature.properties.CVE_MUNICIPIO];
+        let color = escala.sin_dato;
+        if (valor !== undefined) {
+            const clase = escala.limites.findIndex(function(limite) { return valor <= limite; });
+            color = escala.colores[clase < 0 ? escala.colores.length - 1 : clase];
+        }
+        return {color: '#ffffff', weight: 1, fillColor: color, fillOpacity: 0.7};
+    },
+    tooltipCoropleta: function(feature, layer, context) {
+        const escala = context.hideout;
+        if (!escala || !escala.valores) {
+            return;
+        }
+        const valor = escala.valores[feature.properties.CVE_MUNICIPIO];
+        const texto = valor === undefined ? 'sin dato' : numeroIndicador(escala.decimales)(valor);
+        layer.bindTooltip(feature.properties.NOM_MUN + '<br>' + escala.nombre + ': ' + texto);
+    }
+});
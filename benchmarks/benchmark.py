@@ -0,0 +1,344 @@
+# benchmark.py
+# Mide el procesamiento de datos y los callbacks del tablero con datos sintéticos (sin red ni
+# archivos reales) a 1x/10x/100x las filas de Hidalgo y guarda el resultado en JSON.
+#
+#   python benchmarks/benchmark.py                          -> benchmarks/resultados/<commit>.json
+#   python benchmarks/benchmark.py --escalas 1 10 --repeticiones 3
+#   python benchmarks/benchmark.py --comparar antes.json despues.json
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_REPO = os.path.dirname(DIRECTORIO_BENCHMARKS)
+VERSION_RESULTADOS = 1
+
+# Valores con que el navegador llama a los callbacks además del municipio seleccionado
+VALORES_INICIALES = {
+    'table.page_current': 0,
+    'table.page_size': 10,
+    'table.sort_by': [],
+    'table.filter_query': '',
+    'formato-exportacion.value': 'xlsx',
+    'dropdown-indicador.value': 'unidades_10k',
+    'dropdown-entidades.value': 13,
+    'tabla-cobertura.page_current': 0,
+    'tabla-cobertura.page_size': 10,
+    'tabla-cobertura.sort_by': [],
+    'tabla-cobertura.filter_query': '',
+}
+
+
+def resumen(tiempos, tamanos=None):
+    tiempos = np.asarray(tiempos) * 1000
+    resultado = {
+        'n': int(len(tiempos)),
+        'p50_ms': round(float(np.percentile(tiempos, 50)), 3),
+        'p95_ms': round(float(np.percentile(tiempos, 95)), 3),
+        'max_ms': round(float(tiempos.max()), 3),
+        'total_ms': round(float(tiempos.sum()), 3),
+    }
+    if tamanos is not None:
+        tamanos = np.asarray(tamanos)
+        resultado.update({
+            'bytes_p50': int(np.percentile(tamanos, 50)),
+            'bytes_max': int(tamanos.max()),
+            'bytes_total': int(tamanos.sum()),
+        })
+    return resultado
+
+
+def cronometrar(funcion, repeticiones=1):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def salidas(clave):
+    # 'a.b' o '..a.b...c.d..' (varias salidas) como los manda el navegador
+    if clave.startswith('..'):
+        partes = clave[2:-2].split('...')
+    else:
+        partes = [clave]
+    lista = [dict(zip(('id', 'property'), parte.rsplit('.', 1))) for parte in partes]
+    return lista if clave.startswith('..') else lista[0]
+
+
+def peticiones(app, municipio):
+    # Cuerpos de /_dash-update-component de los callbacks del servidor que dependen del dropdown
+    for clave, callback in app.callback_map.items():
+        if 'callback' not in callback:
+            continue  # clientside
+        if not any(i['id'] == 'dropdown-municipios' for i in callback['inputs']):
+            continue
+
+        def valor(dependencia):
+            if dependencia['id'] == 'dropdown-municipios':
+                return municipio
+            return VALORES_INICIALES.get(f"{dependencia['id']}.{dependencia['property']}")
+
+        yield clave, {
+            'output': clave,
+            'outputs': salidas(clave),
+            'inputs': [dict(i, value=valor(i)) for i in callback['inputs']],
+            'state': [dict(s, value=valor(s)) for s in callback.get('state', [])],
+            'changedPropIds': ['dropdown-municipios.value'],
+        }
+
+
+def medir_callbacks(app, claves, repeticiones):
+    cliente = app.server.test_client()
+    tiempos, tamanos = {}, {}
+    for _ in range(repeticiones):
+        for municipio in claves:
+            for salida, cuerpo in peticiones(app, municipio):
+                inicio = time.perf_counter()
+                respuesta = cliente.post('/_dash-update-component', json=cuerpo)
+                tiempos.setdefault(salida, []).append(time.perf_counter() - inicio)
+                if respuesta.status_code not in (200, 204):
+                    raise RuntimeError(f"{salida} ({municipio}): HTTP {respuesta.status_code}")
+                tamanos.setdefault(salida, []).append(len(respuesta.data))
+    return {salida: resumen(tiempos[salida], tamanos[salida]) for salida in tiempos}
+
+
+def medir(escala, directorio, repeticiones):
+    # Corre en un proceso aparte por escala, con el directorio de datos sintéticos como carpeta de trabajo
+    # (el tablero lee files/, cache/ y assets/mapas relativos a ella)
+    os.chdir(directorio)
+    for carpeta in ['cache', 'assets']:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    sys.path.insert(0, DIRECTORIO_REPO)
+    resultados = {'escala': escala}
+
+    import funciones
+    import geometrias
+    etapas = {}
+    inicio = time.perf_counter()
+    df_unidades = funciones._procesar_datos()
+    etapas['procesar_datos'] = [time.perf_counter() - inicio]
+    inicio = time.perf_counter()
+    df_poblacion = funciones._poblacion_unidades()
+    etapas['poblacion_unidades'] = [time.perf_counter() - inicio]
+    etapas['cubo_poblacion'] = cronometrar(lambda: funciones.CuboPoblacion(df_poblacion), repeticiones)
+    cubo = funciones.CuboPoblacion(df_poblacion)
+    etapas['totales_pob'] = cronometrar(lambda: funciones.totales_pob(cubo), repeticiones)
+    etapas['construir_horarios'] = cronometrar(lambda: funciones.construir_horarios(df_unidades), repeticiones)
+    horarios = funciones.construir_horarios(df_unidades)
+    lunes = datetime(2025, 1, 6, 10, 30)
+    etapas['consultar_abiertas'] = cronometrar(lambda: horarios.consultar(momento=lunes), repeticiones)
+    etapas['consultar_fin_de_semana'] = cronometrar(lambda: horarios.consultar(dias=(5, 6)), repeticiones)
+    etapas['cargar_shapefile'] = cronometrar(lambda: geometrias._tabla_geometrias(funciones.ENTIDAD))
+    etapas['ubicar_unidades'] = cronometrar(lambda: geometrias._ubicacion_unidades(funciones.ENTIDAD))
+    # Segunda vez: desde la caché en disco
+    funciones.procesar_datos(), funciones.poblacion_unidades(), geometrias.construir_geometrias()
+    etapas['procesar_datos_cache'] = cronometrar(funciones.procesar_datos, repeticiones)
+    etapas['poblacion_unidades_cache'] = cronometrar(funciones.poblacion_unidades, repeticiones)
+    etapas['construir_geometrias_cache'] = cronometrar(geometrias.construir_geometrias, repeticiones)
+    import cobertura
+    localidades = cobertura.localidades_entidad()
+    unidades = cobertura.unidades_cobertura(df_unidades)
+    etapas['construir_cobertura'] = cronometrar(lambda: cobertura.Cobertura(localidades, unidades), repeticiones)
+    motor = cobertura.Cobertura(localidades, unidades)
+    cerradas = unidades['CLUES'].tolist()[::10]
+    etapas['cerrar_unidades'] = cronometrar(lambda: motor.cerrar(cerradas))
+    etapas['actualizar_cobertura'] = cronometrar(lambda: motor.actualizar(unidades))
+    resultados['filas'] = {'unidades': len(df_unidades), 'poblacion_clues': len(df_poblacion), 'localidades': len(localidades)}
+
+    inicio = time.perf_counter()
+    import app
+    etapas['importar_app'] = [time.perf_counter() - inicio]
+    inicio = time.perf_counter()
+    import inter
+    etapas['importar_inter'] = [time.perf_counter() - inicio]
+    import clusters
+    etapas['agrupar_unidades'] = cronometrar(
+        lambda: clusters._grupos_unidades.__wrapped__(funciones.ENTIDAD, None, None), repeticiones)
+    grupos = clusters.grupos_unidades()
+    etapas['grupos_visibles_entidad'] = cronometrar(lambda: grupos.visibles(app.zoom_inicial), repeticiones)
+    resultados['etapas'] = {nombre: resumen(tiempos) for nombre, tiempos in etapas.items()}
+
+    claves = [None] + [int(clave) for clave in app.df_municipios['id_municipio']]
+    resultados['callbacks_app'] = medir_callbacks(app.app, claves, repeticiones)
+    resultados['callbacks_inter'] = medir_callbacks(inter.app, claves, repeticiones)
+
+    # generar_mapa: primera vez (folium) y siguientes (archivo ya en disco)
+    import cache_mapas
+    shutil.rmtree(cache_mapas.DIRECTORIO_MAPAS, ignore_errors=True)  # Los callbacks de inter ya los generaron
+    frio, caliente = [], []
+    for clave in claves[1:]:
+        geometria = inter.geometrias_municipios[clave]
+        lat, lon = geometria['centroide']
+        topologia = inter.topologia_municipios().topojson((clave,), inter.nivel_zoom(12))
+        def generar():
+            inter.generar_mapa(clave, lat, lon, topologia, unidades=inter.puntos_municipios(funciones.ENTIDAD).get(clave))
+        frio += cronometrar(generar)
+        caliente += cronometrar(generar, repeticiones)
+    tamanos = [os.path.getsize(ruta) for ruta in
+               (os.path.join(cache_mapas.DIRECTORIO_MAPAS, nombre) for nombre in os.listdir(cache_mapas.DIRECTORIO_MAPAS))
+               if ruta.endswith('.html')]
+    resultados['generar_mapa'] = {'frio': resumen(frio, tamanos), 'cache': resumen(caliente)}
+
+    # Descarga de la tabla (antes download_excel) de la entidad medida: primera vez y ya exportada
+    cliente = app.app.server.test_client()
+    for formato in ['xlsx', 'csv']:
+        tiempos = {'frio': [], 'cache': []}
+        tamanos = []
+        for clave in claves:
+            url = f"/exportar/{formato}?entidad={funciones.ENTIDAD}&municipio={'' if clave is None else clave}"
+            for intento in range(1 + repeticiones):
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                datos = respuesta.data
+                tiempos['frio' if intento == 0 else 'cache'].append(time.perf_counter() - inicio)
+            tamanos.append(len(datos))
+        resultados[f'descarga_{formato}'] = {
+            'frio': resumen(tiempos['frio'], tamanos), 'cache': resumen(tiempos['cache']),
+        }
+
+    # Mosaicos de municipios que pide el mapa al abrir la entidad y al acercarse dos niveles
+    import mosaicos
+    from clusters import pixeles
+    shutil.rmtree(mosaicos.DIRECTORIO_MOSAICOS, ignore_errors=True)
+    geometrias_inicial = geometrias.geometrias_entidad(funciones.ENTIDAD)
+    sur = min(geometria['bbox'][0][0] for geometria in geometrias_inicial.values())
+    oeste = min(geometria['bbox'][0][1] for geometria in geometrias_inicial.values())
+    norte = max(geometria['bbox'][1][0] for geometria in geometrias_inicial.values())
+    este = max(geometria['bbox'][1][1] for geometria in geometrias_inicial.values())
+    tiempos = {'frio': [], 'cache': []}
+    tamanos = []
+    for zoom in [app.zoom_inicial, app.zoom_inicial + 2]:
+        x0, y0 = pixeles(norte, oeste, zoom)
+        x1, y1 = pixeles(sur, este, zoom)
+        for x in range(int(x0 // 256), int(x1 // 256) + 1):
+            for y in range(int(y0 // 256), int(y1 // 256) + 1):
+                for intento in range(1 + repeticiones):
+                    inicio = time.perf_counter()
+                    datos = cliente.get(f"/tiles/{zoom}/{x}/{y}.mvt").data
+                    tiempos['frio' if intento == 0 else 'cache'].append(time.perf_counter() - inicio)
+                tamanos.append(len(datos))
+    resultados['mosaicos'] = {'frio': resumen(tiempos['frio'], tamanos), 'cache': resumen(tiempos['cache'])}
+
+    # Topología de los municipios y contorno de la entidad en TopoJSON en cada nivel de simplificación
+    import topologia
+    etapas_topologia = {'calcular_topologia': resumen(cronometrar(lambda: topologia._calcular_topologia.__wrapped__(None)))}
+    municipios_topologia = topologia.topologia_municipios()
+    claves_entidad = tuple(geometrias_inicial)
+    for nivel in topologia.NIVELES:
+        tiempos = cronometrar(lambda: municipios_topologia.topojson(claves_entidad, nivel), repeticiones)
+        tamano = len(json.dumps(municipios_topologia.topojson(claves_entidad, nivel), separators=(',', ':')))
+        etapas_topologia[f'topojson_entidad_{nivel}'] = resumen(tiempos, [tamano])
+    resultados['topologia'] = etapas_topologia
+
+    # Indicadores del mapa coroplético: tabla de toda la entidad y hideout de cada indicador
+    import indicadores
+    cobertura_entidad, _ = cobertura.obtener_cobertura(funciones.ENTIDAD)
+    etapas_indicadores = {'tabla_indicadores': resumen(cronometrar(
+        lambda: indicadores.tabla_indicadores(app.df_unidades_merge, app.cubo, cobertura_entidad), repeticiones))}
+    for indicador in indicadores.INDICADORES:
+        tiempos = cronometrar(lambda: indicadores.escala_indicador(funciones.ENTIDAD, indicador), repeticiones)
+        tamano = len(json.dumps(indicadores.escala_indicador(funciones.ENTIDAD, indicador), separators=(',', ':')))
+        etapas_indicadores[f'escala_{indicador}'] = resumen(tiempos, [tamano])
+    resultados['indicadores'] = etapas_indicadores
+
+    resultados['memoria_max_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return resultados
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=DIRECTORIO_REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr(escalas, repeticiones, directorio_datos, salida):
+    from datos_sinteticos import generar
+    resultados = {
+        'version': VERSION_RESULTADOS,
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': repeticiones,
+        'escalas': {},
+    }
+    for escala in escalas:
+        directorio = os.path.join(directorio_datos, f"escala_{escala}")
+        print(f"Escala {escala}x: generando datos en {directorio}", file=sys.stderr)
+        generar(directorio, escala)
+        print(f"Escala {escala}x: midiendo", file=sys.stderr)
+        proceso = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--medir', str(escala), '--directorio', directorio,
+             '--repeticiones', str(repeticiones)],
+            capture_output=True, text=True)
+        if proceso.returncode != 0:
+            sys.stderr.write(proceso.stderr)
+            raise SystemExit(f"Falló la escala {escala}x")
+        resultados['escalas'][str(escala)] = json.loads(proceso.stdout.strip().splitlines()[-1])
+
+    if salida is None:
+        salida = os.path.join(DIRECTORIO_BENCHMARKS, 'resultados', f"{(resultados['commit'] or 'sin_commit')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(salida)
+
+
+def aplanar(resultados):
+    # {('1', 'callbacks_app', 'mapa.children', 'p50_ms'): valor, ...}
+    valores = {}
+    def recorrer(prefijo, nodo):
+        for clave, valor in nodo.items():
+            if isinstance(valor, dict):
+                recorrer(prefijo + (clave,), valor)
+            elif clave.startswith(('p50', 'p95', 'bytes_p50')):
+                valores[prefijo + (clave,)] = valor
+    for escala, datos in resultados['escalas'].items():
+        recorrer((escala,), datos)
+    return valores
+
+
+def comparar(ruta_antes, ruta_despues):
+    with open(ruta_antes, encoding='utf-8') as archivo:
+        antes = aplanar(json.load(archivo))
+    with open(ruta_despues, encoding='utf-8') as archivo:
+        despues = aplanar(json.load(archivo))
+    print(f"{'medida':<80} {'antes':>12} {'después':>12} {'cambio':>8}")
+    for clave in sorted(set(antes) & set(despues)):
+        a, d = antes[clave], despues[clave]
+        cambio = f"{d / a:.2f}x" if a else '-'
+        print(f"{' / '.join(clave):<80} {a:>12} {d:>12} {cambio:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del tablero con datos sintéticos")
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10, 100],
+                        help="Múltiplos de las filas de Hidalgo")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--datos', default=os.path.join(DIRECTORIO_BENCHMARKS, 'datos'),
+                        help="Carpeta donde se generan (y reutilizan) los datos sintéticos")
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DESPUES'), help="Comparar dos resultados")
+    parser.add_argument('--medir', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--directorio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    elif args.medir is not None:
+        print(json.dumps(medir(args.medir, os.path.abspath(args.directorio), args.repeticiones)))
+    else:
+        correr(args.escalas, args.repeticiones, os.path.abspath(args.datos), args.salida)
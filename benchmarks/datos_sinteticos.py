@@ -0,0 +1,165 @@
+# datos_sinteticos.py
+# Genera archivos fuente con la misma forma que los de files/ (catálogo CLUES, horarios, población
+# y shapefile de municipios), con el número de filas de Hidalgo multiplicado por una escala
+import json
+import os
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from shapely.geometry import Polygon
+
+VERSION_SINTETICOS = 2  # Incrementar cuando cambie la forma de los datos generados
+
+# Filas de los archivos reales de Hidalgo (periodo 202501)
+FILAS = {'unidades': 512, 'unidades_ssh': 511, 'horarios': 41845, 'poblacion': 5920}
+MUNICIPIOS = 84
+JURISDICCIONES = 12
+LOCALIDADES = 200  # Localidades por municipio
+LOCALIDADES_CATALOGO = 63  # Localidades por municipio en el catálogo AGEEML
+VERTICES = 400  # Vértices por municipio en el shapefile (también se multiplica por la escala)
+COLUMNAS_CATALOGO = 67  # Columnas del catálogo CLUES; las que el tablero no usa se rellenan
+# Rectángulo aproximado de Hidalgo donde se reparten los municipios
+LIMITES = (-99.9, 19.6, -97.9, 21.4)
+COLUMNAS_MALLA = 12
+
+HORARIOS = [('08:00', '16:00'), ('09:00', '21:00'), ('08:00', '15:30'), ('07:00', '14:00'), ('08:00', '20:00')]
+QUINQUENIOS = ['0-4 años', '5-9 años', '10-14 años', '15-19 años', '20-24 años', '25-29 años', '30-34 años',
+               '35-39 años', '40-44 años', '45-49 años', '50-54 años', '55-59 años', '60-64 años', '65-69 años',
+               '70-74 años', '75-79 años', '80-84 años', '85+ años', 'indefinido']
+
+
+def nombre_municipio(clave):
+    # Con acentos, para que el tablero tenga que normalizarlos igual que con los datos reales
+    return f"San José {clave:03d}"
+
+
+def centro_municipio(clave):
+    indice = clave - 1
+    ancho = (LIMITES[2] - LIMITES[0]) / COLUMNAS_MALLA
+    alto = (LIMITES[3] - LIMITES[1]) / -(-MUNICIPIOS // COLUMNAS_MALLA)
+    columna, fila = indice % COLUMNAS_MALLA, indice // COLUMNAS_MALLA
+    return LIMITES[0] + (columna + 0.5) * ancho, LIMITES[1] + (fila + 0.5) * alto, ancho, alto
+
+
+def catalogo(rng, n, institucion, prefijo):
+    mun = rng.integers(1, MUNICIPIOS + 1, n)
+    loc = rng.integers(1, LOCALIDADES + 1, n)
+    lon, lat, ancho, alto = (np.array(valores) for valores in zip(*map(centro_municipio, mun)))
+    df = pd.DataFrame({
+        'CLUES': [f"HG{prefijo}{i:06d}" for i in range(n)],
+        'CLAVE DE LA INSTITUCION': institucion,
+        'CLAVE DE LA ENTIDAD': 13,
+        'ENTIDAD': 'HIDALGO',
+        'CLAVE DEL MUNICIPIO': mun,
+        'MUNICIPIO': [nombre_municipio(m).upper().replace('É', 'E') for m in mun],
+        'CLAVE DE LA LOCALIDAD': loc,
+        'LOCALIDAD': [f"LOCALIDAD {l:03d}" for l in loc],
+        'CLAVE DE LA JURISDICCION': (mun - 1) % JURISDICCIONES + 1,
+        'JURISDICCION': [f"JURISDICCION {(m - 1) % JURISDICCIONES + 1:02d}" for m in mun],
+        'NOMBRE TIPO ESTABLECIMIENTO': 'DE CONSULTA EXTERNA',
+        'NOMBRE DE LA UNIDAD': [f"CENTRO DE SALUD {i:06d}" for i in range(n)],
+        'LATITUD': lat + rng.uniform(-0.3, 0.3, n) * alto,
+        'LONGITUD': lon + rng.uniform(-0.3, 0.3, n) * ancho,
+        'CLAVE MOTIVO BAJA': 9.0 if institucion == 'SSA' else np.nan,
+    })
+    relleno = ['SIN DATO', 'NO ESPECIFICADO', 'URBANO', 'RURAL', 'PRIMER NIVEL']
+    for k in range(COLUMNAS_CATALOGO - len(df.columns)):
+        df[f'COLUMNA {k:02d}'] = rng.choice(relleno, n)
+    return df
+
+
+def escribir_poblacion(rng, n, ruta):
+    mun = np.concatenate([np.arange(1, MUNICIPIOS + 1), rng.integers(1, MUNICIPIOS + 1, max(0, n - MUNICIPIOS))])[:n]
+    valores = rng.poisson(5, (n, 2 * len(QUINQUENIOS)))
+    encabezado = ['Clave Jurisdicción Unidad', 'Nombre Jurisdicción Unidad', 'Clave Municipio Unidad',
+                  'Nombre Municipio Unidad', 'Clave Localidad Unidad', 'Nombre Localidad Unidad', 'CLUES',
+                  'Nombre Unidad', 'Clave Jurisdicción Loc.', 'Nombre Jurisdicción Loc', 'Clave Municipio Loc',
+                  'Nombre Municipio Loc', 'Clave Localidad', 'Nombre Localidad', 'ageb']
+    encabezado += [f'h{q}' for q in QUINQUENIOS] + [f'm{q}' for q in QUINQUENIOS]
+    libro = xlsxwriter.Workbook(ruta, {'constant_memory': True})
+    hoja = libro.add_worksheet()
+    hoja.write_row(0, 0, ['Reporte Población'])
+    hoja.write_row(1, 0, encabezado)
+    for i in range(n):
+        m = int(mun[i])
+        j = (m - 1) % JURISDICCIONES + 1
+        nombre = nombre_municipio(m)
+        fila = [j, f"Jurisdicción {j:02d}", m, nombre, 1, nombre, f"HGSSA{i:06d}", f"UNIDAD {i}",
+                j, f"Jurisdicción {j:02d}", m, nombre, 1, nombre, f"{i % 9999:04d}"]
+        hoja.write_row(i + 2, 0, fila + valores[i].tolist())
+    libro.close()
+
+
+def escribir_municipios(escala, ruta):
+    vertices = VERTICES * escala
+    angulos = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    geometrias = []
+    for clave in range(1, MUNICIPIOS + 1):
+        lon, lat, ancho, alto = centro_municipio(clave)
+        # Contorno irregular (no un círculo) para que la simplificación y el dibujo trabajen como con uno real
+        radio = 0.45 * (1 + 0.08 * np.sin(7 * angulos + clave) + 0.04 * np.sin(23 * angulos))
+        geometrias.append(Polygon(zip(lon + radio * ancho * np.cos(angulos), lat + radio * alto * np.sin(angulos))))
+    gdf = gpd.GeoDataFrame({
+        'CVE_ENT': '13',
+        'CVE_MUN': [f"{clave:03d}" for clave in range(1, MUNICIPIOS + 1)],
+        'NOM_MUN': [nombre_municipio(clave) for clave in range(1, MUNICIPIOS + 1)],
+    }, geometry=geometrias, crs='EPSG:4326')
+    gdf.to_file(ruta, encoding='UTF-8')
+
+
+def escribir_localidades(rng, escala, ruta):
+    # Catálogo de localidades con punto y población (Hidalgo tiene unas 5,300)
+    filas = []
+    for clave in range(1, MUNICIPIOS + 1):
+        lon, lat, ancho, alto = centro_municipio(clave)
+        n = LOCALIDADES_CATALOGO * escala
+        filas.append(pd.DataFrame({
+            'CVE_ENT': '13', 'NOM_ENT': 'Hidalgo', 'CVE_MUN': f"{clave:03d}", 'NOM_MUN': nombre_municipio(clave),
+            'CVE_LOC': [f"{loc:04d}" for loc in range(1, n + 1)],
+            'NOM_LOC': [f"Localidad {loc:03d}" for loc in range(1, n + 1)],
+            'LAT_DECIMAL': np.round(lat + rng.uniform(-0.4, 0.4, n) * alto, 6),
+            'LON_DECIMAL': np.round(lon + rng.uniform(-0.4, 0.4, n) * ancho, 6),
+            'POB_TOTAL': rng.integers(1, 3000, n),
+        }))
+    pd.concat(filas, ignore_index=True).to_csv(ruta, index=False)
+
+
+def generar(directorio, escala=1, periodo='202501', semilla=0):
+    # Escribe directorio/files/... ; si ya existen con la misma escala y semilla no se vuelven a generar
+    archivos = os.path.join(directorio, 'files')
+    marca = os.path.join(archivos, 'sinteticos.json')
+    parametros = {'version': VERSION_SINTETICOS, 'escala': escala, 'periodo': periodo, 'semilla': semilla}
+    if os.path.exists(marca):
+        with open(marca, encoding='utf-8') as archivo:
+            if json.load(archivo) == parametros:
+                return archivos
+
+    rng = np.random.default_rng(semilla)
+    os.makedirs(os.path.join(archivos, 'mapa', 'muni_2018gw'), exist_ok=True)
+    unidades = catalogo(rng, FILAS['unidades'] * escala, 'IMB', 'IMB')
+    unidades.to_parquet(os.path.join(archivos, f"ESTABLECIMIENTO_SALUD_{periodo}.parquet"), index=False)
+
+    # Las unidades de la Secretaría comparten nombre, municipio y localidad con las de IMSS Bienestar
+    n_ssh = FILAS['unidades_ssh'] * escala
+    ssh = catalogo(rng, n_ssh, 'SSA', 'SSA')
+    for columna in ['CLAVE DEL MUNICIPIO', 'MUNICIPIO', 'CLAVE DE LA LOCALIDAD', 'NOMBRE DE LA UNIDAD']:
+        ssh[columna] = unidades[columna].values[:n_ssh]
+    ssh.to_parquet(os.path.join(archivos, f"ESTABLECIMIENTO_SALUD_{periodo}_SSH.parquet"), index=False)
+
+    n_horarios = max(FILAS['horarios'] * escala, len(unidades))
+    inicio, fin = zip(*(HORARIOS[i] for i in rng.integers(0, len(HORARIOS), n_horarios)))
+    pd.DataFrame({
+        'CLUES': unidades['CLUES'].tolist() + [f"XXOTR{i:07d}" for i in range(n_horarios - len(unidades))],
+        'HORA INICIO': inicio,
+        'HORA FIN': fin,
+        'HORARIO': [f"De {a} a {b}" for a, b in zip(inicio, fin)],
+    }).to_parquet(os.path.join(archivos, f"ESTABLECIMIENTO_SALUD_{periodo}_horarios.parquet"), index=False)
+
+    escribir_poblacion(rng, FILAS['poblacion'] * escala, os.path.join(archivos, "Reporte Población.xlsx"))
+    escribir_municipios(escala, os.path.join(archivos, 'mapa', 'muni_2018gw', 'muni_2018gw.shp'))
+    escribir_localidades(rng, escala, os.path.join(archivos, 'mapa', 'AGEEML_202410311056515.csv'))
+
+    with open(marca, 'w', encoding='utf-8') as archivo:
+        json.dump(parametros, archivo)
+    return archivos
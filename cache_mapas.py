@@ -0,0 +1,132 @@
+# cache_mapas.py
+import glob
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from metricas import contar_cache
+
+# Carpeta servida por Dash como /assets/mapas
+DIRECTORIO_MAPAS = "assets/mapas"
+MAXIMO_MAPAS = 200  # Mapas que se conservan en disco antes de borrar los menos usados
+VERSION_MAPAS = 2  # Incrementar cuando cambie la forma de dibujar los mapas
+ESPERA_MAXIMA = 60  # Segundos tras los que un candado de otro proceso se considera abandonado
+
+CANDADOS_HILO = 64  # Candados entre hilos; cada ruta usa siempre el mismo
+
+# Un número fijo de candados repartidos por ruta: no crece con el número de archivos distintos
+_candados = [threading.Lock() for _ in range(CANDADOS_HILO)]
+
+
+def clave_mapa(*partes):
+    # Misma selección y mismo estilo -> mismo archivo, sin depender de cómo se formatean los flotantes
+    texto = json.dumps([VERSION_MAPAS, *partes], sort_keys=True, default=str)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:20]
+
+
+def _candado_hilo(clave):
+    return _candados[hash(clave) % CANDADOS_HILO]
+
+
+class _CandadoArchivo:
+    # Candado entre procesos (workers de gunicorn) basado en crear un archivo en exclusiva. Mientras se
+    # tiene, un hilo actualiza su fecha de modificación cada ESPERA_MAXIMA / 4 segundos; solo se le quita
+    # a su dueño si deja de actualizarla (el proceso murió), no porque generar el archivo tarde mucho
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.dueno = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}".encode('utf-8')
+        self.soltar = threading.Event()
+
+    def __enter__(self):
+        while True:
+            try:
+                descriptor = os.open(self.ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(descriptor, self.dueno)
+                os.close(descriptor)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.ruta) > ESPERA_MAXIMA:
+                        os.remove(self.ruta)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(0.05)
+        self.latido = threading.Thread(target=self._latir, daemon=True)
+        self.latido.start()
+        return self
+
+    def _latir(self):
+        while not self.soltar.wait(ESPERA_MAXIMA / 4):
+            try:
+                os.utime(self.ruta)
+            except OSError:
+                pass
+
+    def __exit__(self, *args):
+        self.soltar.set()
+        self.latido.join()
+        try:
+            # Solo se borra si sigue siendo nuestro
+            with open(self.ruta, 'rb') as archivo:
+                if archivo.read() == self.dueno:
+                    os.remove(self.ruta)
+        except OSError:
+            pass
+
+
+def obtener_mapa(clave, generar):
+    # Devuelve la URL del mapa; generar(ruta) solo se llama si no existe en disco,
+    # y una sola vez aunque lleguen varias peticiones iguales al mismo tiempo
+    nombre = f"mapa_{clave}.html"
+    generado = obtener_archivo(os.path.join(DIRECTORIO_MAPAS, nombre), generar)
+    contar_cache('mapas', not generado)
+    if generado:
+        desalojar()
+    return f"/assets/mapas/{nombre}"
+
+
+def obtener_archivo(ruta, generar):
+    # Genera el archivo si no existe (una sola vez entre hilos y procesos); devuelve True si se generó
+    if _marcar_uso(ruta):
+        return False
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with _candado_hilo(ruta), _CandadoArchivo(f"{ruta}.lock"):
+        if _marcar_uso(ruta):
+            return False
+        # Escribir en un temporal y renombrar: nadie ve nunca un archivo a medias
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            generar(temporal)
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+    return True
+
+
+def _marcar_uso(ruta):
+    # Actualiza la fecha de modificación para que el desalojo sea por uso reciente (LRU)
+    try:
+        os.utime(ruta)
+        return True
+    except OSError:
+        return False
+
+
+def desalojar(maximo=MAXIMO_MAPAS, directorio=DIRECTORIO_MAPAS, patron="mapa_*.html"):
+    archivos = []
+    for ruta in glob.glob(os.path.join(directorio, patron)):
+        try:
+            archivos.append((os.path.getmtime(ruta), ruta))
+        except OSError:
+            pass
+    archivos.sort()
+    for _, ruta in archivos[:max(0, len(archivos) - maximo)]:
+        try:
+            os.remove(ruta)
+        except OSError as e:
+            print(f"Error al eliminar {ruta}: {e}")
@@ -0,0 +1,85 @@
+# clusters.py
+# Grupos de unidades del mapa calculados en el servidor para cada nivel de zoom: cada zoom divide el mapa
+# (Web Mercator) en celdas de CELDA píxeles y junta las unidades de cada celda. Como las celdas de un zoom
+# son la unión de cuatro celdas del siguiente, los grupos se parten de forma jerárquica al acercarse y el
+# navegador solo recibe los grupos que caen en lo que está viendo
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from cobertura import RADIO_KM, obtener_cobertura
+from funciones import ENTIDAD, MAXIMO_ENTIDADES, version_indice
+from geometrias import puntos_municipios
+
+CELDA = 64  # Píxeles por lado de cada celda
+ZOOM_MAXIMO = 15  # Desde este zoom las unidades se envían sin agrupar
+MARGEN = 0.25  # Fracción del área visible que se agrega alrededor para que al mover el mapa no haya huecos
+
+
+def pixeles(latitud, longitud, zoom):
+    # Coordenadas en píxeles de Web Mercator (mosaicos de 256) en el zoom dado
+    escala = 256 * 2 ** zoom
+    seno = np.sin(np.radians(latitud))
+    x = (np.asarray(longitud) + 180) / 360 * escala
+    y = (0.5 - np.log((1 + seno) / (1 - seno)) / (4 * np.pi)) * escala
+    return x, y
+
+
+class GruposUnidades:
+    # niveles[zoom] tiene latitud y longitud (promedio de sus unidades), número de unidades y la primera
+    # unidad de cada grupo; en ZOOM_MAXIMO cada unidad es su propio grupo
+
+    def __init__(self, unidades, tooltips):
+        latitud = unidades['LATITUD'].to_numpy(float)
+        longitud = unidades['LONGITUD'].to_numpy(float)
+        self.tooltips = np.asarray(tooltips, dtype=object)
+        self.niveles = {}
+        for zoom in range(ZOOM_MAXIMO):
+            x, y = pixeles(latitud, longitud, zoom)
+            columnas = 256 * 2 ** zoom // CELDA + 1
+            celdas = (x // CELDA).astype(np.int64) * columnas + (y // CELDA).astype(np.int64)
+            codigos, _ = pd.factorize(celdas)
+            conteo = np.bincount(codigos, minlength=codigos.max(initial=-1) + 1)
+            _, primera = np.unique(codigos, return_index=True)
+            self.niveles[zoom] = (np.bincount(codigos, latitud) / conteo, np.bincount(codigos, longitud) / conteo,
+                                  conteo, primera)
+        self.niveles[ZOOM_MAXIMO] = (latitud, longitud, np.ones(len(latitud), dtype=np.int64), np.arange(len(latitud)))
+
+    def visibles(self, zoom, limites=None):
+        # FeatureCollection con los grupos del zoom dentro de limites ([[sur, oeste], [norte, este]], los
+        # bounds de dash-leaflet) más MARGEN; sin limites, todos los grupos del zoom
+        latitud, longitud, conteo, primera = self.niveles[int(min(max(zoom or 0, 0), ZOOM_MAXIMO))]
+        dentro = np.ones(len(latitud), dtype=bool)
+        if limites:
+            (sur, oeste), (norte, este) = limites
+            alto, ancho = (norte - sur) * MARGEN, (este - oeste) * MARGEN
+            dentro = ((latitud >= sur - alto) & (latitud <= norte + alto) &
+                      (longitud >= oeste - ancho) & (longitud <= este + ancho))
+        features = []
+        for i in np.flatnonzero(dentro).tolist():
+            n = int(conteo[i])
+            propiedades = {'n': n, 'tooltip': f"{n} unidades"} if n > 1 else {'n': 1, 'tooltip': self.tooltips[primera[i]]}
+            features.append({'type': 'Feature', 'properties': propiedades,
+                             'geometry': {'type': 'Point', 'coordinates': [round(float(longitud[i]), 5), round(float(latitud[i]), 5)]}})
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+@lru_cache(maxsize=MAXIMO_ENTIDADES)
+def _grupos_unidades(entidad, version, version_cobertura):
+    puntos = list(puntos_municipios(entidad).values())
+    columnas = ['CLUES', 'NOMBRE DE LA UNIDAD', 'LATITUD', 'LONGITUD']
+    unidades = pd.concat(puntos, ignore_index=True) if puntos else pd.DataFrame(columns=columnas)
+    # Cada unidad con la población a menos de RADIO_KM (del motor de cobertura)
+    cobertura, _ = obtener_cobertura(entidad)
+    tooltips = []
+    for clues, nombre in zip(unidades['CLUES'].tolist(), unidades['NOMBRE DE LA UNIDAD'].tolist()):
+        posicion = cobertura.posiciones.get(clues)
+        poblacion = f": {int(cobertura.poblacion_radio[posicion]):,} hab. a {RADIO_KM:g} km" if posicion is not None else ""
+        tooltips.append(f"{clues} {nombre}{poblacion}")
+    return GruposUnidades(unidades, tooltips)
+
+
+def grupos_unidades(entidad=ENTIDAD):
+    # Grupos de todas las unidades de la entidad (las que caen dentro de sus municipios); se vuelven a
+    # calcular cuando cambian las unidades o la cobertura
+    cobertura, _ = obtener_cobertura(entidad)
+    return _grupos_unidades(entidad, version_indice(entidad), cobertura.version)
@@ -0,0 +1,232 @@
+# cobertura.py
+# Unidad más cercana a cada localidad y población a menos de RADIO_KM de cada unidad. Las distancias se
+# calculan en metros (cónica de Lambert de INEGI) con árboles STRtree, sin comparar todas las parejas
+# localidad x unidad; al abrir o cerrar unidades solo se recalculan las localidades afectadas
+import os
+import threading
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from funciones import (ARCHIVO_LOCALIDADES, ENTIDAD, RAIZ, cache_dataframe, descendientes, firma_archivos, obtener_jerarquia,
+                       procesar_datos, version_indice)
+from geometrias import CRS_PROYECTADO
+from metricas import instrumentar
+
+RADIO_KM = float(os.environ.get('RADIO_COBERTURA_KM', '5'))
+# Rangos de distancia (km) a la unidad más cercana con que se colorea la capa de cobertura
+LIMITES_DISTANCIA = [2, 5, 10, 20]
+COLORES_DISTANCIA = ['#1a9850', '#91cf60', '#fee08b', '#fc8d59', '#d73027']
+
+_a_metros = Transformer.from_crs(4326, CRS_PROYECTADO, always_xy=True)
+
+
+def puntos(latitud, longitud):
+    x, y = _a_metros.transform(np.asarray(longitud, dtype=float), np.asarray(latitud, dtype=float))
+    return shapely.points(x, y)
+
+
+def _localidades(entidad):
+    df = pd.read_csv(ARCHIVO_LOCALIDADES, dtype=str,
+                     usecols=['CVE_ENT', 'CVE_MUN', 'CVE_LOC', 'NOM_LOC', 'LAT_DECIMAL', 'LON_DECIMAL', 'POB_TOTAL'])
+    df = df[df['CVE_ENT'].astype(int) == entidad]
+    # Misma clave INEGI de localidad que la jerarquía y el cubo de población (municipio * 10000 + localidad)
+    municipio = df['CVE_ENT'].astype(int) * 1000 + df['CVE_MUN'].astype(int)
+    df = pd.DataFrame({
+        'CVE_LOCALIDAD': (municipio * 10000 + df['CVE_LOC'].astype(int)).to_numpy(np.int64),
+        'NOMBRE_LOCALIDAD': df['NOM_LOC'].to_numpy(),
+        # Las localidades con población confidencial ('*') cuentan como cero
+        'POBLACION': pd.to_numeric(df['POB_TOTAL'], errors='coerce').fillna(0).to_numpy(np.int64),
+        'LATITUD': pd.to_numeric(df['LAT_DECIMAL'], errors='coerce').to_numpy(),
+        'LONGITUD': pd.to_numeric(df['LON_DECIMAL'], errors='coerce').to_numpy(),
+    })
+    return df.dropna(subset=['LATITUD', 'LONGITUD']).reset_index(drop=True)
+
+
+def localidades_entidad(entidad=ENTIDAD):
+    # Localidades de la entidad con su punto y población total
+    return cache_dataframe(f'localidades_{entidad}', [ARCHIVO_LOCALIDADES], lambda: _localidades(entidad))
+
+
+def unidades_cobertura(df_unidades_merge):
+    # Una fila por CLUES con coordenadas válidas (las de 0, 0 no están georreferenciadas)
+    df = df_unidades_merge[['CLUES', 'NOMBRE DE LA UNIDAD', 'LATITUD', 'LONGITUD']].drop_duplicates('CLUES')
+    latitud = pd.to_numeric(df['LATITUD'], errors='coerce')
+    longitud = pd.to_numeric(df['LONGITUD'], errors='coerce')
+    validas = latitud.notna() & longitud.notna() & (latitud != 0) & (longitud != 0)
+    return pd.DataFrame({'CLUES': df['CLUES'][validas].to_numpy(dtype=object),
+                         'NOMBRE': df['NOMBRE DE LA UNIDAD'][validas].to_numpy(dtype=object),
+                         'LATITUD': latitud[validas].to_numpy(), 'LONGITUD': longitud[validas].to_numpy()})
+
+
+class Cobertura:
+    # cercana[i] es la posición (en las listas de unidades) de la unidad abierta más cercana a la localidad i
+    # y distancia[i] su distancia en metros; poblacion_radio[j] es la población a menos de radio metros de
+    # la unidad j. Las unidades cerradas se conservan con activa = False para no mover las posiciones
+
+    def __init__(self, localidades, unidades, radio=RADIO_KM * 1000):
+        self.radio = radio
+        self.localidades = localidades.reset_index(drop=True)
+        self.puntos_localidades = puntos(self.localidades['LATITUD'], self.localidades['LONGITUD'])
+        self.arbol_localidades = shapely.STRtree(self.puntos_localidades)
+        self.poblacion = self.localidades['POBLACION'].to_numpy(np.int64)
+        self.cercana = np.full(len(self.localidades), -1)
+        self.distancia = np.full(len(self.localidades), np.inf)
+        self.clues = np.empty(0, dtype=object)
+        self.nombres = np.empty(0, dtype=object)
+        self.coordenadas = np.empty((0, 2))
+        self.puntos_unidades = np.empty(0, dtype=object)
+        self.activa = np.empty(0, dtype=bool)
+        self.poblacion_radio = np.empty(0, dtype=np.int64)
+        self.posiciones = {}  # CLUES -> posición de su registro más reciente
+        self.version = 0  # Cambia con cada alta o cierre; sirve de clave para las cachés de tablas y capas
+        self._arbol_unidades = None
+        self.agregar(unidades)
+
+    def agregar(self, unidades):
+        # Alta de unidades (CLUES, NOMBRE, LATITUD, LONGITUD): cada localidad solo compara su distancia
+        # actual con la de la nueva unidad más cercana
+        if unidades.empty:
+            return
+        nuevos = puntos(unidades['LATITUD'], unidades['LONGITUD'])
+        inicio = len(self.clues)
+        self.clues = np.append(self.clues, unidades['CLUES'].to_numpy(dtype=object))
+        self.nombres = np.append(self.nombres, unidades['NOMBRE'].to_numpy(dtype=object))
+        self.coordenadas = np.vstack([self.coordenadas, unidades[['LATITUD', 'LONGITUD']].to_numpy(float)])
+        self.puntos_unidades = np.append(self.puntos_unidades, nuevos)
+        self.activa = np.append(self.activa, np.ones(len(nuevos), dtype=bool))
+        # Población a menos del radio: parejas (unidad, localidad) que da el árbol de localidades
+        unidad, localidad = self.arbol_localidades.query(nuevos, predicate='dwithin', distance=self.radio)
+        self.poblacion_radio = np.append(
+            self.poblacion_radio, np.bincount(unidad, weights=self.poblacion[localidad], minlength=len(nuevos)).astype(np.int64))
+        self.posiciones.update(zip(unidades['CLUES'].tolist(), range(inicio, len(self.clues))))
+        if len(self.puntos_localidades):
+            (localidad, unidad), distancia = shapely.STRtree(nuevos).query_nearest(
+                self.puntos_localidades, return_distance=True, all_matches=False)
+            mejores = distancia < self.distancia[localidad]
+            self.cercana[localidad[mejores]] = inicio + unidad[mejores]
+            self.distancia[localidad[mejores]] = distancia[mejores]
+        self._cambio()
+
+    def cerrar(self, clues):
+        # Cierre de unidades: solo las localidades cuya unidad más cercana se cerró buscan otra
+        cerradas = np.array([self.posiciones[c] for c in clues if c in self.posiciones], dtype=int)
+        cerradas = cerradas[self.activa[cerradas]]
+        if not len(cerradas):
+            return
+        self.activa[cerradas] = False
+        self.poblacion_radio[cerradas] = 0
+        afectadas = np.flatnonzero(np.isin(self.cercana, cerradas))
+        self.cercana[afectadas], self.distancia[afectadas] = -1, np.inf
+        self._cambio()
+        abiertas = np.flatnonzero(self.activa)
+        if len(afectadas) and len(abiertas):
+            (localidad, unidad), distancia = self.arbol_unidades().query_nearest(
+                self.puntos_localidades[afectadas], return_distance=True, all_matches=False)
+            self.cercana[afectadas[localidad]] = abiertas[unidad]
+            self.distancia[afectadas[localidad]] = distancia
+
+    def actualizar(self, unidades):
+        # Aplica las diferencias con un catálogo nuevo: cierra las CLUES que ya no están (o que cambiaron
+        # de lugar) y da de alta las nuevas, sin recalcular el resto
+        abiertas = {self.clues[p]: tuple(self.coordenadas[p]) for p in np.flatnonzero(self.activa)}
+        nuevas = dict(zip(unidades['CLUES'], zip(unidades['LATITUD'], unidades['LONGITUD'])))
+        self.cerrar([c for c, coordenadas in abiertas.items() if nuevas.get(c) != coordenadas])
+        self.agregar(unidades[np.array([abiertas.get(c) != coordenadas for c, coordenadas in nuevas.items()], dtype=bool)])
+
+    def arbol_unidades(self):
+        # Árbol de las unidades abiertas; se vuelve a armar solo después de un alta o un cierre
+        if self._arbol_unidades is None:
+            self._arbol_unidades = shapely.STRtree(self.puntos_unidades[self.activa])
+        return self._arbol_unidades
+
+    def _cambio(self):
+        self._arbol_unidades = None
+        self.version += 1
+
+    def tabla_localidades(self, filas=None):
+        # Una fila por localidad con su unidad más cercana, de la más lejana a la más cercana
+        filas = np.arange(len(self.localidades)) if filas is None else filas
+        cercana = self.cercana[filas]
+        asignada = cercana >= 0
+        df = pd.DataFrame({
+            'LOCALIDAD': self.localidades['NOMBRE_LOCALIDAD'].to_numpy()[filas],
+            'POBLACION': self.poblacion[filas],
+            'CLUES MAS CERCANA': np.where(asignada, self.clues[np.maximum(cercana, 0)] if len(self.clues) else None, None),
+            'UNIDAD MAS CERCANA': np.where(asignada, self.nombres[np.maximum(cercana, 0)] if len(self.clues) else None, None),
+            'DISTANCIA KM': np.round(np.where(asignada, self.distancia[filas], np.nan) / 1000, 2),
+        })
+        return df.sort_values('DISTANCIA KM', ascending=False, kind='mergesort', na_position='first').reset_index(drop=True)
+
+    def filas_nodo(self, jerarquia, nodo):
+        # Localidades (posiciones) del nodo de la navegación; las de una jurisdicción son las de sus municipios
+        nivel, clave = nodo
+        claves = self.localidades['CVE_LOCALIDAD'].to_numpy()
+        if clave is None:
+            return np.arange(len(claves))
+        if nivel == 'localidad':
+            return np.flatnonzero(claves == clave)
+        municipios = [clave] if nivel == 'municipio' else [m for _, m in descendientes(jerarquia, nodo, 'municipio')]
+        return np.flatnonzero(np.isin(claves // 10000, municipios))
+
+    def geojson(self, filas):
+        # Puntos de las localidades con su distancia en km a la unidad más cercana (para el color)
+        features = []
+        latitud, longitud = self.localidades['LATITUD'].to_numpy(), self.localidades['LONGITUD'].to_numpy()
+        nombres = self.localidades['NOMBRE_LOCALIDAD'].to_numpy()
+        for i in filas.tolist():
+            km = None if self.cercana[i] < 0 else round(self.distancia[i] / 1000, 2)
+            tooltip = f"{nombres[i]}: {'sin unidad' if km is None else f'{km} km a {self.clues[self.cercana[i]]}'}"
+            features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [round(longitud[i], 5), round(latitud[i], 5)]},
+                             'properties': {'km': km, 'tooltip': tooltip}})
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+# entidad -> {'firma', 'version', 'cobertura', 'entradas'}; la cobertura se actualiza (no se reconstruye)
+# cuando cambia el catálogo de unidades y se reconstruye si cambia el archivo de localidades
+_coberturas = {}
+_candado = threading.Lock()
+
+
+@instrumentar
+def construir_cobertura(entidad=ENTIDAD):
+    return Cobertura(localidades_entidad(entidad), unidades_cobertura(procesar_datos(entidad=entidad)))
+
+
+def obtener_cobertura(entidad=ENTIDAD):
+    firma, version = firma_archivos([ARCHIVO_LOCALIDADES]), version_indice(entidad)
+    with _candado:
+        actual = _coberturas.get(entidad)
+        if actual is None or actual['firma'] != firma:
+            actual = _coberturas[entidad] = {'firma': firma, 'version': version,
+                                             'cobertura': construir_cobertura(entidad), 'entradas': (None, {})}
+        elif actual['version'] != version:
+            actual['cobertura'].actualizar(unidades_cobertura(procesar_datos(entidad=entidad)))
+            actual['version'] = version
+        cobertura = actual['cobertura']
+        # Tablas y capas ya armadas, válidas mientras no haya altas ni cierres
+        if actual['entradas'][0] != cobertura.version:
+            actual['entradas'] = (cobertura.version, {})
+        return cobertura, actual['entradas'][1]
+
+
+def entrada_cobertura(entidad=ENTIDAD, nodo=RAIZ):
+    # Tabla de cobertura del nodo con la forma de una entrada del índice, para paginarla con tabla.pagina
+    cobertura, entradas = obtener_cobertura(entidad)
+    if ('tabla', nodo) not in entradas:
+        filas = cobertura.filas_nodo(obtener_jerarquia(entidad), nodo)
+        entradas[('tabla', nodo)] = {'tabla': cobertura.tabla_localidades(filas)}
+    return entradas[('tabla', nodo)]
+
+
+def capa_cobertura(entidad=ENTIDAD, nodo=RAIZ):
+    # GeoJSON con las localidades del nodo (las unidades van en la capa de clusters.py)
+    cobertura, entradas = obtener_cobertura(entidad)
+    if ('capa', nodo) not in entradas:
+        filas = cobertura.filas_nodo(obtener_jerarquia(entidad), nodo)
+        if nodo == RAIZ:
+            # En la vista estatal solo las localidades fuera del radio de toda unidad, para no mandar
+            # todos los puntos de la entidad
+            filas = filas[cobertura.distancia[filas] > cobertura.radio]
+        entradas[('capa', nodo)] = cobertura.geojson(filas)
+    return entradas[('capa', nodo)]
@@ -0,0 +1,3 @@
+# conftest.py
+# Los módulos del proyecto están en la raíz del repositorio; pytest agrega esta carpeta a sys.path para
+# que las pruebas de tests/ puedan importarlos
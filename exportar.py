@@ -0,0 +1,88 @@
+# exportar.py
+import hashlib
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+from flask import abort, request, send_file
+from cache_mapas import desalojar, obtener_archivo
+from metricas import contar_cache
+
+DIRECTORIO_EXPORTACIONES = "cache/exportaciones"
+MAXIMO_EXPORTACIONES = 100  # Archivos exportados que se conservan en disco
+TAMANO_BLOQUE = 5000  # Filas que se escriben por bloque
+
+FORMATOS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def bloques(df):
+    for inicio in range(0, len(df), TAMANO_BLOQUE):
+        yield inicio, df.iloc[inicio:inicio + TAMANO_BLOQUE]
+
+
+def escribir_xlsx(df, ruta):
+    # constant_memory escribe cada fila al disco en cuanto se completa
+    libro = xlsxwriter.Workbook(ruta, {'constant_memory': True, 'nan_inf_to_errors': True})
+    hoja = libro.add_worksheet('Sheet1')
+    negritas = libro.add_format({'bold': True})
+    hoja.write_row(0, 0, list(df.columns), negritas)
+    for inicio, bloque in bloques(df):
+        valores = bloque.astype(object).where(bloque.notna(), None).itertuples(index=False, name=None)
+        for desplazamiento, fila in enumerate(valores):
+            hoja.write_row(inicio + desplazamiento + 1, 0, fila)
+    libro.close()
+
+
+def escribir_csv(df, ruta):
+    # utf-8-sig para que Excel abra bien los acentos
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as archivo:
+        for inicio, bloque in bloques(df):
+            bloque.to_csv(archivo, index=False, header=inicio == 0)
+        if df.empty:
+            df.to_csv(archivo, index=False)
+
+
+def escribir_parquet(df, ruta):
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(ruta, esquema) as escritor:
+        for _, bloque in bloques(df):
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+
+
+# Parámetros de la URL con la selección, en el orden en que los recibe obtener_tabla
+PARAMETROS_SELECCION = ['entidad', 'jurisdiccion', 'municipio', 'localidad']
+
+ESCRITORES = {'xlsx': escribir_xlsx, 'csv': escribir_csv, 'parquet': escribir_parquet}
+
+
+def exportar(df, clave, formato):
+    # Devuelve la ruta del archivo exportado; si ya existe para la misma clave no se vuelve a generar
+    nombre = hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()[:20]
+    ruta = os.path.join(DIRECTORIO_EXPORTACIONES, f"exportacion_{nombre}.{formato}")
+    generado = obtener_archivo(ruta, lambda temporal: ESCRITORES[formato](df, temporal))
+    contar_cache('exportaciones', not generado)
+    if generado:
+        desalojar(MAXIMO_EXPORTACIONES, DIRECTORIO_EXPORTACIONES, "exportacion_*")
+    return ruta
+
+
+def registrar_exportacion(server, obtener_tabla, version):
+    # Ruta /exportar/<formato>?entidad=...&jurisdiccion=...&municipio=...&localidad=...: el archivo se
+    # arma en el servidor con la selección actual y se envía por bloques, sin que el navegador suba la tabla
+    @server.route('/exportar/<formato>')
+    def descargar_exportacion(formato):
+        if formato not in FORMATOS:
+            abort(404)
+        parametros = [request.args.get(nombre, type=int) for nombre in PARAMETROS_SELECCION]
+        seleccion = obtener_tabla(*parametros)
+        if seleccion is None:
+            abort(404)
+        nombre_seleccion, df = seleccion
+        ruta = exportar(df, (version(parametros[0]), *parametros, formato), formato)
+        nombre = f"unidades_{nombre_seleccion or 'todas'}.{formato}"
+        return send_file(os.path.abspath(ruta), mimetype=FORMATOS[formato], as_attachment=True, download_name=nombre)
+
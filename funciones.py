@@ -1,23 +1,256 @@
 # funciones.py
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
 from unidecode import unidecode
+from horarios import HorariosSemana
+from metricas import contar_cache, instrumentar
+from poblacion import QUINQUENIOS, CuboPoblacion, NIVELES, columnas_poblacion
+from vinculacion import vincular
+
+# Periodo (AAAAMM) del catálogo CLUES y entidad que muestra el tablero al abrirse
+PERIODO = os.environ.get('PERIODO_CLUES', '202501')
+ENTIDAD = int(os.environ.get('ENTIDAD_CLUES', '13'))
+# Entidades cuyos datos se mantienen en memoria a la vez; las demás se cargan al consultarlas
+MAXIMO_ENTIDADES = int(os.environ.get('MAXIMO_ENTIDADES', '4'))
+
+# Claves y nombres de las entidades federativas (INEGI)
+ENTIDADES = {
+    1: 'Aguascalientes', 2: 'Baja California', 3: 'Baja California Sur', 4: 'Campeche', 5: 'Coahuila de Zaragoza',
+    6: 'Colima', 7: 'Chiapas', 8: 'Chihuahua', 9: 'Ciudad de México', 10: 'Durango', 11: 'Guanajuato',
+    12: 'Guerrero', 13: 'Hidalgo', 14: 'Jalisco', 15: 'México', 16: 'Michoacán de Ocampo', 17: 'Morelos',
+    18: 'Nayarit', 19: 'Nuevo León', 20: 'Oaxaca', 21: 'Puebla', 22: 'Querétaro', 23: 'Quintana Roo',
+    24: 'San Luis Potosí', 25: 'Sinaloa', 26: 'Sonora', 27: 'Tabasco', 28: 'Tamaulipas', 29: 'Tlaxcala',
+    30: 'Veracruz de Ignacio de la Llave', 31: 'Yucatán', 32: 'Zacatecas',
+}
+
+# Archivos fuente de los datos del tablero
+ARCHIVO_UNIDADES = f"files/ESTABLECIMIENTO_SALUD_{PERIODO}.parquet"
+ARCHIVO_UNIDADES_SSH = f"files/ESTABLECIMIENTO_SALUD_{PERIODO}_SSH.parquet"
+ARCHIVO_HORARIOS = f"files/ESTABLECIMIENTO_SALUD_{PERIODO}_horarios.parquet"
+ARCHIVO_POBLACION = "files/Reporte Población.xlsx"  # Hidalgo
+# Reportes de población de las demás entidades: Reporte Población_<clave de 2 dígitos>.xlsx
+DIRECTORIO_POBLACION = "files/poblacion"
+ARCHIVO_LOCALIDADES = "files/mapa/AGEEML_202410311056515.csv"
+
+# Datasets particionados que genera unidades_conversion.py --incremental
+DATASET_CLUES = "files/clues"
+DATASET_HORARIOS = "files/clues_horarios"
+PARTICIONES_CLUES = ds.partitioning(
+    pa.schema([('periodo', pa.string()), ('entidad', pa.int64()), ('institucion', pa.string())]), flavor='hive')
+PARTICIONES_HORARIOS = ds.partitioning(pa.schema([('periodo', pa.string())]), flavor='hive')
+
+# Filtros de cada institución sobre el catálogo particionado
+FILTROS_IMSS_BIENESTAR = [('institucion', '=', 'IMB'), ('NOMBRE TIPO ESTABLECIMIENTO', '=', 'DE CONSULTA EXTERNA')]
+FILTROS_SSH = [('institucion', '=', 'SSA'), ('NOMBRE TIPO ESTABLECIMIENTO', '=', 'DE CONSULTA EXTERNA'),
+               ('CLAVE MOTIVO BAJA', '=', 9)]
+
+COLUMNAS_TABLA = ['CLUES', 'JURISDICCION', 'NOMBRE DE LA UNIDAD', 'HORARIO']
+# Nodo raíz (toda la entidad) de la navegación por jurisdicción, municipio y localidad
+RAIZ = ('entidad', None)
+# Para que una jurisdicción o una localidad no se confunda con el municipio del mismo nombre
+PREFIJOS_NIVEL = {'jurisdiccion': 'Jurisdicción ', 'localidad': 'Localidad '}
+# Columnas del reporte de población con la ubicación de la unidad -> columnas de la tabla por CLUES
+COLUMNAS_UNIDAD_POBLACION = {
+    'Clave Jurisdicción Unidad': 'CVE_JURISDICCION',
+    'Nombre Jurisdicción Unidad': 'NOMBRE_JURISDICCION',
+    'Clave Municipio Unidad': 'CVE_MUN',
+    'Nombre Municipio Unidad': 'NOMBRE_MUNICIPIO',
+    'Clave Localidad Unidad': 'CVE_LOC',
+    'Nombre Localidad Unidad': 'NOMBRE_LOCALIDAD',
+    'CLUES': 'CLUES',
+    'Nombre Unidad': 'NOMBRE_UNIDAD',
+}
+
+
+# Directorio donde se guardan los DataFrames ya procesados entre arranques
+DIRECTORIO_CACHE = "cache"
+# Incrementar cuando cambie la forma de procesar los datos para descartar la caché
+VERSION_CACHE = 4
+
+
+def hash_archivo(ruta):
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def cache_dataframe(nombre, fuentes, funcion):
+    # Devuelve el DataFrame guardado en formato Feather (Arrow IPC) si los archivos fuente
+    # no cambiaron (tamaño, fecha de modificación y hash); si cambiaron, lo vuelve a calcular
+    ruta_cache = os.path.join(DIRECTORIO_CACHE, f"{nombre}.feather")
+    ruta_meta = os.path.join(DIRECTORIO_CACHE, f"{nombre}.json")
+    actuales = [(ruta, os.stat(ruta)) for ruta in fuentes]
+
+    meta = None
+    if os.path.exists(ruta_cache) and os.path.exists(ruta_meta):
+        try:
+            with open(ruta_meta, encoding='utf-8') as archivo:
+                meta = json.load(archivo)
+        except (OSError, ValueError):
+            meta = None
+    if meta is not None and meta.get('version') == VERSION_CACHE and [f['ruta'] for f in meta['fuentes']] == list(fuentes):
+        iguales = all(
+            f['tamano'] == info.st_size and f['mtime'] == info.st_mtime_ns
+            for f, (ruta, info) in zip(meta['fuentes'], actuales)
+        )
+        if not iguales:
+            # La fecha cambió (por ejemplo tras un checkout); se compara el contenido
+            iguales = all(
+                f['tamano'] == info.st_size and f['hash'] == hash_archivo(ruta)
+                for f, (ruta, info) in zip(meta['fuentes'], actuales)
+            )
+            if iguales:
+                for f, (ruta, info) in zip(meta['fuentes'], actuales):
+                    f['mtime'] = info.st_mtime_ns
+                _escribir_json(ruta_meta, meta)
+        if iguales:
+            try:
+                df = leer_cache(ruta_cache)
+                contar_cache('dataframes', True)
+                return df
+            except Exception as e:
+                print(f"No se pudo leer la caché {ruta_cache}: {e}")
+
+    contar_cache('dataframes', False)
+    df = funcion()
+    meta = {
+        'version': VERSION_CACHE,
+        'fuentes': [
+            {'ruta': ruta, 'tamano': info.st_size, 'mtime': info.st_mtime_ns, 'hash': hash_archivo(ruta)}
+            for ruta, info in actuales
+        ],
+    }
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        # Sin compresión para poder abrirlo con memory_map (ver leer_cache)
+        df.to_feather(temporal, compression='uncompressed')
+        os.replace(temporal, ruta_cache)
+        _escribir_json(ruta_meta, meta)
+    except Exception as e:
+        print(f"No se pudo guardar la caché {ruta_cache}: {e}")
+    return df
+
+
+def leer_cache(ruta):
+    # El archivo se mapea en memoria en lugar de copiarse: las columnas numéricas sin nulos quedan
+    # como vistas del archivo, y el sistema operativo comparte esas páginas entre los workers
+    return feather.read_table(ruta, memory_map=True).to_pandas(split_blocks=True)
+
+
+def _escribir_json(ruta, datos):
+    # Escritura atómica para que otro worker nunca lea un archivo a medias
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    os.replace(temporal, ruta)
+
+
+@lru_cache(maxsize=None)
+def normalizar_nombre(nombre):
+    # Mayúsculas y sin acentos, como se comparaban antes los nombres de municipio
+    return unidecode(str(nombre)).upper().strip()
+
+
+def normalizar_nombres(serie):
+    # Normaliza cada valor distinto una sola vez y reparte el resultado con los códigos de factorize
+    codigos, unicos = pd.factorize(serie)
+    normalizados = np.array([normalizar_nombre(valor) for valor in unicos] + [None], dtype=object)
+    return pd.Series(normalizados[codigos], index=serie.index)
+
+
+def clave_municipio(entidad, municipio):
+    # Clave INEGI entidad+municipio como entero (13 y 1 -> 13001); funciona con escalares y Series
+    return entidad * 1000 + municipio
 
-def procesar_datos():
-    # Cargar los datos
 
-    df_unidades = pd.read_parquet("files/ESTABLECIMIENTO_SALUD_202501.parquet")
-    df_unidades_ssh = pd.read_parquet("files/ESTABLECIMIENTO_SALUD_202501_ssh.parquet")
-    df_horarios = pd.read_parquet("files/ESTABLECIMIENTO_SALUD_202501_horarios.parquet")
-    # Unir los datos
-    df_unidades_merge = pd.merge(df_unidades, 
-                             df_unidades_ssh[['NOMBRE DE LA UNIDAD', 'CLAVE DEL MUNICIPIO', 'CLAVE DE LA LOCALIDAD', 'CLUES']], 
-                             on=['NOMBRE DE LA UNIDAD', 'CLAVE DEL MUNICIPIO', 'CLAVE DE LA LOCALIDAD'],  # Se usan varias columnas como clave
-                             how='left', 
-                             suffixes=('', '_SSH'))
+@instrumentar
+def dimension_municipios():
+    # Catálogo de municipios por clave INEGI a partir del archivo de localidades
+    return cache_dataframe('dimension_municipios', [ARCHIVO_LOCALIDADES], _dimension_municipios)
+
+
+def _dimension_municipios():
+    df_localidades = pd.read_csv(ARCHIVO_LOCALIDADES, dtype=str, usecols=['CVE_ENT', 'NOM_ENT', 'CVE_MUN', 'NOM_MUN'])
+    df_dimension = df_localidades.drop_duplicates(['CVE_ENT', 'CVE_MUN']).reset_index(drop=True)
+    df_dimension['CVE_ENT'] = df_dimension['CVE_ENT'].astype(int)
+    df_dimension['CVE_MUN'] = df_dimension['CVE_MUN'].astype(int)
+    df_dimension['CVE_MUNICIPIO'] = clave_municipio(df_dimension['CVE_ENT'], df_dimension['CVE_MUN'])
+    df_dimension['NOMBRE_NORMALIZADO'] = normalizar_nombres(df_dimension['NOM_MUN'])
+    return df_dimension[['CVE_MUNICIPIO', 'CVE_ENT', 'CVE_MUN', 'NOM_ENT', 'NOM_MUN', 'NOMBRE_NORMALIZADO']]
+
+
+def nombres_municipios(df_unidades_merge):
+    # Nombre de cada municipio de las unidades tomado del catálogo por su clave INEGI; el de las unidades
+    # solo si la clave no está en el catálogo
+    nombres = df_unidades_merge.groupby('CVE_MUNICIPIO')['MUNICIPIO'].first()
+    catalogo = dimension_municipios().drop_duplicates('CVE_MUNICIPIO').set_index('CVE_MUNICIPIO')['NOM_MUN']
+    return catalogo.reindex(nombres.index).fillna(nombres)
+
+
+def usa_dataset(periodo=PERIODO):
+    return os.path.isdir(os.path.join(DATASET_CLUES, f"periodo={periodo}"))
+
+
+def fuentes_unidades(periodo=PERIODO, entidad=ENTIDAD):
+    # Archivos de los que depende procesar_datos para el periodo y la entidad
+    if not usa_dataset(periodo):
+        return [ARCHIVO_UNIDADES, ARCHIVO_UNIDADES_SSH, ARCHIVO_HORARIOS]
+    rutas = []
+    for institucion in ['IMB', 'SSA']:
+        rutas += sorted(glob.glob(os.path.join(
+            DATASET_CLUES, f"periodo={periodo}", f"entidad={entidad}", f"institucion={institucion}", "*.parquet")))
+    rutas += sorted(glob.glob(os.path.join(DATASET_HORARIOS, f"periodo={periodo}", "*.parquet")))
+    return rutas
+
+
+@instrumentar
+def leer_clues(periodo, entidad, filtros):
+    # Solo se leen las particiones del periodo/entidad/institución; el resto de los filtros
+    # se empujan a las estadísticas de los row groups
+    filtros = [('periodo', '=', periodo), ('entidad', '=', entidad)] + filtros
+    df = pd.read_parquet(DATASET_CLUES, partitioning=PARTICIONES_CLUES, filters=filtros)
+    return df.drop(columns=['periodo', 'entidad', 'institucion'])
+
+
+@instrumentar
+def procesar_datos(periodo=PERIODO, entidad=ENTIDAD):
+    return cache_dataframe(f'unidades_merge_{periodo}_{entidad}', fuentes_unidades(periodo, entidad),
+                           lambda: _procesar_datos(periodo, entidad))
+
+
+def _procesar_datos(periodo=PERIODO, entidad=ENTIDAD):
+    # Cargar los datos
+    if usa_dataset(periodo):
+        df_unidades = leer_clues(periodo, entidad, FILTROS_IMSS_BIENESTAR)
+        df_unidades_ssh = leer_clues(periodo, entidad, FILTROS_SSH)
+        df_horarios = pd.read_parquet(DATASET_HORARIOS, partitioning=PARTICIONES_HORARIOS,
+                                      filters=[('periodo', '=', periodo)]).drop(columns=['periodo'])
+    else:
+        # Los Parquet pueden traer una o varias entidades (unidades_conversion.py --entidad)
+        df_unidades = pd.read_parquet(ARCHIVO_UNIDADES, filters=[('CLAVE DE LA ENTIDAD', '=', entidad)])
+        df_unidades_ssh = pd.read_parquet(ARCHIVO_UNIDADES_SSH, filters=[('CLAVE DE LA ENTIDAD', '=', entidad)])
+        df_horarios = pd.read_parquet(ARCHIVO_HORARIOS)
+    # Unir los datos: la pareja de cada unidad en el catálogo de la Secretaría se busca en su misma
+    # localidad (y después en su municipio) por nombre parecido, con la confianza y si es ambigua
+    df_unidades_merge = pd.concat([df_unidades, vincular(df_unidades, df_unidades_ssh)], axis=1)
     # Reorganizar columnas
     cols = list(df_unidades_merge.columns)
     clues_index = cols.index('CLUES')
-    cols.insert(clues_index + 1, cols.pop(cols.index('CLUES_SSH')))
+    for posicion, columna in enumerate(['CLUES_SSH', 'CONFIANZA_SSH', 'AMBIGUO_SSH']):
+        cols.insert(clues_index + 1 + posicion, cols.pop(cols.index(columna)))
     df_unidades_merge = df_unidades_merge[cols]
 
     # Merge con horarios
@@ -28,34 +261,327 @@ def procesar_datos():
         on='CLUES',
         how='left'
     )
+    # Clave INEGI del municipio para unir con población y geometrías sin comparar nombres
+    df_unidades_merge['CVE_MUNICIPIO'] = clave_municipio(
+        df_unidades_merge['CLAVE DE LA ENTIDAD'], df_unidades_merge['CLAVE DEL MUNICIPIO'])
     return df_unidades_merge
 
 
 def municipios(df_unidades_merge):
-    municipios = df_unidades_merge['MUNICIPIO'].unique()
-    df_municipios = pd.DataFrame(municipios, columns=['nombre_municipio'])
-    df_municipios['id_municipio'] = range(1, len(df_municipios) + 1)
-    return df_municipios
-
-
-def piramide_pob():
-    df_poblacion_mpios_total = pd.read_excel('files/Reporte Población.xlsx', skiprows=1)
-    columnas_borrar = ['Clave Jurisdicción Unidad', 'Nombre Jurisdicción Unidad', 'Clave Jurisdicción Loc.', 'ageb',
-                   'Clave Municipio Unidad','CLUES','Clave Localidad Unidad','Nombre Localidad Unidad',
-                   'Nombre Unidad','Nombre Jurisdicción Loc','Clave Municipio Loc','Nombre Municipio Loc','Clave Localidad','Nombre Localidad']
-    df_poblacion_mpios_total.drop(columnas_borrar, axis=1, inplace=True)
-    # Convertir la columna 'Nombre Municipio Unidad' a mayúsculas y eliminar acentos
-    df_poblacion_mpios_total['Nombre Municipio Unidad'] = df_poblacion_mpios_total['Nombre Municipio Unidad'].apply(lambda x: unidecode(x).upper())
-    df_poblacion_mpios_total = df_poblacion_mpios_total.groupby(['Nombre Municipio Unidad']).sum().reset_index()
-    
-    return df_poblacion_mpios_total
-
-
-def totales_pob(df_poblacion_mpios_total):
-    columnas_hombres = [col for col in df_poblacion_mpios_total.columns if col.startswith('h')]
-    columnas_mujeres = [col for col in df_poblacion_mpios_total.columns if col.startswith('m')]
-    # Calcular los totales de hombres y mujeres
-    total_hombres = df_poblacion_mpios_total[columnas_hombres].sum().sum()  # Suma completa de todas las filas y columnas de hombres
-    total_mujeres = df_poblacion_mpios_total[columnas_mujeres].sum().sum()  # Suma completa de todas las filas y columnas de mujeres
+    # id_municipio es la clave INEGI entidad+municipio que usan el índice y las geometrías
+    df_municipios = df_unidades_merge[['CVE_MUNICIPIO']].drop_duplicates('CVE_MUNICIPIO')
+    df_municipios['MUNICIPIO'] = df_municipios['CVE_MUNICIPIO'].map(nombres_municipios(df_unidades_merge))
+    df_municipios = df_municipios.rename(columns={'MUNICIPIO': 'nombre_municipio', 'CVE_MUNICIPIO': 'id_municipio'})
+    return df_municipios[['nombre_municipio', 'id_municipio']].reset_index(drop=True)
+
+
+def archivo_poblacion(entidad=ENTIDAD):
+    ruta = os.path.join(DIRECTORIO_POBLACION, f"Reporte Población_{entidad:02d}.xlsx")
+    if entidad == 13 and not os.path.exists(ruta):
+        return ARCHIVO_POBLACION
+    return ruta
+
+
+def fuentes_poblacion(entidad=ENTIDAD):
+    # Sin reporte de población la entidad se muestra solo con sus unidades
+    ruta = archivo_poblacion(entidad)
+    return [ruta] if os.path.exists(ruta) else []
+
+
+def descendientes(jerarquia, nodo, nivel):
+    # Nodos de un nivel que cuelgan de nodo, bajando por las listas de hijos ya calculadas; un municipio
+    # repartido entre jurisdicciones se alcanza por varias y aparece una sola vez
+    if nodo[0] == nivel:
+        return [nodo]
+    return list(dict.fromkeys(descendiente for hijo in jerarquia[nodo]['hijos']
+                              for descendiente in descendientes(jerarquia, hijo, nivel)))
+
+
+def ancestros(jerarquia, nodo):
+    # El nodo y todos los que tiene arriba, por cualquiera de sus padres
+    vistos, pendientes = set(), [nodo]
+    while pendientes:
+        actual = pendientes.pop()
+        if actual not in vistos:
+            vistos.add(actual)
+            pendientes += jerarquia[actual]['padres']
+    return vistos
+
+
+def opciones_nivel(entidad=ENTIDAD, nivel='municipio', padre=RAIZ):
+    # Opciones de un dropdown de la navegación: nodos del nivel que cuelgan de padre, por nombre
+    jerarquia = obtener_jerarquia(entidad)
+    if padre not in jerarquia:
+        return []
+    opciones = [{'label': jerarquia[nodo]['nombre'], 'value': nodo[1]} for nodo in descendientes(jerarquia, padre, nivel)]
+    return sorted(opciones, key=lambda opcion: str(opcion['label']))
+
+
+def etiqueta_nodo(entidad, nodo, nombre):
+    # Nombre de un nodo para títulos y nombres de archivo
+    if nodo == RAIZ:
+        return ENTIDADES.get(entidad, 'la Entidad')
+    return PREFIJOS_NIVEL.get(nodo[0], '') + str(nombre)
+
+
+def seleccion_nodo(entidad, jurisdiccion=None, municipio=None, localidad=None):
+    # Nodo más específico de la selección de los dropdowns. Al cambiar un nivel, los de abajo pueden
+    # traer todavía un valor anterior (o de otra entidad): solo se toma si cuelga del nivel de arriba
+    entidad = entidad or ENTIDAD
+    jerarquia = obtener_jerarquia(entidad)
+    nodo = RAIZ
+    for candidato in [('jurisdiccion', jurisdiccion), ('municipio', municipio), ('localidad', localidad)]:
+        if candidato[1] is None:
+            continue
+        if candidato not in jerarquia or nodo not in ancestros(jerarquia, candidato):
+            break
+        nodo = candidato
+    return entidad, nodo
+
+
+def poblacion_unidades(entidad=ENTIDAD):
+    fuentes = fuentes_poblacion(entidad)
+    if not fuentes:
+        columnas = [columna for columna_clave, columna_nombre in NIVELES.values() for columna in (columna_clave, columna_nombre)]
+        return pd.DataFrame(columns=columnas + columnas_poblacion())
+    return cache_dataframe(f'poblacion_unidades_{entidad}', fuentes, lambda: _poblacion_unidades(entidad))
+
+
+def _poblacion_unidades(entidad=ENTIDAD):
+    # Población por CLUES con la jurisdicción, el municipio y la localidad de la unidad; los demás
+    # niveles del cubo se suman a partir de esta tabla
+    columnas = list(COLUMNAS_UNIDAD_POBLACION) + columnas_poblacion()
+    df_poblacion = pd.read_excel(archivo_poblacion(entidad), skiprows=1, usecols=columnas)
+    df_poblacion = df_poblacion.rename(columns=COLUMNAS_UNIDAD_POBLACION)
+    df_poblacion[columnas_poblacion()] = df_poblacion[columnas_poblacion()].apply(pd.to_numeric, errors='coerce').fillna(0).astype(np.int64)
+    ubicacion = [columna for columna in COLUMNAS_UNIDAD_POBLACION.values() if columna != 'CLUES']
+    df_poblacion = df_poblacion.groupby('CLUES', sort=False).agg(
+        {**{columna: 'first' for columna in ubicacion}, **{columna: 'sum' for columna in columnas_poblacion()}}
+    ).reset_index()
+    # Claves INEGI: municipio = entidad * 1000 + municipio, localidad = municipio * 10000 + localidad
+    df_poblacion.insert(0, 'NOMBRE_ENTIDAD', ENTIDADES.get(entidad))
+    df_poblacion.insert(0, 'CVE_ENTIDAD', entidad)
+    df_poblacion['CVE_MUNICIPIO'] = clave_municipio(entidad, df_poblacion['CVE_MUN'])
+    df_poblacion['CVE_LOCALIDAD'] = df_poblacion['CVE_MUNICIPIO'] * 10000 + df_poblacion['CVE_LOC']
+    # El nombre del municipio en mayúsculas y sin acentos, igual que en el catálogo de unidades
+    df_poblacion['NOMBRE_MUNICIPIO'] = normalizar_nombres(df_poblacion['NOMBRE_MUNICIPIO'])
+    columnas = [columna for columna_clave, columna_nombre in NIVELES.values() for columna in (columna_clave, columna_nombre)]
+    return df_poblacion[columnas + columnas_poblacion()]
+
+
+@instrumentar
+def cubo_poblacion(entidad=ENTIDAD):
+    return CuboPoblacion(poblacion_unidades(entidad))
+
+
+@instrumentar
+def totales_pob(cubo):
+    # Hombres y mujeres de toda la entidad, sumados en el cubo
+    total_hombres, total_mujeres = (int(total) for total in cubo.totales('entidad').sum(axis=0))
     poblacion_total = total_hombres + total_mujeres
-    return total_hombres, total_mujeres, poblacion_total
\ No newline at end of file
+    return total_hombres, total_mujeres, poblacion_total
+
+
+def estadisticas(total_unidades, total_hombres, total_mujeres):
+    return {
+        'Total de Unidades': int(total_unidades),
+        'Total de Hombres': int(total_hombres),
+        'Total de Mujeres': int(total_mujeres),
+        'Poblacion Total': int(total_hombres) + int(total_mujeres),
+    }
+
+
+def entrada_nodo(nombre, tabla, piramide, unidades):
+    # Tabla, pirámide y estadísticas de un municipio, jurisdicción o localidad
+    entrada = {'nombre': nombre, 'tabla': tabla, 'hombres': None, 'mujeres': None, 'estadisticas': None}
+    if piramide is not None:
+        entrada['hombres'] = piramide[0].tolist()
+        entrada['mujeres'] = piramide[1].tolist()
+        hombres, mujeres = piramide.sum(axis=1, dtype=np.int64)
+        entrada['estadisticas'] = estadisticas(unidades, hombres, mujeres)
+    return entrada
+
+
+@instrumentar
+def construir_indice(df_unidades_merge, cubo):
+    # Precalcular por municipio (clave INEGI) la tabla, la pirámide y las estadísticas para
+    # que cada selección del dropdown sea una búsqueda en un diccionario
+    tabla = df_unidades_merge[COLUMNAS_TABLA]
+    total_hombres, total_mujeres, _ = totales_pob(cubo)
+    piramide_entidad = cubo.valores['entidad'].sum(axis=0)
+    con_poblacion = len(cubo.claves['entidad']) > 0
+    indice = {
+        None: {
+            'nombre': None,
+            'tabla': tabla.reset_index(drop=True),
+            'hombres': piramide_entidad[0].tolist() if con_poblacion else None,
+            'mujeres': piramide_entidad[1].tolist() if con_poblacion else None,
+            'estadisticas': estadisticas(tabla['CLUES'].nunique(), total_hombres, total_mujeres),
+        }
+    }
+    nombres = nombres_municipios(df_unidades_merge)
+    unidades = tabla['CLUES'].groupby(df_unidades_merge['CVE_MUNICIPIO']).nunique()
+    for clave, df_municipio in tabla.groupby(df_unidades_merge['CVE_MUNICIPIO'], sort=False):
+        indice[int(clave)] = entrada_nodo(nombres[clave], df_municipio.reset_index(drop=True),
+                                          cubo.piramide('municipio', int(clave)), unidades[clave])
+    return indice
+
+
+def claves_jerarquia(df_unidades_merge):
+    # Clave de cada unidad en cada nivel de la navegación y columna con el nombre del nodo
+    # (localidad INEGI = municipio * 10000 + localidad, igual que en el cubo de población)
+    return {
+        'jurisdiccion': (df_unidades_merge['CLAVE DE LA JURISDICCION'], 'JURISDICCION'),
+        'municipio': (df_unidades_merge['CVE_MUNICIPIO'], 'MUNICIPIO'),
+        'localidad': (df_unidades_merge['CVE_MUNICIPIO'] * 10000 + df_unidades_merge['CLAVE DE LA LOCALIDAD'], 'LOCALIDAD'),
+    }
+
+
+def padres_nodos(claves_hijo, claves_padre):
+    # Claves del nivel de arriba en que tiene unidades cada nodo, de la que tiene más a la que tiene menos
+    pares = pd.DataFrame({'hijo': claves_hijo.values, 'padre': claves_padre.values}).value_counts().reset_index()
+    return pares.groupby('hijo', sort=False)['padre'].agg(lambda padres: [int(padre) for padre in padres])
+
+
+@instrumentar
+def construir_jerarquia(df_unidades_merge, cubo, indice):
+    # Nodos (nivel, clave) de entidad -> jurisdicción -> municipio -> localidad con su tabla, pirámide,
+    # estadísticas, padres e hijos, para que abrir un nodo sea una búsqueda en un diccionario. La raíz y
+    # los municipios son las mismas entradas del índice. Un municipio con unidades en varias jurisdicciones
+    # cuelga de todas ellas; su 'padre' es la que tiene más de sus unidades
+    tabla = df_unidades_merge[COLUMNAS_TABLA]
+    claves = claves_jerarquia(df_unidades_merge)
+    jerarquia = {RAIZ: indice[None]}
+    indice[None].update(padre=None, padres=[], hijos=[])
+    anterior = None
+    for nivel, (claves_nivel, columna_nombre) in claves.items():
+        nombres = df_unidades_merge[columna_nombre].groupby(claves_nivel).first()
+        unidades = tabla['CLUES'].groupby(claves_nivel).nunique()
+        if anterior:
+            padres = padres_nodos(claves_nivel, claves[anterior][0])
+        # Tabla ordenada (de forma estable) por la clave del nivel: la tabla de cada nodo es un tramo
+        # contiguo, sin copiar filas por nodo
+        validas = np.flatnonzero(claves_nivel.notna().to_numpy())
+        orden = validas[np.argsort(claves_nivel.to_numpy()[validas], kind='stable')]
+        ordenada = tabla.iloc[orden].reset_index(drop=True)
+        valores_clave, inicios = np.unique(claves_nivel.to_numpy()[orden], return_index=True)
+        finales = np.append(inicios[1:], len(orden))
+        for clave, inicio, final in zip(valores_clave.tolist(), inicios.tolist(), finales.tolist()):
+            clave = int(clave)
+            if nivel == 'municipio':
+                entrada = indice[clave]
+            else:
+                entrada = entrada_nodo(nombres[clave], ordenada.iloc[inicio:final], cubo.piramide(nivel, clave),
+                                       unidades[clave])
+            padres_nodo = [(anterior, padre) for padre in padres[clave]] if anterior else [RAIZ]
+            entrada.update(padre=padres_nodo[0], padres=padres_nodo, hijos=[])
+            jerarquia[(nivel, clave)] = entrada
+            for padre in padres_nodo:
+                jerarquia[padre]['hijos'].append((nivel, clave))
+        anterior = nivel
+    return jerarquia
+
+
+def firma_archivos(rutas):
+    # Tamaño y fecha de modificación de cada archivo; cambia cuando se actualizan las fuentes
+    firma = []
+    for ruta in rutas:
+        try:
+            info = os.stat(ruta)
+            firma.append((ruta, info.st_size, info.st_mtime_ns))
+        except OSError:
+            firma.append((ruta, None, None))
+    return tuple(firma)
+
+
+@instrumentar
+def construir_horarios(df_unidades_merge):
+    # Máscara semanal del horario de cada unidad con su clave en cada nivel de la navegación
+    return HorariosSemana(df_unidades_merge, {nivel: claves.to_numpy()
+                                              for nivel, (claves, _) in claves_jerarquia(df_unidades_merge).items()})
+
+
+# entidad -> {'firma', 'cubo', 'datos', 'jerarquia', 'horarios'}, de la menos a la más recientemente consultada
+_indices = OrderedDict()
+_candado_indices = threading.Lock()
+# entidad (None = todas) -> veces que se llamó a invalidar_indice(); forma parte de version_indice
+_invalidaciones = {}
+
+
+def firma_indice(entidad):
+    # Archivos fuente del índice (también el catálogo de municipios, de donde salen los nombres)
+    return firma_archivos(fuentes_unidades(entidad=entidad) + fuentes_poblacion(entidad) + [ARCHIVO_LOCALIDADES])
+_candados_entidad = {}
+
+
+def _candado_entidad(entidad):
+    with _candado_indices:
+        return _candados_entidad.setdefault(entidad, threading.Lock())
+
+
+def _datos_entidad(entidad, df_unidades_merge=None, cubo=None):
+    # Índice por municipio, jerarquía, horarios y cubo de población de la entidad. Se construyen la primera
+    # vez que se consultan (una sola vez aunque lleguen varias peticiones) y se reconstruyen si cambiaron los
+    # archivos fuente o si se llamó a invalidar_indice(); solo se conservan MAXIMO_ENTIDADES en memoria
+    firma = firma_indice(entidad)
+    with _candado_entidad(entidad):
+        actual = _indices.get(entidad)
+        reconstruir = actual is None or actual['firma'] != firma
+        contar_cache('indice', not reconstruir)
+        if reconstruir:
+            if df_unidades_merge is None or actual is not None:
+                df_unidades_merge = procesar_datos(entidad=entidad)
+            if cubo is None or actual is not None:
+                cubo = cubo_poblacion(entidad)
+            indice = construir_indice(df_unidades_merge, cubo)
+            actual = {'firma': firma, 'cubo': cubo, 'datos': indice,
+                      'jerarquia': construir_jerarquia(df_unidades_merge, cubo, indice),
+                      'horarios': construir_horarios(df_unidades_merge)}
+    with _candado_indices:
+        _indices[entidad] = actual
+        _indices.move_to_end(entidad)
+        while len(_indices) > MAXIMO_ENTIDADES:
+            _indices.popitem(last=False)
+    return actual
+
+
+def obtener_indice(entidad=ENTIDAD, df_unidades_merge=None, cubo=None):
+    return _datos_entidad(entidad, df_unidades_merge, cubo)['datos']
+
+
+def obtener_jerarquia(entidad=ENTIDAD):
+    # Nodos de la navegación por jurisdicción, municipio y localidad; se reconstruyen junto con el índice
+    return _datos_entidad(entidad)['jerarquia']
+
+
+def obtener_cubo(entidad=ENTIDAD):
+    # Cubo de población de la entidad; se conserva y se reconstruye junto con su índice
+    return _datos_entidad(entidad)['cubo']
+
+
+def obtener_horarios(entidad=ENTIDAD):
+    # Horarios semanales de las unidades de la entidad; se reconstruyen junto con el índice
+    return _datos_entidad(entidad)['horarios']
+
+
+def unidades_abiertas(entidad=ENTIDAD, nodo=RAIZ, momento=None, dias=None):
+    # CLUES del nodo abiertas en el momento (por omisión ahora) o, con dias (0 = lunes, por ejemplo
+    # horarios.FIN_DE_SEMANA), las que abren alguno de esos días
+    return obtener_horarios(entidad).consultar(nodo, momento, dias)
+
+
+def version_indice(entidad=ENTIDAD):
+    # Identificador de los datos fuente del índice; cambia cuando cambian los archivos o se invalida, pero
+    # no cuando la entidad sale de memoria, así las cachés que dependen de él no se reconstruyen de más
+    entidad = entidad or ENTIDAD
+    invalidaciones = (_invalidaciones.get(None, 0), _invalidaciones.get(entidad, 0))
+    return hashlib.sha1(repr((entidad, firma_indice(entidad), invalidaciones)).encode('utf-8')).hexdigest()[:12]
+
+
+def invalidar_indice(entidad=None):
+    # Forzar la reconstrucción del índice (de una entidad o de todas) en la siguiente consulta
+    with _candado_indices:
+        _invalidaciones[entidad] = _invalidaciones.get(entidad, 0) + 1
+        for clave, actual in _indices.items():
+            if entidad is None or clave == entidad:
+                actual['firma'] = None
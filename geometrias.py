@@ -0,0 +1,157 @@
+# geometrias.py
+import math
+from functools import lru_cache
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from funciones import (ENTIDAD, MAXIMO_ENTIDADES, cache_dataframe, clave_municipio, fuentes_unidades, normalizar_nombres,
+                       procesar_datos, version_indice)
+from metricas import instrumentar
+
+ARCHIVO_MUNICIPIOS = "files/mapa/muni_2018gw/muni_2018gw.shp"
+# Cónica conforme de Lambert para México (INEGI); sirve para calcular centroides en cualquier estado
+CRS_PROYECTADO = 6372
+# Vista de todo el país cuando no hay geometrías
+CENTRO_MEXICO = (23.6, -102.5)
+ZOOM_MEXICO = 5
+
+
+def fuentes_municipios():
+    base = ARCHIVO_MUNICIPIOS[:-len('.shp')]
+    return [f"{base}.{extension}" for extension in ['shp', 'shx', 'dbf', 'prj']]
+
+
+def _tabla_geometrias(entidad):
+    # Reproyectar y calcular centroides una sola vez para todos los municipios de la entidad
+    # (entidad=None carga todo el país)
+    df_mpios_shape = gpd.read_file(ARCHIVO_MUNICIPIOS, encoding="UTF-8")
+    if entidad is not None:
+        df_mpios_shape = df_mpios_shape[df_mpios_shape["CVE_ENT"].astype(int) == entidad].copy()
+    df_mpios_shape["NOM_MUN"] = normalizar_nombres(df_mpios_shape["NOM_MUN"])
+    df_mpios_shape["CVE_MUNICIPIO"] = clave_municipio(df_mpios_shape["CVE_ENT"].astype(int), df_mpios_shape["CVE_MUN"].astype(int))
+    df_mpios_shape = df_mpios_shape.to_crs(epsg=4326)
+    centroides = df_mpios_shape.geometry.to_crs(epsg=CRS_PROYECTADO).centroid.to_crs(epsg=4326)
+    limites = df_mpios_shape.bounds
+    return pd.DataFrame({
+        'CVE_MUNICIPIO': df_mpios_shape["CVE_MUNICIPIO"].values,
+        'NOM_MUN': df_mpios_shape["NOM_MUN"].values,
+        'CVE_ENT': df_mpios_shape["CVE_ENT"].values,
+        'CVE_MUN': df_mpios_shape["CVE_MUN"].values,
+        'lat': centroides.y.values,
+        'lon': centroides.x.values,
+        'minx': limites['minx'].values,
+        'miny': limites['miny'].values,
+        'maxx': limites['maxx'].values,
+        'maxy': limites['maxy'].values,
+    })
+
+
+@instrumentar
+def construir_geometrias(entidad=ENTIDAD):
+    # Diccionario por clave INEGI de municipio con el nombre, el centroide (WGS84) y el rectángulo
+    # envolvente, para que los callbacks no llamen a to_crs ni a centroid en cada petición
+    tabla = cache_dataframe(f'geometrias_{entidad or "todas"}', fuentes_municipios(), lambda: _tabla_geometrias(entidad))
+    geometrias = {}
+    for fila in tabla.itertuples(index=False):
+        geometrias[int(fila.CVE_MUNICIPIO)] = {
+            'nombre': fila.NOM_MUN,
+            'centroide': (fila.lat, fila.lon),
+            'bbox': [[fila.miny, fila.minx], [fila.maxy, fila.maxx]],
+            'CVE_ENT': fila.CVE_ENT,
+            'CVE_MUN': fila.CVE_MUN,
+        }
+    return geometrias
+
+
+@lru_cache(maxsize=MAXIMO_ENTIDADES)
+def geometrias_entidad(entidad):
+    # Geometrías de una entidad, cargadas la primera vez que se consultan; solo se conservan en
+    # memoria las de las entidades consultadas más recientemente
+    return construir_geometrias(entidad)
+
+
+def limites(geometrias):
+    # Rectángulo que envuelve las geometrías, como los bounds de Leaflet: [[sur, oeste], [norte, este]]
+    return [[min(geometria['bbox'][0][0] for geometria in geometrias.values()),
+             min(geometria['bbox'][0][1] for geometria in geometrias.values())],
+            [max(geometria['bbox'][1][0] for geometria in geometrias.values()),
+             max(geometria['bbox'][1][1] for geometria in geometrias.values())]]
+
+
+def encuadre(geometrias, ancho=600, alto=400):
+    # Centro y zoom de Leaflet para que el rectángulo que envuelve las geometrías quepa en un mapa
+    # de ancho x alto píxeles (proyección Web Mercator, mosaicos de 256 píxeles)
+    if not geometrias:
+        return CENTRO_MEXICO, ZOOM_MEXICO
+    (sur, oeste), (norte, este) = limites(geometrias)
+
+    def mercator(lat):
+        return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+    zoom_x = math.log2(ancho * 360 / (256 * max(este - oeste, 1e-9)))
+    zoom_y = math.log2(alto * 2 * math.pi / (256 * max(mercator(norte) - mercator(sur), 1e-9)))
+    zoom = max(0, min(18, math.floor(min(zoom_x, zoom_y))))
+    return ((sur + norte) / 2, (oeste + este) / 2), zoom
+
+
+def _ubicacion_unidades(entidad):
+    # Municipio del mapa en que cae cada CLUES (unión espacial con un STRtree de los polígonos de todo el
+    # país, para detectar también coordenadas en otra entidad) y si no coincide con el del catálogo
+    unidades = procesar_datos(entidad=entidad).drop_duplicates('CLUES')
+    latitud = pd.to_numeric(unidades['LATITUD'], errors='coerce').to_numpy()
+    longitud = pd.to_numeric(unidades['LONGITUD'], errors='coerce').to_numpy()
+    validas = ~np.isnan(latitud) & ~np.isnan(longitud) & (latitud != 0) & (longitud != 0)
+    poligonos = gpd.read_file(ARCHIVO_MUNICIPIOS, columns=['CVE_ENT', 'CVE_MUN'], encoding="UTF-8").to_crs(epsg=4326)
+    claves = clave_municipio(poligonos["CVE_ENT"].astype(int), poligonos["CVE_MUN"].astype(int)).to_numpy()
+    filas = np.flatnonzero(validas)
+    # El árbol es de los puntos y se consulta con cada polígono (preparado una sola vez), en lugar de
+    # evaluar cada punto contra los polígonos con vértices de todo el país
+    poligono, punto = shapely.STRtree(shapely.points(longitud[filas], latitud[filas])).query(
+        poligonos.geometry.values, predicate='covers')
+    # Un punto sobre el límite de dos municipios se queda con el primero
+    punto, primero = np.unique(punto, return_index=True)
+    municipio_mapa = np.full(len(unidades), -1, dtype=np.int64)
+    municipio_mapa[filas[punto]] = claves[poligono[primero]]
+
+    municipio = unidades['CVE_MUNICIPIO'].to_numpy(np.int64)
+    discrepancia = np.select(
+        [~validas, municipio_mapa < 0, municipio_mapa // 1000 != municipio // 1000, municipio_mapa != municipio],
+        ['sin coordenadas', 'fuera de los municipios', 'otra entidad', 'otro municipio'], '')
+    return pd.DataFrame({
+        'CLUES': unidades['CLUES'].to_numpy(),
+        'NOMBRE DE LA UNIDAD': unidades['NOMBRE DE LA UNIDAD'].to_numpy(),
+        'LATITUD': latitud,
+        'LONGITUD': longitud,
+        'CVE_MUNICIPIO': municipio,
+        'CVE_MUNICIPIO_MAPA': municipio_mapa,
+        'DISCREPANCIA': discrepancia,
+    })
+
+
+def ubicacion_unidades(entidad=ENTIDAD):
+    # Una fila por CLUES con su municipio según el catálogo y según el mapa; se vuelve a calcular cuando
+    # cambian las unidades o el shapefile
+    return cache_dataframe(f'ubicacion_{entidad}', fuentes_unidades(entidad=entidad) + fuentes_municipios(),
+                           lambda: _ubicacion_unidades(entidad))
+
+
+@lru_cache(maxsize=MAXIMO_ENTIDADES)
+def _puntos_municipios(entidad, version):
+    ubicacion = ubicacion_unidades(entidad)
+    ubicadas = ubicacion[ubicacion['CVE_MUNICIPIO_MAPA'] >= 0]
+    return {int(clave): tabla[['CLUES', 'NOMBRE DE LA UNIDAD', 'LATITUD', 'LONGITUD']].reset_index(drop=True)
+            for clave, tabla in ubicadas.groupby('CVE_MUNICIPIO_MAPA')}
+
+
+def puntos_municipios(entidad=ENTIDAD):
+    # Unidades que caen dentro del polígono de cada municipio (clave INEGI -> CLUES, nombre y coordenadas),
+    # para que los callbacks del mapa no hagan consultas espaciales
+    return _puntos_municipios(entidad, version_indice(entidad))
+
+
+if __name__ == "__main__":
+    # Reporte de las unidades cuyo municipio en el catálogo no coincide con el polígono en que caen
+    ubicacion = ubicacion_unidades()
+    print(ubicacion['DISCREPANCIA'].replace('', 'coinciden').value_counts().to_string())
+    print(ubicacion[ubicacion['DISCREPANCIA'] != ''].to_string(index=False))
@@ -0,0 +1,25 @@
+# gunicorn.conf.py
+# gunicorn toma esta configuración automáticamente al ejecutarse en esta carpeta:
+#   gunicorn            -> app:server
+#   gunicorn inter:server
+import gc
+import multiprocessing
+import os
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'app:server')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = 120
+
+# Los datos (unidades, población, índice, pirámides y geometrías) se cargan una sola vez en el
+# proceso maestro; los workers se crean con fork y comparten esa memoria en lugar de cargar su
+# propia copia, así que también arrancan casi de inmediato
+preload_app = True
+
+
+def when_ready(server):
+    # Ya con la aplicación cargada: congelar los objetos existentes para que el recolector de
+    # basura de cada worker no los recorra, porque al hacerlo escribe en ellos y el sistema
+    # copia las páginas compartidas (copy-on-write)
+    gc.collect()
+    gc.freeze()
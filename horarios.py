@@ -0,0 +1,92 @@
+# horarios.py
+# Horario semanal de cada unidad como máscara de bits (7 días x 96 intervalos de 15 minutos, 84 bytes por
+# unidad con np.packbits) para preguntar qué unidades están abiertas sin volver a leer los textos
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+MINUTOS_INTERVALO = 15
+INTERVALOS_DIA = 24 * 60 // MINUTOS_INTERVALO
+BYTES_DIA = INTERVALOS_DIA // 8  # Cada día ocupa bytes completos de la máscara
+# Columnas opcionales con los días en que aplica cada horario; sin ellas el horario es de todos los días
+DIAS = ['LUNES', 'MARTES', 'MIERCOLES', 'JUEVES', 'VIERNES', 'SABADO', 'DOMINGO']
+FIN_DE_SEMANA = (5, 6)
+ZONA_HORARIA = os.environ.get('ZONA_HORARIA', 'America/Mexico_City')
+
+
+def ahora():
+    return datetime.now(ZoneInfo(ZONA_HORARIA))
+
+
+def minutos(horas):
+    # 'HH:MM' -> minutos desde la medianoche (NaN si no se puede leer)
+    partes = pd.Series(horas).astype('string').str.extract(r'^\s*(\d{1,2}):(\d{2})')
+    return (pd.to_numeric(partes[0], errors='coerce') * 60 + pd.to_numeric(partes[1], errors='coerce')).to_numpy(float)
+
+
+def dias_horarios(df):
+    # Arreglo (fila, día) con los días en que aplica cada horario, o None si el catálogo no los trae
+    if not all(dia in df.columns for dia in DIAS):
+        return None
+    valores = df[DIAS]
+    return valores.notna().to_numpy() & ~valores.isin([0, '0', 'NO', 'N', False, '']).to_numpy()
+
+
+def mascaras_horarios(inicio, fin, dias=None):
+    # Máscara empaquetada (fila, 84 bytes) de cada horario. Un fin de 23:59 o 00:00 cuenta hasta la
+    # medianoche, inicio igual a fin es abierto todo el día y un fin menor que el inicio sigue el día siguiente
+    inicio, fin = minutos(inicio), minutos(fin)
+    validos = ~np.isnan(inicio) & ~np.isnan(fin)
+    inicio, fin = np.where(validos, inicio, 0), np.where(validos, fin, 0)
+    # Inicio igual a fin (08:00-08:00) son 24 horas: se cuenta desde la medianoche hasta la medianoche
+    todo_dia = fin == inicio
+    inicio = np.where(todo_dia, 0, inicio)
+    fin = np.where((fin >= 23 * 60 + 59) | (fin == 0) | todo_dia, 24 * 60, fin)
+    cruza = validos & (fin < inicio)
+    desde = np.floor(inicio / MINUTOS_INTERVALO)[:, None]
+    hasta = np.where(cruza, INTERVALOS_DIA, np.ceil(fin / MINUTOS_INTERVALO))[:, None]
+    intervalos = np.arange(INTERVALOS_DIA)
+    mismo_dia = (intervalos >= desde) & (intervalos < hasta) & validos[:, None]
+    dia_siguiente = (intervalos < np.ceil(fin / MINUTOS_INTERVALO)[:, None]) & cruza[:, None]
+    if dias is None:
+        dias = np.ones((len(inicio), len(DIAS)), dtype=bool)
+    semana = (dias[:, :, None] & mismo_dia[:, None, :]) | (np.roll(dias, 1, axis=1)[:, :, None] & dia_siguiente[:, None, :])
+    return np.packbits(semana.reshape(len(inicio), len(DIAS) * INTERVALOS_DIA), axis=1)
+
+
+class HorariosSemana:
+    # mascaras[fila] es el horario semanal de la unidad de esa fila de la tabla; claves[nivel] tiene la
+    # clave de cada unidad en cada nivel, para filtrar por jurisdicción, municipio o localidad
+
+    def __init__(self, df_unidades, claves):
+        # Si una CLUES trae varios horarios (por ejemplo dos turnos) se unen en todas sus filas
+        mascaras = mascaras_horarios(df_unidades['HORA INICIO'], df_unidades['HORA FIN'], dias_horarios(df_unidades))
+        codigos, unicos = pd.factorize(df_unidades['CLUES'])
+        por_clues = np.zeros((len(unicos), mascaras.shape[1]), dtype=np.uint8)
+        np.bitwise_or.at(por_clues, codigos[codigos >= 0], mascaras[codigos >= 0])
+        self.mascaras = np.zeros_like(mascaras)
+        self.mascaras[codigos >= 0] = por_clues[codigos[codigos >= 0]]
+        # Días en que abre cada unidad (fila, día), para no recorrer los 84 bytes en cada consulta por días
+        self.dias = self.mascaras.reshape(len(self.mascaras), len(DIAS), BYTES_DIA).any(axis=2)
+        self.clues = df_unidades['CLUES'].to_numpy(dtype=object)
+        self.claves = {nivel: np.asarray(valores) for nivel, valores in claves.items()}
+
+    def abiertas(self, momento=None):
+        # Arreglo booleano por unidad: abierta en el momento (por omisión ahora)
+        momento = momento or ahora()
+        bit = momento.weekday() * INTERVALOS_DIA + (momento.hour * 60 + momento.minute) // MINUTOS_INTERVALO
+        return (self.mascaras[:, bit >> 3] >> (7 - (bit & 7))) & 1 == 1
+
+    def abiertas_dias(self, dias):
+        # Arreglo booleano por unidad: abre en alguno de los días (0 = lunes)
+        return self.dias[:, list(dias)].any(axis=1)
+
+    def consultar(self, nodo=('entidad', None), momento=None, dias=None):
+        # CLUES del nodo (nivel, clave) abiertas en el momento o, si se dan dias, que abren alguno de ellos
+        mascara = self.abiertas(momento) if dias is None else self.abiertas_dias(dias)
+        nivel, clave = nodo
+        if clave is not None:
+            mascara &= self.claves[nivel] == clave
+        return self.clues[mascara]
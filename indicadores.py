@@ -0,0 +1,85 @@
+# indicadores.py
+# Indicadores por municipio para el mapa coroplético, calculados de una sola vez para toda la entidad con
+# operaciones sobre columnas (cubo de población, unidades y cobertura). El navegador recibe las geometrías
+# una vez; al cambiar de indicador solo viajan los valores y los colores (hideout de dash-leaflet)
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from cobertura import RADIO_KM, obtener_cobertura
+from funciones import ENTIDAD, MAXIMO_ENTIDADES, obtener_cubo, procesar_datos, version_indice
+from metricas import instrumentar
+from poblacion import QUINQUENIOS, SEXOS
+
+# Clave -> (nombre, decimales)
+INDICADORES = {
+    'unidades_10k': ('Unidades por 10 mil habitantes', 2),
+    'habitantes_unidad': ('Habitantes por unidad', 0),
+    'mayores_60': ('Población de 60 años y más (%)', 1),
+    'menores_5': ('Población de 0 a 4 años (%)', 1),
+    'mujeres': ('Mujeres (%)', 1),
+    'lejos_unidad': (f'Población a más de {RADIO_KM:g} km de una unidad (%)', 1),
+}
+# Clases por cuantiles, de menor a mayor; los municipios sin dato van en gris
+COLORES_INDICADOR = ['#fff5eb', '#fdbe85', '#fd8d3c', '#d94701', '#8c2d04']
+COLOR_SIN_DATO = '#bdbdbd'
+MAYORES_60 = slice(QUINQUENIOS.index('60-64 años'), QUINQUENIOS.index('85+ años') + 1)
+
+
+@instrumentar
+def tabla_indicadores(df_unidades_merge, cubo, cobertura):
+    # Una fila por municipio (clave INEGI) con todos los indicadores; NaN donde no hay con qué calcularlo
+    valores = cubo.valores['municipio'].astype(np.int64)
+    poblacion = pd.DataFrame({
+        'POBLACION': valores.sum(axis=(1, 2)),
+        'MUJERES': valores[:, SEXOS.index('m')].sum(axis=1),
+        'MAYORES_60': valores[:, :, MAYORES_60].sum(axis=(1, 2)),
+        'MENORES_5': valores[:, :, QUINQUENIOS.index('0-4 años')].sum(axis=1),
+    }, index=cubo.claves['municipio'].astype(np.int64))
+    unidades = df_unidades_merge.groupby('CVE_MUNICIPIO')['CLUES'].nunique().rename('UNIDADES')
+    # Población de las localidades del municipio y la que queda a más de RADIO_KM de la unidad más cercana
+    lejos = cobertura.distancia > cobertura.radio
+    localidades = pd.DataFrame({
+        'POBLACION_LOCALIDADES': cobertura.poblacion,
+        'POBLACION_LEJOS': np.where(lejos, cobertura.poblacion, 0),
+    }).groupby(cobertura.localidades['CVE_LOCALIDAD'].to_numpy() // 10000).sum()
+    tabla = pd.concat([poblacion, unidades, localidades], axis=1).fillna(0)
+    indicadores = pd.DataFrame({
+        'unidades_10k': tabla['UNIDADES'] / tabla['POBLACION'] * 10000,
+        'habitantes_unidad': tabla['POBLACION'] / tabla['UNIDADES'],
+        'mayores_60': tabla['MAYORES_60'] / tabla['POBLACION'] * 100,
+        'menores_5': tabla['MENORES_5'] / tabla['POBLACION'] * 100,
+        'mujeres': tabla['MUJERES'] / tabla['POBLACION'] * 100,
+        'lejos_unidad': tabla['POBLACION_LEJOS'] / tabla['POBLACION_LOCALIDADES'] * 100,
+    })
+    indicadores.index = indicadores.index.astype(np.int64)
+    return indicadores.replace([np.inf, -np.inf], np.nan)
+
+
+@lru_cache(maxsize=MAXIMO_ENTIDADES)
+def _indicadores_entidad(entidad, version, version_cobertura):
+    cobertura, _ = obtener_cobertura(entidad)
+    return tabla_indicadores(procesar_datos(entidad=entidad), obtener_cubo(entidad), cobertura)
+
+
+def indicadores_entidad(entidad=ENTIDAD):
+    # Se vuelven a calcular cuando cambian las unidades o la cobertura
+    cobertura, _ = obtener_cobertura(entidad)
+    return _indicadores_entidad(entidad, version_indice(entidad), cobertura.version)
+
+
+def escala_indicador(entidad, indicador):
+    # hideout de la capa coroplética: valor redondeado por clave de municipio, límites de las clases
+    # (cuantiles de los municipios con dato) y sus colores
+    nombre, decimales = INDICADORES[indicador]
+    serie = indicadores_entidad(entidad)[indicador]
+    con_dato = serie.dropna()
+    limites = np.unique(np.round(np.quantile(con_dato, np.linspace(0, 1, len(COLORES_INDICADOR) + 1)[1:-1]), decimales)) \
+        if len(con_dato) else np.array([])
+    return {
+        'nombre': nombre,
+        'decimales': decimales,
+        'valores': {str(clave): round(float(valor), decimales) for clave, valor in con_dato.items()},
+        'limites': limites.tolist(),
+        'colores': COLORES_INDICADOR[:len(limites) + 1],
+        'sin_dato': COLOR_SIN_DATO,
+    }
@@ -1,58 +1,84 @@
 # Importaciones
-from dash import Dash, html, dcc, Input, Output, dash_table, State
+from dash import Dash, html, dcc, Input, Output, dash_table, State, ctx, no_update, ClientsideFunction
 import dash_bootstrap_components as dbc
-from funciones import procesar_datos, municipios, piramide_pob, totales_pob  # Importar las funciones
+from funciones import (ENTIDAD, ENTIDADES, procesar_datos, municipios, cubo_poblacion, totales_pob, obtener_indice,
+                       firma_archivos, version_indice, RAIZ, descendientes, etiqueta_nodo, obtener_jerarquia, opciones_nivel, seleccion_nodo)  # Importar las funciones
 import pandas as pd
-import plotly.graph_objects as go
-import io
-import base64
-import geopandas as gpd
-import unidecode
+from geometrias import encuadre, fuentes_municipios, geometrias_entidad, puntos_municipios
+from topologia import nivel_zoom, topologia_municipios
+from tabla import pagina
+from piramide import figura_piramide, parche_piramide, precalcular_piramides
+from cobertura import RADIO_KM, entrada_cobertura
+from exportar import registrar_exportacion
+from metricas import incrementar, registrar_metricas
 import folium
 from folium.plugins import MarkerCluster
-import tempfile
-import glob
-import os
-
-def generar_mapa(lat, lon, geojson=None):
-    # Eliminar archivos antiguos en la subcarpeta mapas
-    files = glob.glob("assets/mapas/*.html")
-    for f in files:
-        try:
-            os.remove(f)
-        except Exception as e:
-            print(f"Error al eliminar {f}: {e}")
-    
-    # Crear un mapa centrado en las coordenadas dadas
-    mapa = folium.Map(location=[lat, lon], zoom_start=12)
-    
-    # Si hay un GeoJSON, agregarlo al mapa
-    if geojson:
-        folium.GeoJson(geojson, style_function=lambda x: {"color": "#e09f3e", "weight": 2}).add_to(mapa)
-    
-    # Guardar el mapa en un archivo HTML en la subcarpeta mapas
-    mapa_path = os.path.join("assets/mapas", f"mapa_{lat}_{lon}.html")
-    mapa.save(mapa_path)
-    
-    return f"/assets/mapas/mapa_{lat}_{lon}.html"  # Ruta relativa para el iframe
-
-# Llamar la función para obtener el DataFrame procesado
+from cache_mapas import clave_mapa, obtener_mapa
+
+ESTILO_MUNICIPIO = {"color": "#e09f3e", "weight": 2}
+ESTILO_ENTIDAD = {"color": "#af751d", "weight": 1}
+
+
+def generar_mapa(municipio, lat, lon, topologia=None, estilo=ESTILO_MUNICIPIO, zoom=12, unidades=None, version=None):
+    # El HTML se guarda en disco por municipio, estilo, versión de los datos y del shapefile de los
+    # contornos; si ya existe no se vuelve a llamar a folium
+    def dibujar(ruta):
+        # Crear un mapa centrado en las coordenadas dadas
+        mapa = folium.Map(location=[lat, lon], zoom_start=zoom)
+
+        # Contornos en TopoJSON (topologia.py), con cada frontera compartida una sola vez
+        if topologia:
+            folium.TopoJson(topologia, 'objects.municipios', style_function=lambda x: estilo).add_to(mapa)
+
+        # Unidades agrupadas por Leaflet.markercluster según el zoom
+        if unidades is not None and not unidades.empty:
+            grupo = MarkerCluster(name="Unidades").add_to(mapa)
+            for clues, nombre, latitud, longitud in unidades[['CLUES', 'NOMBRE DE LA UNIDAD', 'LATITUD', 'LONGITUD']].itertuples(index=False):
+                folium.CircleMarker([latitud, longitud], radius=5, color='#333', fill=True, fill_opacity=0.9,
+                                    tooltip=f"{clues} {nombre}").add_to(grupo)
+
+        mapa.save(ruta)
+
+    clave = clave_mapa(municipio, estilo, lat, lon, zoom, version, firma_archivos(fuentes_municipios()))
+    return obtener_mapa(clave, dibujar)  # Ruta relativa para el iframe
+
+# Llamar la función para obtener el DataFrame procesado (entidad que se muestra al abrir; las demás
+# se cargan la primera vez que se seleccionan)
 df_unidades_merge = procesar_datos()
 
 # Llamar la función para obtener el DataFrame con la lista de municipios
 df_municipios = municipios(df_unidades_merge)
 
-# Llamar la función para obtener el DataFrame con la pirámide de población
-df_poblacion_mpios_total = piramide_pob()
-total_hombres, total_mujeres, poblacion_total = totales_pob(df_poblacion_mpios_total)
+# Cubo de población por entidad, jurisdicción, municipio, localidad y CLUES
+cubo = cubo_poblacion()
+total_hombres, total_mujeres, poblacion_total = totales_pob(cubo)
+
+# Construir el índice por municipio que consultan los callbacks
+obtener_indice(ENTIDAD, df_unidades_merge, cubo)
+
+# Valores de la pirámide de cada municipio y del total estatal
+precalcular_piramides(ENTIDAD)
 
-# Cargar el shapefile de municipios
-df_mpios_shape = gpd.read_file("files/mapa/muni_2018gw/muni_2018gw.shp", encoding="UTF-8")
-df_mpios_shape["NOM_MUN"] = df_mpios_shape["NOM_MUN"].apply(lambda x: unidecode.unidecode(x.upper()))
-df_mpios_shape = df_mpios_shape[df_mpios_shape["CVE_ENT"] == '13']  # Filtrar por el estado de Hidalgo
+# Cargar las geometrías de los municipios de la entidad con centroide y rectángulo envolvente precalculados
+geometrias_municipios = geometrias_entidad(ENTIDAD)
+# Municipio del mapa en que cae cada unidad (se revisa contra el del catálogo con python geometrias.py)
+puntos_municipios(ENTIDAD)
 
 # Crear la aplicación Dash
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+server = app.server
+
+
+def tabla_exportacion(entidad, jurisdiccion, municipio, localidad):
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, municipio, localidad)
+    entrada = obtener_jerarquia(entidad).get(nodo)
+    return (etiqueta_nodo(entidad, nodo, entrada['nombre']), entrada['tabla']) if entrada is not None else None
+
+
+# Descargas de la tabla generadas en el servidor
+registrar_exportacion(app.server, tabla_exportacion, version_indice)
+# Tiempos, tamaños y aciertos de caché en /metrics (formato Prometheus)
+registrar_metricas(app.server)
 
 # Crear el encabezado con un Card
 header_card = dbc.Card(
@@ -64,12 +90,31 @@ header_card = dbc.Card(
                 className="lead",
             ),
             html.Hr(className="my-2"),
-            html.P("Selecciona el municipio para desglosar la información."),
+            html.P("Selecciona la entidad y después la jurisdicción, el municipio o la localidad para desglosar la información."),
+            dcc.Dropdown(
+                id='dropdown-entidades',
+                options=[{'label': nombre, 'value': clave} for clave, nombre in ENTIDADES.items()],
+                value=ENTIDAD,
+                clearable=False,
+                style={'width': '50%', 'marginBottom': '10px'}
+            ),
+            dcc.Dropdown(
+                id='dropdown-jurisdicciones',
+                options=opciones_nivel(ENTIDAD, 'jurisdiccion'),
+                placeholder="Todas las jurisdicciones",
+                style={'width': '50%', 'marginBottom': '10px'}
+            ),
             dcc.Dropdown(
                 id='dropdown-municipios',
-                options=[{'label': row['nombre_municipio'], 'value': row['nombre_municipio']} for index, row in df_municipios.iterrows()],
+                options=opciones_nivel(ENTIDAD, 'municipio'),
                 placeholder="Seleccione un municipio",
-                style={'width': '50%'}  # Ajustar el ancho del Dropdown
+                style={'width': '50%', 'marginBottom': '10px'}  # Ajustar el ancho del Dropdown
+            ),
+            dcc.Dropdown(
+                id='dropdown-localidades',
+                options=[],
+                placeholder="Todas las localidades del municipio",
+                style={'width': '50%'}
             ),
             html.Div(id='output-container')  # Contenedor para mostrar el DataFrame filtrado
         ]
@@ -82,6 +127,7 @@ app.layout = dbc.Container(
     [
         dcc.Store(id='store-selected-municipio'),  # Almacenar la selección del dropdown
         header_card,  # Encabezado
+        dcc.Store(id='estadisticas-datos'),  # Estadísticas de la selección actual
         dbc.Row(id='estadisticas-cards'),  # Contenedor para las tarjetas con datos importantes
         dbc.Row(
             [
@@ -113,7 +159,7 @@ app.layout = dbc.Container(
                 dbc.Col(
                     dbc.Card(
                         dbc.CardBody(
-                            dcc.Graph(id='piramide-poblacional')  # Gráfica de pirámide poblacional
+                            dcc.Graph(id='piramide-poblacional', figure=figura_piramide())  # Gráfica de pirámide poblacional
                         ),
                         className="h-100",
                         style={
@@ -142,10 +188,17 @@ app.layout = dbc.Container(
                                         {"name": col, "id": col}
                                         for col in ['CLUES', 'JURISDICCION', 'NOMBRE DE LA UNIDAD', 'HORARIO']
                                     ],
-                                    data=df_unidades_merge[
-                                        ['CLUES', 'JURISDICCION', 'NOMBRE DE LA UNIDAD', 'HORARIO']
-                                    ].to_dict('records'),
+                                    # Paginado, orden y filtro se resuelven en el servidor (update_table)
+                                    data=[],
+                                    page_current=0,
                                     page_size=10,
+                                    page_count=1,
+                                    page_action='custom',
+                                    sort_action='custom',
+                                    sort_mode='multi',
+                                    sort_by=[],
+                                    filter_action='custom',
+                                    filter_query='',
                                     style_table={'overflowX': 'auto'},
                                     style_cell={
                                         'fontFamily': 'arial',
@@ -159,12 +212,34 @@ app.layout = dbc.Container(
                                         'fontWeight': 'bold'
                                     }
                                 ),
-                                html.Button(
-                                    "Descargar Excel",
-                                    id="btn-download-excel",
-                                    className="btn btn-primary mt-3"
-                                ),
-                                dcc.Download(id="download-dataframe-xlsx")
+                                dbc.Row(
+                                    [
+                                        dbc.Col(
+                                            dcc.Dropdown(
+                                                id='formato-exportacion',
+                                                options=[
+                                                    {'label': 'Excel (.xlsx)', 'value': 'xlsx'},
+                                                    {'label': 'CSV', 'value': 'csv'},
+                                                    {'label': 'Parquet', 'value': 'parquet'},
+                                                ],
+                                                value='xlsx',
+                                                clearable=False
+                                            ),
+                                            width=3,
+                                            className="mt-3"
+                                        ),
+                                        dbc.Col(
+                                            # El archivo se genera en el servidor (ruta /exportar)
+                                            html.A(
+                                                "Descargar",
+                                                id="btn-download-excel",
+                                                href=f"/exportar/xlsx?entidad={ENTIDAD}&jurisdiccion=&municipio=&localidad=",
+                                                className="btn btn-primary mt-3"
+                                            ),
+                                            width="auto"
+                                        )
+                                    ]
+                                )
                             ]
                         ),
                         className="h-100"
@@ -173,229 +248,218 @@ app.layout = dbc.Container(
                 )
             ],
             className="h-100"
-        )
-    ],
-    className="h-100"
-)
-
-# Definir el callback para actualizar el DataFrame filtrado, la gráfica, las tarjetas y el mapa
-@app.callback(
-    [Output('table', 'data'),
-     Output('piramide-poblacional', 'figure'),
-     Output('estadisticas-cards', 'children'),
-     Output('mapa-iframe', 'src')],
-    Input('dropdown-municipios', 'value')
-)
-def update_output(selected_municipio):
-    if selected_municipio is None:
-        table_data = df_unidades_merge[['CLUES', 'JURISDICCION', 'NOMBRE DE LA UNIDAD', 'HORARIO']].to_dict('records')
-        fig = go.Figure()
-        estadisticas_cards = [
-            dbc.Col(
-                dbc.Card(
-                    dbc.CardBody(
-                        [
-                            html.H5("Total de Unidades", className="card-title"),
-                            html.P(f"{int(df_unidades_merge['CLUES'].nunique())}", className="card-text")
-                        ]
-                    ),
-                    className="mb-3"
-                ),
-                width=3
-            ),
-            dbc.Col(
-                dbc.Card(
-                    dbc.CardBody(
-                        [
-                            html.H5("Total de Hombres", className="card-title"),
-                            html.P(f"{int(total_hombres)}", className="card-text")
-                        ]
-                    ),
-                    className="mb-3"
-                ),
-                width=3
-            ),
-            dbc.Col(
-                dbc.Card(
-                    dbc.CardBody(
-                        [
-                            html.H5("Total de Mujeres", className="card-title"),
-                            html.P(f"{int(total_mujeres)}", className="card-text")
-                        ]
-                    ),
-                    className="mb-3"
-                ),
-                width=3
-            ),
+        ),
+        # Distancia de cada localidad a la unidad más cercana
+        dbc.Row(
             dbc.Col(
                 dbc.Card(
                     dbc.CardBody(
                         [
-                            html.H5("Poblacion Total", className="card-title"),
-                            html.P(f"{int(poblacion_total)}", className="card-text")
+                            html.H4("Cobertura por localidad", className="card-title"),
+                            html.P(f"Unidad más cercana a cada localidad, de la más lejana a la más cercana "
+                                   f"(radio de cobertura de las unidades: {RADIO_KM:g} km)."),
+                            dash_table.DataTable(
+                                id='tabla-cobertura',
+                                columns=[{"name": col, "id": col} for col in
+                                         ['LOCALIDAD', 'POBLACION', 'CLUES MAS CERCANA', 'UNIDAD MAS CERCANA', 'DISTANCIA KM']],
+                                data=[],
+                                page_current=0,
+                                page_size=10,
+                                page_count=1,
+                                page_action='custom',
+                                sort_action='custom',
+                                sort_mode='multi',
+                                sort_by=[],
+                                filter_action='custom',
+                                filter_query='',
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'fontFamily': 'arial', 'fontSize': '10px', 'textAlign': 'center'},
+                                style_header={'backgroundColor': '#c5c3c6', 'fontWeight': 'bold'}
+                            )
                         ]
                     ),
-                    className="mb-3"
+                    className="mt-3"
                 ),
-                width=3
-            ),
-        ]
-        return table_data, fig, estadisticas_cards, ""
-    
-    # Filtrar el DataFrame basado en el municipio seleccionado
-    filtered_df = df_unidades_merge[df_unidades_merge['MUNICIPIO'] == selected_municipio]
-    filtered_df = filtered_df[['CLUES', 'JURISDICCION', 'NOMBRE DE LA UNIDAD', 'HORARIO']]
-    
-    # Crear la gráfica de pirámide poblacional
-    df_municipio = df_poblacion_mpios_total[df_poblacion_mpios_total['Nombre Municipio Unidad'] == selected_municipio]
-    
-    if df_municipio.empty:
-        fig = go.Figure()
-        estadisticas_cards = []
-        return filtered_df.to_dict('records'), fig, estadisticas_cards, ""
-    
-    quinquenios = ['0-4 años', '5-9 años', '10-14 años', '15-19 años', '20-24 años', '25-29 años', '30-34 años', 
-                   '35-39 años', '40-44 años', '45-49 años', '50-54 años', '55-59 años', '60-64 años', '65-69 años', 
-                   '70-74 años', '75-79 años', '80-84 años', '85+ años', 'indefinido']
-    
-    poblacion_masculina = [-df_municipio[f'h{q}'].values[0] for q in quinquenios]  # Valores negativos para la gráfica
-    poblacion_femenina = [df_municipio[f'm{q}'].values[0] for q in quinquenios]
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        y=quinquenios,
-        x=poblacion_masculina,
-        name='Hombres',
-        orientation='h',
-        marker=dict(color='#e09f3e'),
-        hovertemplate='%{y}: %{text}<extra></extra>',
-        text=[abs(val) for val in poblacion_masculina]
-    ))
-    
-    fig.add_trace(go.Bar(
-        y=quinquenios,
-        x=poblacion_femenina,
-        name='Mujeres',
-        orientation='h',
-        marker=dict(color='#84a59d'),
-        hovertemplate='%{y}: %{x}<extra></extra>',
-        text=[abs(val) for val in poblacion_femenina]
-    ))
-    
-    max_val = max(max(poblacion_femenina), abs(min(poblacion_masculina)))
-    tickvals = [-max_val, -max_val/2, 0, max_val/2, max_val]
-    ticktext = [str(int(abs(val))) for val in tickvals]
-    
-    fig.update_layout(
-        title=f'Pirámide Poblacional de {selected_municipio}',
-        xaxis_title='Población',
-        yaxis_title='Edad',
-        barmode='relative',
-        bargap=0.1,
-        bargroupgap=0,
-        xaxis=dict(
-            tickvals=tickvals,
-            ticktext=ticktext
-        ),
-        width=600,  # Ancho de la figura en píxeles
-        height=600  # Altura de la figura en píxeles
-    )
-    
-    # Calcular el total de hombres y mujeres para el municipio seleccionado
-    df_municipio = df_municipio.apply(pd.to_numeric, errors='coerce')
-    total_hombres_municipio = int(df_municipio.filter(like='h').sum().sum())
-    total_mujeres_municipio = int(df_municipio.filter(like='m').sum().sum())
-    poblacion_total_tot = total_hombres_municipio + total_mujeres_municipio
-    
-    # Crear el DataFrame con estadísticas basadas en el municipio seleccionado
-    df_estadisticas = pd.DataFrame({
-        'Indicador': ['Total de Unidades', 'Total de Hombres', 'Total de Mujeres', 'Poblacion Total'],
-        'Valor': [
-            int(filtered_df['CLUES'].nunique()),
-            total_hombres_municipio,
-            total_mujeres_municipio,
-            poblacion_total_tot
-        ]
-    })
-    
-    # Crear las tarjetas
-    estadisticas_cards = [
-        dbc.Col(
-            dbc.Card(
-                dbc.CardBody(
-                    [
-                        html.H5(row['Indicador'], className="card-title card-title-custom"),
-                        html.P(f"{int(row['Valor'])}", className="card-text card-text-custom")
-                    ]
-                ),
-                className="mb-3",
-                style={
-                    'background-color': (
-                        '#e09f3e' if row['Indicador'] == 'Total de Hombres' else
-                        '#84a59d' if row['Indicador'] == 'Total de Mujeres' else
-                        '#95b2ab' if row['Indicador'] == 'Total de Unidades' else
-                        '#af751d'
-                    )
-                }
-            ),
-            width=3
-        ) for index, row in df_estadisticas.iterrows()
-    ]
-    
-    # Actualizar el mapa según el municipio seleccionado
-    municipio_shape = df_mpios_shape[df_mpios_shape["NOM_MUN"] == selected_municipio]
-    if municipio_shape.empty:
-        print(f"No se encontró el municipio: {selected_municipio}")
-        return filtered_df.to_dict('records'), fig, estadisticas_cards, ""
-    else:
-        # Reproyectar a un CRS proyectado (por ejemplo, UTM zona 14N: EPSG:32614)
-        municipio_shape_proj = municipio_shape.to_crs(epsg=32614)
-        
-        # Calcular el centroide en el CRS proyectado
-        centroide = municipio_shape_proj.geometry.centroid.iloc[0]
-        
-        # Convertir el centroide de vuelta a un CRS geográfico (EPSG:4326)
-        centroide_geo = gpd.GeoSeries([centroide], crs="EPSG:32614").to_crs(epsg=4326).iloc[0]
-        lat, lon = centroide_geo.y, centroide_geo.x
-        
-        # Convertir la geometría a GeoJSON para el mapa (en EPSG:4326)
-        geojson = municipio_shape.__geo_interface__
-
-        # Generar el mapa con Folium
-        mapa_path = generar_mapa(lat, lon, geojson)
-
-        # Devolver el centro, el zoom y el GeoJSON
-        return filtered_df.to_dict('records'), fig, estadisticas_cards, mapa_path
-    
-
-    
-# Callback para manejar la descarga del archivo Excel
+                width=12
+            )
+        )
+    ],
+    className="h-100"
+)
+
+# Dropdowns de la navegación: entidad -> jurisdicción -> municipio -> localidad
+SELECCION = [Input('dropdown-entidades', 'value'),
+             Input('dropdown-jurisdicciones', 'value'),
+             Input('dropdown-municipios', 'value'),
+             Input('dropdown-localidades', 'value')]
+
+
+# Al cambiar de entidad se cargan sus jurisdicciones (la primera vez se construye su índice)
 @app.callback(
-    Output("download-dataframe-xlsx", "data"),
-    Input("btn-download-excel", "n_clicks"),
-    State('table', 'data'),
+    [Output('dropdown-jurisdicciones', 'options'),
+     Output('dropdown-jurisdicciones', 'value')],
+    Input('dropdown-entidades', 'value'),
     prevent_initial_call=True
 )
-def download_excel(n_clicks, table_data):
-    if n_clicks is None:
-        return
-    
-    # Convertir los datos de la tabla a un DataFrame de pandas
-    df = pd.DataFrame(table_data)
-    
-    # Crear un archivo Excel en memoria
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-        writer.close()  # Cerrar el escritor de Excel
-    
-    # Codificar el archivo Excel en base64
-    output.seek(0)
-    excel_data = output.read()
-    b64 = base64.b64encode(excel_data).decode()
-    
-    return dcc.send_data_frame(df.to_excel, "data.xlsx", sheet_name="Sheet1")
+def update_jurisdicciones(entidad):
+    return opciones_nivel(entidad or ENTIDAD, 'jurisdiccion'), None
+
+
+# Municipios de la jurisdicción seleccionada (o de toda la entidad)
+@app.callback(
+    [Output('dropdown-municipios', 'options'),
+     Output('dropdown-municipios', 'value')],
+    SELECCION[:2],
+    prevent_initial_call=True
+)
+def update_municipios(entidad, jurisdiccion):
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion)
+    return opciones_nivel(entidad, 'municipio', nodo), None
+
+
+# Localidades con unidades del municipio seleccionado
+@app.callback(
+    [Output('dropdown-localidades', 'options'),
+     Output('dropdown-localidades', 'value')],
+    SELECCION[:3]
+)
+def update_localidades(entidad, jurisdiccion, selected_municipio):
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio)
+    if nodo[0] != 'municipio':
+        return [], None
+    return opciones_nivel(entidad, 'localidad', nodo), None
+
+
+# Cada salida tiene su propio callback: Dash las pide en paralelo y un mapa lento no retrasa
+# la pirámide, las tarjetas ni la tabla
+@app.callback(
+    Output('piramide-poblacional', 'figure'),
+    SELECCION
+)
+def update_piramide(entidad, jurisdiccion, selected_municipio, localidad):
+    # Solo se envían los valores precalculados; la plantilla de la figura ya está en el navegador
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio, localidad)
+    return parche_piramide(nodo, entidad)
+
+
+def datos_estadisticas(nodo=RAIZ, entidad=ENTIDAD):
+    # Estadísticas precalculadas en la jerarquía; las tarjetas se arman en el navegador (assets/tablero.js)
+    entrada = obtener_jerarquia(entidad).get(nodo)
+    if entrada is None or entrada['estadisticas'] is None:
+        return None
+    return {'estatal': nodo == RAIZ, 'valores': entrada['estadisticas']}
+
+
+@app.callback(
+    Output('estadisticas-datos', 'data'),
+    SELECCION,
+    State('estadisticas-datos', 'data')
+)
+def update_estadisticas(entidad, jurisdiccion, selected_municipio, localidad, actuales):
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio, localidad)
+    datos = datos_estadisticas(nodo, entidad)
+    # Si los valores no cambiaron no se vuelven a enviar ni a dibujar
+    if datos == actuales:
+        return no_update
+    return datos
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='tablero', function_name='tarjetas'),
+    Output('estadisticas-cards', 'children'),
+    Input('estadisticas-datos', 'data')
+)
+
+
+@app.callback(
+    Output('mapa-iframe', 'src'),
+    SELECCION
+)
+def update_mapa(entidad, jurisdiccion, selected_municipio, localidad):
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio, localidad)
+    geometrias = geometrias_entidad(entidad)
+    jerarquia = obtener_jerarquia(entidad)
+    puntos = puntos_municipios(entidad)
+    version = version_indice(entidad)
+    if nodo[0] in ('entidad', 'jurisdiccion'):
+        # Vista estatal o de una jurisdicción: sus municipios, con centro y zoom calculados con sus límites
+        claves = [clave for _, clave in descendientes(jerarquia, nodo, 'municipio')] if nodo != RAIZ else geometrias
+        seleccion = {clave: geometrias[clave] for clave in claves if clave in geometrias}
+        if not seleccion:
+            return ""
+        (lat, lon), zoom = encuadre(seleccion)
+        estilo = ESTILO_ENTIDAD if nodo == RAIZ else ESTILO_MUNICIPIO
+        unidades = [puntos[clave] for clave in seleccion if clave in puntos]
+        topologia = topologia_municipios().topojson(tuple(seleccion), nivel_zoom(zoom))
+        return generar_mapa([entidad, *nodo], lat, lon, topologia, estilo, zoom,
+                            pd.concat(unidades, ignore_index=True) if unidades else None, version)
+    # Una localidad se muestra con el contorno de su municipio
+    selected_municipio = nodo[1] if nodo[0] == 'municipio' else jerarquia[nodo]['padre'][1]
+    geometria = geometrias.get(selected_municipio)
+    if geometria is None:
+        # Se ve en /metrics; un municipio del catálogo sin contorno en el shapefile
+        incrementar('tablero_municipios_sin_geometria_total', {'municipio': selected_municipio})
+        return ""
+    # Centroide calculado al arrancar y contorno simplificado para el zoom del mapa; el HTML de folium se
+    # guarda en disco
+    lat, lon = geometria['centroide']
+    topologia = topologia_municipios().topojson((selected_municipio,), nivel_zoom(12))
+    return generar_mapa(selected_municipio, lat, lon, topologia, unidades=puntos.get(selected_municipio),
+                        version=version)
+
+# Callback para la página visible de la tabla
+@app.callback(
+    [Output('table', 'data'),
+     Output('table', 'page_count'),
+     Output('table', 'page_current')],
+    SELECCION +
+    [Input('table', 'page_current'),
+     Input('table', 'page_size'),
+     Input('table', 'sort_by'),
+     Input('table', 'filter_query')]
+)
+def update_table(entidad, jurisdiccion, selected_municipio, localidad, page_current, page_size, sort_by, filter_query):
+    # Al cambiar cualquier nivel de la selección se vuelve a la primera página
+    if ctx.triggered_id in ('dropdown-entidades', 'dropdown-jurisdicciones', 'dropdown-municipios', 'dropdown-localidades'):
+        page_current = 0
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio, localidad)
+    entrada = obtener_jerarquia(entidad).get(nodo)
+    data, page_count = pagina(entrada, page_current, page_size, sort_by, filter_query)
+    return data, page_count, min(page_current or 0, page_count - 1)
+
+# Página visible de la tabla de cobertura de la selección
+@app.callback(
+    [Output('tabla-cobertura', 'data'),
+     Output('tabla-cobertura', 'page_count'),
+     Output('tabla-cobertura', 'page_current')],
+    SELECCION +
+    [Input('tabla-cobertura', 'page_current'),
+     Input('tabla-cobertura', 'page_size'),
+     Input('tabla-cobertura', 'sort_by'),
+     Input('tabla-cobertura', 'filter_query')]
+)
+def update_tabla_cobertura(entidad, jurisdiccion, selected_municipio, localidad, page_current, page_size, sort_by, filter_query):
+    if ctx.triggered_id in ('dropdown-entidades', 'dropdown-jurisdicciones', 'dropdown-municipios', 'dropdown-localidades'):
+        page_current = 0
+    entidad, nodo = seleccion_nodo(entidad, jurisdiccion, selected_municipio, localidad)
+    data, page_count = pagina(entrada_cobertura(entidad, nodo), page_current, page_size, sort_by, filter_query)
+    return data, page_count, min(page_current or 0, page_count - 1)
+
+# Enlace de descarga de la selección actual; solo arma la URL, por eso corre en el navegador
+app.clientside_callback(
+    """
+    function(entidad, jurisdiccion, municipio, localidad, formato) {
+        var parametros = {entidad: entidad, jurisdiccion: jurisdiccion, municipio: municipio, localidad: localidad};
+        return '/exportar/' + formato + '?' + Object.keys(parametros).map(function(nombre) {
+            var valor = parametros[nombre];
+            return nombre + '=' + encodeURIComponent(valor === null || valor === undefined ? '' : valor);
+        }).join('&');
+    }
+    """,
+    Output("btn-download-excel", "href"),
+    *SELECCION,
+    Input('formato-exportacion', 'value')
+)
 
 if __name__ == "__main__":  # Cambiar a "__main__"
     app.run_server(debug=True)  # Cambiar a False
\ No newline at end of file
@@ -1,16 +1,28 @@
 import dash
 from dash import dcc, html, Input, Output
-import geopandas as gpd
-import unidecode
-import folium
 import dash_leaflet as dl
+from funciones import dimension_municipios, normalizar_nombre
+from geometrias import construir_geometrias, encuadre
+from mosaicos import registrar_mosaicos
+from topologia import nivel_zoom, topologia_municipios
 
-# Cargar los datos
-df_mpios_shape = gpd.read_file("files/mapa/muni_2018gw/muni_2018gw.shp", encoding="UTF-8")
-df_mpios_shape["NOM_MUN"] = df_mpios_shape["NOM_MUN"].apply(lambda x: unidecode.unidecode(x.upper()))
+# Cargar las geometrías de todo el país y agrupar por nombre normalizado las claves del catálogo de
+# municipios que tienen geometría
+geometrias_municipios = construir_geometrias(None)
+dimension = dimension_municipios()
+dimension = dimension[dimension['CVE_MUNICIPIO'].isin(list(geometrias_municipios))]
+claves_por_nombre = dimension.groupby('NOMBRE_NORMALIZADO')['CVE_MUNICIPIO'].agg(lambda claves: [int(clave) for clave in claves]).to_dict()
+centro_pais, zoom_pais = encuadre(geometrias_municipios)
 
 # Crear la aplicación Dash
 app = dash.Dash(__name__)
+registrar_mosaicos(app.server)
+
+# Fondo del mapa y municipios de todo el país en mosaicos vectoriales (assets/mosaicos.js)
+capas_base = [
+    dl.TileLayer(),
+    dl.LayerGroup(eventHandlers={'add': {'variable': 'capasMapa.mosaicosMunicipios'}}),
+]
 
 # Layout de la aplicación
 app.layout = html.Div([
@@ -26,9 +38,10 @@ app.layout = html.Div([
     ], style={"marginBottom": "20px"}),
     html.Div(id="mapa-container", children=[
         dl.Map(
-            center=(20.12, -98.73),  # Coordenadas aproximadas de Hidalgo
-            zoom=8,
+            center=centro_pais,
+            zoom=zoom_pais,
             id="mapa",
+            children=capas_base,
             style={"height": "500px", "width": "100%"}
         )
     ])
@@ -42,20 +55,19 @@ app.layout = html.Div([
 )
 def actualizar_mapa(n_clicks, municipio):
     if not municipio:
-        return []
+        return capas_base
 
-    # Filtrar por municipio
-    municipio_upper = unidecode.unidecode(municipio.upper())
-    municipio_shape = df_mpios_shape[df_mpios_shape["NOM_MUN"] == municipio_upper]
+    # Buscar por nombre normalizado (puede haber municipios homónimos en varios estados)
+    claves = claves_por_nombre.get(normalizar_nombre(municipio), [])
 
-    if municipio_shape.empty:
-        return []  # No hay coincidencias, devolver mapa vacío
+    if not claves:
+        return capas_base  # No hay coincidencias, solo los municipios
 
-    # Convertir la geometría en GeoJSON
-    geojson = municipio_shape.__geo_interface__
+    # GeoJSON de los municipios encontrados, simplificado para el zoom que los encuadra
+    _, zoom = encuadre({clave: geometrias_municipios[clave] for clave in claves})
+    geojson = topologia_municipios().geojson(claves, nivel_zoom(zoom))
 
-    return [
-        dl.TileLayer(),  # Fondo del mapa
+    return capas_base + [
         dl.GeoJSON(data=geojson, id="municipio", style={"color": "red", "weight": 2})
     ]
 
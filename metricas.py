@@ -0,0 +1,175 @@
+# metricas.py
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from flask import Response, g, request
+
+# Límites de los histogramas (segundos y bytes)
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Fracción de peticiones que se perfilan con cProfile (0 = ninguna); por ejemplo PERFILAR_PETICIONES=0.01
+MUESTREO_PERFILES = float(os.environ.get('PERFILAR_PETICIONES', '0'))
+DIRECTORIO_PERFILES = os.path.join("cache", "perfiles")
+
+DESCRIPCIONES = {
+    'tablero_callback_segundos': ('histogram', "Tiempo de cada callback de Dash (incluye serializar la respuesta)"),
+    'tablero_callback_cpu_segundos_total': ('counter', "Tiempo de CPU usado por cada callback de Dash"),
+    'tablero_callback_bytes': ('histogram', "Tamaño de la respuesta de cada callback de Dash"),
+    'tablero_ruta_segundos': ('histogram', "Tiempo de las demás rutas del servidor"),
+    'tablero_ruta_bytes': ('histogram', "Tamaño de la respuesta de las demás rutas del servidor"),
+    'tablero_funcion_segundos': ('histogram', "Tiempo de las funciones de carga y procesamiento de datos"),
+    'tablero_funcion_cpu_segundos_total': ('counter', "Tiempo de CPU de las funciones de carga y procesamiento"),
+    'tablero_cache_total': ('counter', "Consultas a las cachés por resultado (acierto o fallo)"),
+    'tablero_perfiles_total': ('counter', "Peticiones perfiladas con cProfile"),
+    'tablero_municipios_sin_geometria_total': ('counter', "Municipios pedidos al mapa que no están en el shapefile"),
+}
+
+# Cada worker de gunicorn lleva sus propios valores
+_candado = threading.Lock()
+_histogramas = {}  # (nombre, etiquetas) -> {'limites', 'conteos', 'suma', 'total'}
+_contadores = {}  # (nombre, etiquetas) -> valor
+
+
+def observar(nombre, etiquetas, valor, limites=LIMITES_SEGUNDOS):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    with _candado:
+        histograma = _histogramas.get(clave)
+        if histograma is None:
+            histograma = _histogramas[clave] = {'limites': limites, 'conteos': [0] * len(limites), 'suma': 0.0, 'total': 0}
+        for i, limite in enumerate(limites):
+            if valor <= limite:
+                histograma['conteos'][i] += 1
+                break
+        histograma['suma'] += valor
+        histograma['total'] += 1
+
+
+def incrementar(nombre, etiquetas, valor=1):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    with _candado:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def contar_cache(cache, acierto):
+    incrementar('tablero_cache_total', {'cache': cache, 'resultado': 'acierto' if acierto else 'fallo'})
+
+
+def instrumentar(funcion):
+    # Decorador para las funciones de carga de datos: tiempo total y de CPU por llamada
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            etiquetas = {'funcion': funcion.__name__}
+            observar('tablero_funcion_segundos', etiquetas, time.perf_counter() - inicio)
+            incrementar('tablero_funcion_cpu_segundos_total', etiquetas, time.thread_time() - inicio_cpu)
+    return envoltura
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_etiqueta(valor)}"' for nombre, valor in pares) + '}'
+
+
+def texto_prometheus():
+    # Formato de texto de Prometheus (versión 0.0.4)
+    with _candado:
+        histogramas = {clave: dict(h, conteos=list(h['conteos'])) for clave, h in _histogramas.items()}
+        contadores = dict(_contadores)
+
+    lineas = []
+    for nombre, (tipo, descripcion) in DESCRIPCIONES.items():
+        series = [(etiquetas, h) for (n, etiquetas), h in sorted(histogramas.items()) if n == nombre]
+        series += [(etiquetas, v) for (n, etiquetas), v in sorted(contadores.items()) if n == nombre]
+        if not series:
+            continue
+        lineas.append(f"# HELP {nombre} {descripcion}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for etiquetas, valor in series:
+            if tipo != 'histogram':
+                lineas.append(f"{nombre}{_formatear(etiquetas)} {valor}")
+                continue
+            acumulado = 0
+            for limite, conteo in zip(valor['limites'], valor['conteos']):
+                acumulado += conteo
+                lineas.append(f"{nombre}_bucket{_formatear(etiquetas, [('le', limite)])} {acumulado}")
+            lineas.append(f"{nombre}_bucket{_formatear(etiquetas, [('le', '+Inf')])} {valor['total']}")
+            lineas.append(f"{nombre}_sum{_formatear(etiquetas)} {valor['suma']}")
+            lineas.append(f"{nombre}_count{_formatear(etiquetas)} {valor['total']}")
+    return '\n'.join(lineas) + '\n'
+
+
+def _nombre_peticion():
+    # Los callbacks de Dash llegan todos a la misma ruta; se distinguen por su salida
+    if request.path.endswith('/_dash-update-component'):
+        cuerpo = request.get_json(silent=True) or {}
+        return 'callback', cuerpo.get('output', 'desconocido')
+    regla = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+    return 'ruta', regla
+
+
+def registrar_metricas(server):
+    # Mide cada petición al servidor (callbacks incluidos) y expone los valores en /metrics
+    @server.before_request
+    def iniciar_medicion():
+        if request.path == '/metrics':
+            return
+        g.metricas_inicio = (time.perf_counter(), time.thread_time())
+        if MUESTREO_PERFILES > 0 and random.random() < MUESTREO_PERFILES:
+            g.metricas_perfil = cProfile.Profile()
+            g.metricas_perfil.enable()
+
+    @server.after_request
+    def terminar_medicion(respuesta):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return respuesta
+        perfil = g.pop('metricas_perfil', None)
+        if perfil is not None:
+            perfil.disable()
+        tipo, nombre = _nombre_peticion()
+        segundos, cpu = time.perf_counter() - inicio[0], time.thread_time() - inicio[1]
+        tamano = respuesta.content_length
+
+        if tipo == 'callback':
+            etiquetas = {'callback': nombre}
+            observar('tablero_callback_segundos', etiquetas, segundos)
+            incrementar('tablero_callback_cpu_segundos_total', etiquetas, cpu)
+            if tamano is not None:
+                observar('tablero_callback_bytes', etiquetas, tamano, LIMITES_BYTES)
+        elif not request.path.startswith(('/_dash', '/assets/', '/_favicon')):
+            etiquetas = {'ruta': nombre}
+            observar('tablero_ruta_segundos', etiquetas, segundos)
+            if tamano is not None:
+                observar('tablero_ruta_bytes', etiquetas, tamano, LIMITES_BYTES)
+
+        if perfil is not None:
+            guardar_perfil(perfil, nombre)
+        return respuesta
+
+    @server.route('/metrics')
+    def metricas():
+        return Response(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def guardar_perfil(perfil, nombre):
+    # Un archivo .prof por petición muestreada; se revisa con python -m pstats o snakeviz
+    os.makedirs(DIRECTORIO_PERFILES, exist_ok=True)
+    limpio = ''.join(c if c.isalnum() else '_' for c in nombre).strip('_')[:80]
+    ruta = os.path.join(DIRECTORIO_PERFILES, f"{time.strftime('%Y%m%d_%H%M%S')}_{time.time_ns() % 10**9:09d}_{os.getpid()}_{limpio}.prof")
+    try:
+        perfil.dump_stats(ruta)
+        incrementar('tablero_perfiles_total', {})
+    except OSError as e:
+        print(f"No se pudo guardar el perfil {ruta}: {e}")
@@ -0,0 +1,209 @@
+# mosaicos.py
+# Mosaicos vectoriales (Mapbox Vector Tile 2.1) con los municipios de todo el país en /tiles/{z}/{x}/{y}.mvt:
+# cada mosaico lleva solo los polígonos que lo tocan, recortados y simplificados para su zoom, y se guarda
+# en disco; el navegador (assets/mosaicos.js) pide solo los mosaicos que está viendo
+import hashlib
+import itertools
+import os
+from functools import lru_cache
+import numpy as np
+import shapely
+from flask import abort, send_file
+from cache_mapas import desalojar, obtener_archivo
+from funciones import firma_archivos
+from geometrias import fuentes_municipios
+from metricas import contar_cache
+from topologia import nivel_zoom, topologia_municipios
+
+DIRECTORIO_MOSAICOS = "cache/mosaicos"
+MAXIMO_MOSAICOS = 5000  # Mosaicos que se conservan en disco
+DESALOJAR_CADA = 100  # Mosaicos generados por proceso entre una revisión del límite y la siguiente
+VERSION_MOSAICOS = 2  # Cambia cuando cambia la forma de generar los mosaicos
+TIPO_MVT = 'application/vnd.mapbox-vector-tile'
+CAPA = 'municipios'
+EXTENSION = 4096  # Coordenadas enteras por lado del mosaico
+BORDE = 64  # Coordenadas de más alrededor del recorte para que las líneas no se corten en la orilla
+ZOOM_MAXIMO = 14  # Más cerca, el navegador amplía los mosaicos de este zoom
+LIMITE_MERCATOR = 20037508.342789244  # Mitad del ancho del mundo en Web Mercator (EPSG:3857), en metros
+
+# Comandos de geometría de MVT
+MOVER, LINEA, CERRAR = 1, 2, 7
+POLIGONO = 3
+
+_generados = itertools.count(1)
+
+
+class MunicipiosMercator:
+    # Polígonos de la topología (topologia.py) con un STRtree para encontrar los que tocan cada mosaico;
+    # cada zoom usa los arcos simplificados de su nivel, así los municipios vecinos no se separan
+
+    def __init__(self, topologia):
+        self.topologia = topologia
+        self.claves = topologia.claves
+        self.nombres = topologia.nombres
+        self.arbol = shapely.STRtree(topologia.poligonos())
+
+    def simplificados(self, zoom):
+        return self.topologia.poligonos(nivel_zoom(zoom))
+
+    def mosaico(self, z, x, y):
+        # Contenido del mosaico (bytes de MVT); vacío si no toca ningún municipio
+        tamano = tamano_mosaico(z)
+        oeste, norte = -LIMITE_MERCATOR + x * tamano, LIMITE_MERCATOR - y * tamano
+        borde = tamano * BORDE / EXTENSION
+        limites = (oeste - borde, norte - tamano - borde, oeste + tamano + borde, norte + borde)
+        indices = self.arbol.query(shapely.box(*limites))
+        if len(indices) == 0:
+            return b''
+        indices.sort()
+        recortes = shapely.clip_by_rect(self.simplificados(z)[indices], *limites)
+        # Coordenadas del mosaico: origen en la esquina noroeste, y hacia abajo
+        escala = EXTENSION / tamano
+        recortes = shapely.transform(recortes, lambda xy: np.rint((xy - [oeste, norte]) * [escala, -escala]))
+        features = []
+        for indice, recorte in zip(indices.tolist(), recortes):
+            geometria = geometria_poligonos(recorte)
+            if geometria:
+                features.append((int(self.claves[indice]), str(self.nombres[indice]), geometria))
+        return codificar_capa(CAPA, features) if features else b''
+
+
+def tamano_mosaico(zoom):
+    return 2 * LIMITE_MERCATOR / 2 ** zoom
+
+
+@lru_cache(maxsize=1)
+def _municipios_mercator(version):
+    return MunicipiosMercator(topologia_municipios())
+
+
+def municipios_mercator():
+    # Se vuelven a cargar cuando cambia el shapefile
+    return _municipios_mercator(firma_archivos(fuentes_municipios()))
+
+
+def _varint(valor, salida):
+    while valor > 0x7f:
+        salida.append((valor & 0x7f) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+
+
+def _campo_varint(salida, numero, valor):
+    _varint(numero << 3, salida)
+    _varint(valor, salida)
+
+
+def _campo_bytes(salida, numero, datos):
+    _varint(numero << 3 | 2, salida)
+    _varint(len(datos), salida)
+    salida += datos
+
+
+def _campo_empaquetado(salida, numero, valores):
+    datos = bytearray()
+    for valor in valores:
+        _varint(valor, datos)
+    _campo_bytes(salida, numero, datos)
+
+
+def geometria_poligonos(geometria):
+    # Comandos MVT de un polígono o multipolígono con coordenadas enteras del mosaico. Los anillos que
+    # quedan sin área al redondear se descartan (con sus huecos, si es el exterior); el exterior va en
+    # sentido horario en pantalla (área positiva) y los huecos al revés
+    comandos = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for poligono in shapely.get_parts(geometria):
+        if shapely.get_type_id(poligono) != 3:
+            continue
+        anillos = [shapely.get_exterior_ring(poligono)] + list(shapely.get_interior_ring(poligono, range(shapely.get_num_interior_rings(poligono))))
+        for numero, anillo in enumerate(anillos):
+            puntos = shapely.get_coordinates(anillo).astype(np.int64)[:-1]
+            # Sin puntos repetidos seguidos (contando el cierre)
+            puntos = puntos[np.any(puntos != np.roll(puntos, 1, axis=0), axis=1)]
+            if len(puntos) < 3:
+                if numero == 0:
+                    break
+                continue
+            area = np.sum(puntos[:, 0] * np.roll(puntos[:, 1], -1) - np.roll(puntos[:, 0], -1) * puntos[:, 1])
+            if area == 0:
+                if numero == 0:
+                    break
+                continue
+            if (area > 0) != (numero == 0):
+                puntos = puntos[::-1]
+            # Desplazamientos desde el punto anterior, en zigzag para que los negativos sean enteros sin signo
+            delta = np.diff(puntos, axis=0, prepend=cursor[None, :])
+            delta = ((delta << 1) ^ (delta >> 63)).tolist()
+            cursor = puntos[-1]
+            comandos += [1 << 3 | MOVER, *delta[0], (len(puntos) - 1) << 3 | LINEA]
+            comandos += [valor for par in delta[1:] for valor in par]
+            comandos.append(1 << 3 | CERRAR)
+    return comandos
+
+
+def codificar_capa(nombre, features):
+    # Mosaico con una capa; cada feature es (clave, nombre, comandos) y lleva esas dos propiedades
+    capa = bytearray()
+    _campo_varint(capa, 15, 2)  # versión de la especificación
+    _campo_bytes(capa, 1, nombre.encode('utf-8'))
+    for indice, (clave, nombre_municipio, comandos) in enumerate(features):
+        feature = bytearray()
+        _campo_varint(feature, 1, clave)
+        # Etiquetas: (clave 0 'clave', valor 2i) y (clave 1 'nombre', valor 2i + 1)
+        _campo_empaquetado(feature, 2, [0, 2 * indice, 1, 2 * indice + 1])
+        _campo_varint(feature, 3, POLIGONO)
+        _campo_empaquetado(feature, 4, comandos)
+        _campo_bytes(capa, 2, feature)
+    for llave in ['clave', 'nombre']:
+        _campo_bytes(capa, 3, llave.encode('utf-8'))
+    for clave, nombre_municipio, _ in features:
+        entero, texto = bytearray(), bytearray()
+        _campo_varint(entero, 4, clave)
+        _campo_bytes(texto, 1, nombre_municipio.encode('utf-8'))
+        _campo_bytes(capa, 4, entero)
+        _campo_bytes(capa, 4, texto)
+    _campo_varint(capa, 5, EXTENSION)
+    mosaico = bytearray()
+    _campo_bytes(mosaico, 3, capa)
+    return bytes(mosaico)
+
+
+def ruta_mosaico(z, x, y):
+    # Devuelve la ruta del mosaico en disco, o None si está vacío; los vacíos se guardan como archivos de
+    # cero bytes para no volver a generarlos
+    version = hashlib.sha1(repr((VERSION_MOSAICOS, firma_archivos(fuentes_municipios()))).encode('utf-8')).hexdigest()[:12]
+    ruta = os.path.join(DIRECTORIO_MOSAICOS, f"mosaico_{version}_{z}_{x}_{y}.mvt")
+    contenido = []
+
+    def generar(temporal):
+        contenido.append(municipios_mercator().mosaico(z, x, y))
+        with open(temporal, 'wb') as archivo:
+            archivo.write(contenido[0])
+
+    generado = obtener_archivo(ruta, generar)
+    contar_cache('mosaicos', not generado)
+    if generado:
+        vacio = not contenido[0]
+        # Revisar el límite con cada mosaico nuevo obligaría a listar todo el directorio cada vez
+        if next(_generados) % DESALOJAR_CADA == 0:
+            desalojar(MAXIMO_MOSAICOS, DIRECTORIO_MOSAICOS, "mosaico_*.mvt")
+    else:
+        try:
+            vacio = os.path.getsize(ruta) == 0
+        except OSError:
+            # Lo desalojó otro proceso; se vuelve a generar
+            return ruta_mosaico(z, x, y)
+    return None if vacio else ruta
+
+
+def registrar_mosaicos(server):
+    # Ruta /tiles/<z>/<x>/<y>.mvt con los municipios del mosaico; los vacíos se responden sin contenido
+    @server.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+    def descargar_mosaico(z, x, y):
+        if not (0 <= z <= ZOOM_MAXIMO and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            abort(404)
+        ruta = ruta_mosaico(z, x, y)
+        if ruta is None:
+            return '', 204
+        return send_file(os.path.abspath(ruta), mimetype=TIPO_MVT, max_age=86400)
@@ -1,17 +1,18 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_leaflet as dl
-import geopandas as gpd
-import unidecode
+from funciones import ENTIDAD
+from geometrias import construir_geometrias, encuadre
+from topologia import nivel_zoom, topologia_municipios
 
-# Cargar el archivo Shapefile
-data = gpd.read_file("files/mapa/muni_2018gw/muni_2018gw.shp", encoding="UTF-8")
-data["NOM_MUN"] = data["NOM_MUN"].apply(lambda x: unidecode.unidecode(x.upper()))  # Convertir a mayúsculas y eliminar acentos
-data = data[data["CVE_ENT"] == "13"]  # Filtrar solo los datos de Hidalgo
-data = data[["NOM_MUN", "geometry"]]  # Nos quedamos solo con el nombre y la geometría
+# Cargar las geometrías de la entidad ya convertidas a WGS84 y con sus centroides
+geometrias_municipios = construir_geometrias(ENTIDAD)
+# Centro y zoom que encuadran la entidad
+centro_entidad, zoom_entidad = encuadre(geometrias_municipios)
 
-# Convertir el GeoDataFrame a GeoJSON
-geojson_data = data.to_crs(epsg='4326').to_json()
+# GeoJSON con todos los municipios del estado, simplificado para el zoom inicial (las fronteras compartidas
+# se simplifican igual de los dos lados)
+geojson_data = topologia_municipios().geojson(list(geometrias_municipios), nivel_zoom(zoom_entidad))
 
 # Crear la aplicación Dash
 app = dash.Dash(__name__)
@@ -20,12 +21,12 @@ app = dash.Dash(__name__)
 app.layout = html.Div([
     dcc.Dropdown(
         id='dropdown-municipios',
-        options=[{'label': row['NOM_MUN'], 'value': row['NOM_MUN']} for index, row in data.iterrows()],
+        options=[{'label': geometria['nombre'], 'value': clave} for clave, geometria in geometrias_municipios.items()],
         placeholder="Seleccione un municipio"
     ),
     dl.Map(
-        center=[20.1, -98.75],  # Centro del mapa en Hidalgo
-        zoom=8,  # Nivel de zoom inicial
+        center=centro_entidad,
+        zoom=zoom_entidad,
         children=[
             dl.TileLayer(),  # Capa base del mapa
             dl.GeoJSON(data=geojson_data, id='municipios-geojson')  # Capa de municipios
@@ -55,12 +56,10 @@ def municipio_click(feature):
 )
 def centrar_mapa(municipio):
     if municipio is not None:
-        # Obtener la geometría del municipio seleccionado
-        geom = data[data['NOM_MUN'] == municipio].geometry.iloc[0]
-        # Calcular el centroide de la geometría
-        centroide = geom.centroid
-        return [centroide.y, centroide.x]
-    return [20.1, -98.75]  # Centro del mapa en Hidalgo
+        # Centroide calculado en un CRS proyectado al cargar las geometrías
+        lat, lon = geometrias_municipios[municipio]['centroide']
+        return [lat, lon]
+    return centro_entidad
 
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
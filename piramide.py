@@ -0,0 +1,94 @@
+# piramide.py
+import plotly.graph_objects as go
+from dash import Patch
+from funciones import ENTIDAD, QUINQUENIOS, RAIZ, etiqueta_nodo, obtener_jerarquia
+
+COLOR_HOMBRES = '#e09f3e'
+COLOR_MUJERES = '#84a59d'
+
+
+def figura_piramide():
+    # Plantilla de la pirámide: trazas, colores, ejes y quinquenios; se envía una sola vez con el
+    # layout y después cada selección solo cambia los valores (ver parche_piramide)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=QUINQUENIOS,
+        x=[],
+        name='Hombres',
+        orientation='h',
+        marker=dict(color=COLOR_HOMBRES),
+        hovertemplate='%{y}: %{text}<extra></extra>',
+        text=[]
+    ))
+    fig.add_trace(go.Bar(
+        y=QUINQUENIOS,
+        x=[],
+        name='Mujeres',
+        orientation='h',
+        marker=dict(color=COLOR_MUJERES),
+        hovertemplate='%{y}: %{x}<extra></extra>',
+        text=[]
+    ))
+    fig.update_layout(
+        title='',
+        xaxis_title='Población',
+        yaxis_title='Edad',
+        barmode='relative',
+        bargap=0.1,
+        bargroupgap=0,
+        xaxis=dict(tickvals=[], ticktext=[]),
+        width=600,  # Ancho de la figura en píxeles
+        height=600  # Altura de la figura en píxeles
+    )
+    return fig
+
+
+def valores_piramide(entrada, nombre):
+    poblacion_masculina = [-val for val in entrada['hombres']]  # Valores negativos para la gráfica
+    poblacion_femenina = entrada['mujeres']
+    max_val = max(max(poblacion_femenina), abs(min(poblacion_masculina)))
+    tickvals = [-max_val, -max_val/2, 0, max_val/2, max_val]
+    return {
+        'titulo': f"Pirámide Poblacional de {nombre}",
+        'hombres': poblacion_masculina,
+        'texto_hombres': entrada['hombres'],
+        'mujeres': poblacion_femenina,
+        'tickvals': tickvals,
+        'ticktext': [str(int(abs(val))) for val in tickvals],
+    }
+
+
+def piramide_nodo(entidad, nodo, entrada):
+    # Valores de la pirámide del nodo; se guardan en su entrada, así que se recalculan cuando se
+    # reconstruye el índice
+    if 'piramide' not in entrada:
+        nombre = etiqueta_nodo(entidad, nodo, entrada['nombre'])
+        entrada['piramide'] = valores_piramide(entrada, nombre) if entrada['hombres'] is not None else None
+    return entrada['piramide']
+
+
+def precalcular_piramides(entidad=ENTIDAD):
+    # Valores de la pirámide de todos los nodos de la navegación (entidad, jurisdicciones, municipios
+    # y localidades), para no calcularlos en la primera petición de cada uno
+    jerarquia = obtener_jerarquia(entidad)
+    for nodo, entrada in jerarquia.items():
+        piramide_nodo(entidad, nodo, entrada)
+    return jerarquia
+
+
+def parche_piramide(nodo=RAIZ, entidad=ENTIDAD):
+    # Actualización parcial de la figura: dos vectores de 19 valores, las marcas del eje y el título.
+    # Solo se busca la entrada del nodo pedido
+    entrada = obtener_jerarquia(entidad).get(nodo)
+    valores = piramide_nodo(entidad, nodo, entrada) if entrada is not None else None
+    if valores is None:
+        valores = {'titulo': '', 'hombres': [], 'texto_hombres': [], 'mujeres': [], 'tickvals': [], 'ticktext': []}
+    parche = Patch()
+    parche['data'][0]['x'] = valores['hombres']
+    parche['data'][0]['text'] = valores['texto_hombres']
+    parche['data'][1]['x'] = valores['mujeres']
+    parche['data'][1]['text'] = valores['mujeres']
+    parche['layout']['xaxis']['tickvals'] = valores['tickvals']
+    parche['layout']['xaxis']['ticktext'] = valores['ticktext']
+    parche['layout']['title']['text'] = valores['titulo']
+    return parche
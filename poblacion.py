@@ -0,0 +1,68 @@
+# poblacion.py
+# Cubo de población: arreglos de enteros por nivel (entidad, jurisdicción, municipio, localidad y CLUES)
+# con forma (clave, sexo, quinquenio), armados una sola vez a partir de la población por CLUES
+import numpy as np
+import pandas as pd
+
+QUINQUENIOS = ['0-4 años', '5-9 años', '10-14 años', '15-19 años', '20-24 años', '25-29 años', '30-34 años',
+               '35-39 años', '40-44 años', '45-49 años', '50-54 años', '55-59 años', '60-64 años', '65-69 años',
+               '70-74 años', '75-79 años', '80-84 años', '85+ años', 'indefinido']
+SEXOS = ['h', 'm']
+
+# Niveles del más amplio al más fino: columna con la clave y columna con el nombre en la tabla por CLUES
+NIVELES = {
+    'entidad': ('CVE_ENTIDAD', 'NOMBRE_ENTIDAD'),
+    'jurisdiccion': ('CVE_JURISDICCION', 'NOMBRE_JURISDICCION'),
+    'municipio': ('CVE_MUNICIPIO', 'NOMBRE_MUNICIPIO'),
+    'localidad': ('CVE_LOCALIDAD', 'NOMBRE_LOCALIDAD'),
+    'clues': ('CLUES', 'NOMBRE_UNIDAD'),
+}
+
+
+def columnas_poblacion():
+    # h0-4 años ... h indefinido, m0-4 años ... m indefinido, como en el reporte de población
+    return [f'{sexo}{q}' for sexo in SEXOS for q in QUINQUENIOS]
+
+
+class CuboPoblacion:
+    # valores[nivel][fila] es la pirámide (sexo x quinquenio) de una clave; posiciones[nivel] da la fila de
+    # cada clave, así que consultar la pirámide de cualquier nivel es una búsqueda y un corte del arreglo
+
+    def __init__(self, tabla):
+        # tabla: una fila por CLUES con las columnas de NIVELES y las de columnas_poblacion()
+        finos = tabla[columnas_poblacion()].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(np.int64)
+        finos = finos.reshape(len(tabla), len(SEXOS), len(QUINQUENIOS))
+        self.claves, self.nombres, self.valores, self.posiciones = {}, {}, {}, {}
+        for nivel, (columna_clave, columna_nombre) in NIVELES.items():
+            # Cada nivel se suma directamente desde las CLUES, sin recorrer los niveles intermedios
+            codigos, claves = pd.factorize(tabla[columna_clave], sort=True)
+            validos = codigos >= 0
+            valores = np.zeros((len(claves), len(SEXOS), len(QUINQUENIOS)), dtype=np.int64)
+            np.add.at(valores, codigos[validos], finos[validos])
+            nombres = tabla[columna_nombre][validos].groupby(codigos[validos]).first()
+            self.claves[nivel] = np.asarray(claves)
+            self.nombres[nivel] = nombres.reindex(range(len(claves))).to_numpy(dtype=object)
+            self.valores[nivel] = valores.astype(np.int32)
+            self.posiciones[nivel] = {clave: fila for fila, clave in enumerate(self.claves[nivel].tolist())}
+
+    def piramide(self, nivel, clave):
+        # Arreglo (sexo, quinquenio) de una clave, o None si no tiene población
+        fila = self.posiciones[nivel].get(clave)
+        return None if fila is None else self.valores[nivel][fila]
+
+    def totales(self, nivel):
+        # Hombres y mujeres de todas las claves del nivel: arreglo (clave, sexo)
+        return self.valores[nivel].sum(axis=2, dtype=np.int64)
+
+    def sumar(self, nivel, claves):
+        # Pirámide de un conjunto de claves del mismo nivel (por ejemplo las CLUES de una zona)
+        filas = [self.posiciones[nivel][clave] for clave in claves if clave in self.posiciones[nivel]]
+        return self.valores[nivel][filas].sum(axis=0, dtype=np.int64)
+
+    def tabla(self, nivel):
+        # El nivel como DataFrame con una columna por sexo y quinquenio
+        columna_clave, columna_nombre = NIVELES[nivel]
+        df = pd.DataFrame(self.valores[nivel].reshape(len(self.claves[nivel]), -1), columns=columnas_poblacion())
+        df.insert(0, columna_nombre, self.nombres[nivel])
+        df.insert(0, columna_clave, self.claves[nivel])
+        return df
@@ -0,0 +1,88 @@
+# tabla.py
+import re
+import numpy as np
+import pandas as pd
+from metricas import contar_cache
+
+# Operadores que envía el DataTable en filter_query (misma sintaxis que la documentación de Dash)
+OPERADORES = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='],
+              ['contains '], ['datestartswith ']]
+# Nombre de la operación por cada forma en que puede venir escrito el operador
+NOMBRES_OPERADOR = {operador.strip(): operadores[0].strip() for operadores in OPERADORES for operador in operadores}
+# El operador va justo después de la columna; así no se confunde con texto del valor ("Valle de ...")
+PATRON_FILTRO = re.compile(r'\{(.+?)\}\s+(' + '|'.join(sorted(map(re.escape, NOMBRES_OPERADOR), key=len, reverse=True))
+                           + r')\s+(.*)$', re.DOTALL)
+MAXIMO_ORDENES = 64  # Combinaciones de orden/filtro que se guardan por municipio
+
+
+def separar_filtro(parte):
+    coincidencia = PATRON_FILTRO.match(parte.strip())
+    if coincidencia is None:
+        return None, None, None
+    nombre, operador, valor = coincidencia.groups()
+    valor = valor.strip()
+    if len(valor) > 1 and valor[0] == valor[-1] and valor[0] in ("'", '"', '`'):
+        valor = valor[1:-1].replace('\\' + valor[0], valor[0])
+    else:
+        try:
+            valor = float(valor)
+        except ValueError:
+            pass
+    return nombre, NOMBRES_OPERADOR[operador], valor
+
+
+def mascara_filtro(df, filter_query):
+    mascara = np.ones(len(df), dtype=bool)
+    for parte in (filter_query or '').split(' && '):
+        columna, operador, valor = separar_filtro(parte)
+        if columna not in df.columns:
+            continue
+        serie = df[columna]
+        if operador in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            if not isinstance(valor, str) and serie.dtype == object:
+                serie = pd.to_numeric(serie, errors='coerce')
+            comparacion = {
+                'eq': serie.eq, 'ne': serie.ne, 'lt': serie.lt, 'le': serie.le, 'gt': serie.gt, 'ge': serie.ge,
+            }[operador](valor)
+            mascara &= comparacion.fillna(False).to_numpy(dtype=bool)
+        elif operador == 'contains':
+            mascara &= serie.astype(str).str.contains(str(valor), case=False, regex=False).to_numpy()
+        elif operador == 'datestartswith':
+            mascara &= serie.astype(str).str.startswith(str(valor)).to_numpy()
+    return mascara
+
+
+def posiciones(entrada, sort_by, filter_query):
+    # Filas (posiciones) que quedan tras filtrar y ordenar; se guardan en la entrada del índice
+    # para que cambiar de página no vuelva a filtrar ni a ordenar
+    orden = tuple((s['column_id'], s['direction']) for s in (sort_by or []))
+    clave = (orden, filter_query or '')
+    ordenes = entrada.setdefault('ordenes', {})
+    contar_cache('tabla_ordenes', clave in ordenes)
+    if clave in ordenes:
+        return ordenes[clave]
+
+    df = entrada['tabla']
+    resultado = np.flatnonzero(mascara_filtro(df, filter_query))
+    columnas = [columna for columna, _ in orden if columna in df.columns]
+    if columnas:
+        ascendente = [direccion == 'asc' for columna, direccion in orden if columna in df.columns]
+        ordenado = df.iloc[resultado].sort_values(columnas, ascending=ascendente, kind='mergesort', na_position='last')
+        resultado = df.index.get_indexer(ordenado.index)
+
+    if len(ordenes) >= MAXIMO_ORDENES:
+        ordenes.clear()
+    ordenes[clave] = resultado
+    return resultado
+
+
+def pagina(entrada, page_current, page_size, sort_by, filter_query):
+    # Devuelve solo las filas de la página pedida y el número total de páginas
+    if entrada is None:
+        return [], 1
+    filas = posiciones(entrada, sort_by, filter_query)
+    page_size = page_size or 10
+    page_count = max(1, -(-len(filas) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    inicio = page_current * page_size
+    return entrada['tabla'].iloc[filas[inicio:inicio + page_size]].to_dict('records'), page_count
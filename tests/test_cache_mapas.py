@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+import cache_mapas
+
+
+def test_no_se_quita_el_candado_a_un_dueno_vivo(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache_mapas, 'ESPERA_MAXIMA', 0.2)
+    ruta = str(tmp_path / "archivo.lock")
+    eventos = []
+
+    def esperar():
+        with cache_mapas._CandadoArchivo(ruta):
+            eventos.append('segundo')
+
+    with cache_mapas._CandadoArchivo(ruta):
+        otro = threading.Thread(target=esperar)
+        otro.start()
+        # Generar tarda varias veces ESPERA_MAXIMA; el otro tiene que seguir esperando
+        time.sleep(0.8)
+        eventos.append('primero')
+    otro.join(5)
+    assert eventos == ['primero', 'segundo']
+    assert not os.path.exists(ruta)
+
+
+def test_se_quita_el_candado_abandonado(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache_mapas, 'ESPERA_MAXIMA', 0.2)
+    ruta = tmp_path / "archivo.lock"
+    ruta.write_bytes(b"otro-servidor:1:1")
+    os.utime(ruta, (time.time() - 10, time.time() - 10))
+    with cache_mapas._CandadoArchivo(str(ruta)) as candado:
+        assert ruta.read_bytes() == candado.dueno
+    assert not ruta.exists()
+
+
+def test_obtener_archivo_genera_una_sola_vez(tmp_path):
+    ruta = str(tmp_path / "sub" / "mapa.html")
+    llamadas = []
+
+    def generar(temporal):
+        llamadas.append(temporal)
+        with open(temporal, 'w') as archivo:
+            archivo.write('hola')
+
+    assert cache_mapas.obtener_archivo(ruta, generar)
+    assert not cache_mapas.obtener_archivo(ruta, generar)
+    assert len(llamadas) == 1
+    assert sorted(os.listdir(tmp_path / "sub")) == ["mapa.html"]
+
+
+def test_desalojar_borra_los_menos_usados(tmp_path):
+    for i in range(5):
+        ruta = tmp_path / f"mapa_{i}.html"
+        ruta.write_text('x')
+        os.utime(ruta, (1000 + i, 1000 + i))
+    cache_mapas.desalojar(2, str(tmp_path), "mapa_*.html")
+    assert sorted(os.listdir(tmp_path)) == ["mapa_3.html", "mapa_4.html"]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from clusters import CELDA, ZOOM_MAXIMO, GruposUnidades, pixeles
+
+
+def unidades(n=200, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({'LATITUD': rng.uniform(19.6, 21.4, n), 'LONGITUD': rng.uniform(-99.9, -97.9, n)})
+
+
+def test_pixeles():
+    assert pixeles(0, 0, 0) == pytest.approx((128, 128))
+    x, y = pixeles(np.array([85.0511, -85.0511]), np.array([-180, 180]), 1)
+    assert x == pytest.approx([0, 512]) and y == pytest.approx([0, 512], abs=1e-3)
+
+
+def test_todos_los_zooms_cuentan_todas_las_unidades():
+    df = unidades()
+    grupos = GruposUnidades(df, [f'U{i}' for i in range(len(df))])
+    anteriores = 0
+    for zoom in range(ZOOM_MAXIMO + 1):
+        features = grupos.visibles(zoom)['features']
+        assert sum(feature['properties']['n'] for feature in features) == len(df)
+        # Al acercarse los grupos solo se parten
+        assert len(features) >= anteriores
+        anteriores = len(features)
+    assert anteriores == len(df)
+
+
+def conteo_por_celda(grupos, zoom_grupos, zoom_celdas):
+    # Unidades por celda de zoom_celdas, sumando los grupos de zoom_grupos (su promedio cae en su celda)
+    latitud, longitud, conteo, _ = grupos.niveles[zoom_grupos]
+    x, y = pixeles(latitud, longitud, zoom_celdas)
+    total = {}
+    for celda, n in zip(zip((x // CELDA).astype(int).tolist(), (y // CELDA).astype(int).tolist()), conteo.tolist()):
+        total[celda] = total.get(celda, 0) + n
+    return total
+
+
+def test_grupos_anidados_entre_zooms():
+    df = unidades(500, 1)
+    grupos = GruposUnidades(df, [''] * len(df))
+    for zoom in range(ZOOM_MAXIMO):
+        # Cada grupo del zoom siguiente cae completo en un grupo de este zoom
+        assert conteo_por_celda(grupos, zoom + 1, zoom) == conteo_por_celda(grupos, zoom, zoom)
+
+
+def test_unidad_sola_lleva_su_tooltip_y_los_limites_filtran():
+    df = pd.DataFrame({'LATITUD': [20.1, 20.1001, 25.0], 'LONGITUD': [-98.7, -98.7001, -105.0]})
+    grupos = GruposUnidades(df, ['A', 'B', 'C'])
+    features = grupos.visibles(8)['features']
+    assert sorted(feature['properties']['n'] for feature in features) == [1, 2]
+    solo = next(feature for feature in features if feature['properties']['n'] == 1)
+    assert solo['properties']['tooltip'] == 'C'
+    assert solo['geometry']['coordinates'] == [-105.0, 25.0]
+    # Solo lo que cae en el área visible (más el margen)
+    visibles = grupos.visibles(ZOOM_MAXIMO, [[20.0, -99.0], [20.2, -98.5]])['features']
+    assert sorted(feature['properties']['tooltip'] for feature in visibles) == ['A', 'B']
+    # Zooms fuera de rango se acotan
+    assert grupos.visibles(40) == grupos.visibles(ZOOM_MAXIMO)
+    assert grupos.visibles(None) == grupos.visibles(0)
+
+
+def test_sin_unidades():
+    grupos = GruposUnidades(pd.DataFrame({'LATITUD': [], 'LONGITUD': []}), [])
+    assert grupos.visibles(5, [[19, -100], [21, -98]]) == {'type': 'FeatureCollection', 'features': []}
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from cobertura import Cobertura, puntos, unidades_cobertura
+
+
+def datos(semilla=0, localidades=300, unidades=25):
+    rng = np.random.default_rng(semilla)
+    df_localidades = pd.DataFrame({
+        'CVE_LOCALIDAD': 130010000 + np.arange(localidades) + (np.arange(localidades) % 3) * 10000,
+        'NOMBRE_LOCALIDAD': [f'L{i}' for i in range(localidades)],
+        'POBLACION': rng.integers(0, 5000, localidades),
+        'LATITUD': rng.uniform(20.0, 20.6, localidades),
+        'LONGITUD': rng.uniform(-99.0, -98.4, localidades),
+    })
+    df_unidades = pd.DataFrame({
+        'CLUES': [f'HGSSA{i:06d}' for i in range(unidades)],
+        'NOMBRE': [f'U{i}' for i in range(unidades)],
+        'LATITUD': rng.uniform(20.0, 20.6, unidades),
+        'LONGITUD': rng.uniform(-99.0, -98.4, unidades),
+    })
+    return df_localidades, df_unidades
+
+
+def fuerza_bruta(localidades, unidades, radio):
+    # Distancias de todas las parejas localidad x unidad
+    distancias = shapely.distance(puntos(localidades['LATITUD'], localidades['LONGITUD'])[:, None],
+                                  puntos(unidades['LATITUD'], unidades['LONGITUD'])[None, :])
+    poblacion = (localidades['POBLACION'].to_numpy()[:, None] * (distancias <= radio)).sum(axis=0)
+    return unidades['CLUES'].to_numpy()[distancias.argmin(axis=1)], distancias.min(axis=1), poblacion
+
+
+def revisar(cobertura, localidades, unidades):
+    clues, distancia, poblacion = fuerza_bruta(localidades, unidades, cobertura.radio)
+    assert (cobertura.clues[cobertura.cercana] == clues).all()
+    assert np.allclose(cobertura.distancia, distancia)
+    posiciones = [cobertura.posiciones[c] for c in unidades['CLUES']]
+    assert (cobertura.poblacion_radio[posiciones] == poblacion).all()
+
+
+def test_igual_a_comparar_todas_las_parejas():
+    localidades, unidades = datos()
+    revisar(Cobertura(localidades, unidades), localidades, unidades)
+
+
+def test_cerrar_y_actualizar_igual_que_reconstruir():
+    localidades, unidades = datos(1)
+    cobertura = Cobertura(localidades, unidades)
+    version = cobertura.version
+    cerradas = unidades['CLUES'].iloc[::3].tolist()
+    cobertura.cerrar(cerradas)
+    assert cobertura.version > version
+    abiertas = unidades[~unidades['CLUES'].isin(cerradas)]
+    revisar(cobertura, localidades, abiertas)
+    assert (cobertura.poblacion_radio[[cobertura.posiciones[c] for c in cerradas]] == 0).all()
+    # Catálogo nuevo: vuelven las cerradas, una se mueve y otra desaparece
+    nuevas = unidades.copy()
+    nuevas.loc[1, ['LATITUD', 'LONGITUD']] = [20.3, -98.7]
+    nuevas = nuevas.drop(index=2)
+    cobertura.actualizar(nuevas)
+    revisar(cobertura, localidades, nuevas)
+    # Cerrar una CLUES desconocida o ya cerrada no cambia nada
+    version = cobertura.version
+    cobertura.cerrar(['NO EXISTE', unidades['CLUES'][2]])
+    assert cobertura.version == version
+
+
+def test_sin_unidades_abiertas():
+    localidades, unidades = datos(2, unidades=3)
+    cobertura = Cobertura(localidades, unidades)
+    cobertura.cerrar(unidades['CLUES'].tolist())
+    assert (cobertura.cercana == -1).all()
+    assert np.isinf(cobertura.distancia).all()
+    vacia = Cobertura(localidades, unidades.iloc[:0])
+    assert (vacia.cercana == -1).all()
+
+
+def test_filas_de_un_nodo():
+    localidades, unidades = datos(3)
+    cobertura = Cobertura(localidades, unidades)
+    jerarquia = {('jurisdiccion', 1): {'hijos': [('municipio', 13001), ('municipio', 13002)]}}
+    municipio = localidades['CVE_LOCALIDAD'] // 10000
+    assert len(cobertura.filas_nodo(jerarquia, ('entidad', None))) == len(localidades)
+    assert (cobertura.filas_nodo(jerarquia, ('municipio', 13003)) == np.flatnonzero(municipio == 13003)).all()
+    assert (cobertura.filas_nodo(jerarquia, ('jurisdiccion', 1)) == np.flatnonzero(municipio != 13003)).all()
+    clave = localidades['CVE_LOCALIDAD'][5]
+    assert cobertura.filas_nodo(jerarquia, ('localidad', clave)).tolist() == [5]
+
+
+def test_unidades_sin_coordenadas_se_descartan():
+    df = pd.DataFrame({
+        'CLUES': ['A', 'A', 'B', 'C', 'D'],
+        'NOMBRE DE LA UNIDAD': ['a', 'a', 'b', 'c', 'd'],
+        'LATITUD': ['20.1', '20.1', '0', None, 'x'],
+        'LONGITUD': ['-98.7', '-98.7', '0', '-98.1', '-98.2'],
+    })
+    unidades = unidades_cobertura(df)
+    assert unidades['CLUES'].tolist() == ['A']
+    assert unidades['LATITUD'].tolist() == [pytest.approx(20.1)]
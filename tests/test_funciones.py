@@ -0,0 +1,77 @@
+import os
+import funciones
+
+
+def fuentes_temporales(monkeypatch, tmp_path):
+    unidades, poblacion = tmp_path / "unidades.parquet", tmp_path / "poblacion.xlsx"
+    unidades.write_bytes(b"1")
+    poblacion.write_bytes(b"1")
+    monkeypatch.setattr(funciones, 'fuentes_unidades', lambda periodo=None, entidad=None: [str(unidades)])
+    monkeypatch.setattr(funciones, 'fuentes_poblacion', lambda entidad=None: [str(poblacion)])
+    monkeypatch.setattr(funciones, 'ARCHIVO_LOCALIDADES', str(tmp_path / "localidades.csv"))
+    monkeypatch.setattr(funciones, '_indices', funciones.OrderedDict())
+    monkeypatch.setattr(funciones, '_invalidaciones', {})
+    return unidades
+
+
+def test_version_no_cambia_al_salir_de_memoria(monkeypatch, tmp_path):
+    fuentes_temporales(monkeypatch, tmp_path)
+    version = funciones.version_indice(13)
+    funciones._indices[13] = {'firma': funciones.firma_indice(13)}
+    assert funciones.version_indice(13) == version
+    funciones._indices.clear()
+    assert funciones.version_indice(13) == version
+
+
+def test_version_cambia_con_las_fuentes(monkeypatch, tmp_path):
+    unidades = fuentes_temporales(monkeypatch, tmp_path)
+    version = funciones.version_indice(13)
+    unidades.write_bytes(b"12")
+    os.utime(unidades, ns=(1, 1))
+    assert funciones.version_indice(13) != version
+
+
+def test_version_cambia_al_invalidar(monkeypatch, tmp_path):
+    fuentes_temporales(monkeypatch, tmp_path)
+    version, otra = funciones.version_indice(13), funciones.version_indice(9)
+    funciones.invalidar_indice(13)
+    assert funciones.version_indice(13) != version
+    assert funciones.version_indice(9) == otra
+    funciones.invalidar_indice()
+    assert funciones.version_indice(9) != otra
+
+
+def jerarquia_repartida():
+    # El municipio 13001 tiene unidades en las jurisdicciones 1 (dos) y 2 (una)
+    raiz = funciones.RAIZ
+    j1, j2 = ('jurisdiccion', 1), ('jurisdiccion', 2)
+    m1, m2 = ('municipio', 13001), ('municipio', 13002)
+    l1 = ('localidad', 130010001)
+    return {
+        raiz: {'nombre': None, 'padre': None, 'padres': [], 'hijos': [j1, j2]},
+        j1: {'nombre': 'J1', 'padre': raiz, 'padres': [raiz], 'hijos': [m1]},
+        j2: {'nombre': 'J2', 'padre': raiz, 'padres': [raiz], 'hijos': [m2, m1]},
+        m1: {'nombre': 'Acatlán', 'padre': j1, 'padres': [j1, j2], 'hijos': [l1]},
+        m2: {'nombre': 'Zempoala', 'padre': j2, 'padres': [j2], 'hijos': []},
+        l1: {'nombre': 'Acatlán', 'padre': m1, 'padres': [m1], 'hijos': []},
+    }
+
+
+def test_padres_por_numero_de_unidades():
+    municipios = funciones.pd.Series([13001, 13001, 13001, 13002])
+    jurisdicciones = funciones.pd.Series([2, 1, 1, 2])
+    padres = funciones.padres_nodos(municipios, jurisdicciones)
+    assert padres[13001] == [1, 2]
+    assert padres[13002] == [2]
+
+
+def test_municipio_repartido_en_varias_jurisdicciones(monkeypatch):
+    jerarquia = jerarquia_repartida()
+    monkeypatch.setattr(funciones, 'obtener_jerarquia', lambda entidad=None: jerarquia)
+    assert funciones.descendientes(jerarquia, funciones.RAIZ, 'municipio') == [('municipio', 13001), ('municipio', 13002)]
+    assert [opcion['value'] for opcion in funciones.opciones_nivel(13, 'municipio', ('jurisdiccion', 2))] == [13001, 13002]
+    # Se puede seleccionar desde cualquiera de sus jurisdicciones, con sus localidades
+    assert funciones.seleccion_nodo(13, 2, 13001, 130010001) == (13, ('localidad', 130010001))
+    assert funciones.seleccion_nodo(13, 1, 13001) == (13, ('municipio', 13001))
+    # Un municipio que no cuelga de la jurisdicción no se toma
+    assert funciones.seleccion_nodo(13, 1, 13002) == (13, ('jurisdiccion', 1))
@@ -0,0 +1,65 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from horarios import DIAS, INTERVALOS_DIA, MINUTOS_INTERVALO, HorariosSemana, mascaras_horarios
+
+LUNES = datetime(2024, 1, 1)
+
+
+def semana(inicio, fin, dias=None):
+    # Máscaras desempaquetadas (fila, día, intervalo)
+    mascaras = mascaras_horarios(inicio, fin, dias)
+    return np.unpackbits(mascaras, axis=1).reshape(len(mascaras), len(DIAS), INTERVALOS_DIA).astype(bool)
+
+
+def intervalo(horas, minutos=0):
+    return (horas * 60 + minutos) // MINUTOS_INTERVALO
+
+
+def test_horario_del_mismo_dia():
+    abierto = semana(['08:00'], ['14:30'])[0]
+    assert abierto[:, intervalo(8):intervalo(14, 30)].all()
+    assert not abierto[:, :intervalo(8)].any()
+    assert not abierto[:, intervalo(14, 30):].any()
+
+
+def test_fin_a_medianoche():
+    for fin in ['23:59', '00:00']:
+        abierto = semana(['20:00'], [fin])[0]
+        assert abierto[:, intervalo(20):].all()
+        assert not abierto[:, :intervalo(20)].any()
+
+
+def test_inicio_igual_a_fin_es_todo_el_dia():
+    for hora in ['08:00', '10:00', '21:00', '00:00']:
+        assert semana([hora], [hora])[0].all()
+
+
+def test_horario_que_cruza_la_medianoche():
+    dias = np.zeros((1, len(DIAS)), dtype=bool)
+    dias[0, 0] = True  # Solo el lunes
+    abierto = semana(['22:00'], ['06:00'], dias)[0]
+    assert abierto[0, intervalo(22):].all()
+    assert not abierto[0, :intervalo(22)].any()
+    # Sigue el martes de madrugada, no el domingo
+    assert abierto[1, :intervalo(6)].all()
+    assert not abierto[1, intervalo(6):].any()
+    assert not abierto[6].any()
+
+
+def test_horario_invalido_nunca_abre():
+    assert not semana(['sin horario'], ['10:00'])[0].any()
+
+
+def test_turnos_de_una_clues_se_unen():
+    df = pd.DataFrame({
+        'CLUES': ['A', 'A', 'B'],
+        'HORA INICIO': ['08:00', '16:00', '09:00'],
+        'HORA FIN': ['12:00', '20:00', '09:00'],
+    })
+    horarios = HorariosSemana(df, {'municipio': [1, 1, 2]})
+    assert set(horarios.consultar(momento=LUNES.replace(hour=17))) == {'A', 'B'}
+    assert list(horarios.consultar(momento=LUNES.replace(hour=14))) == ['B']
+    # 09:00-09:00 abre las 24 horas: también a las 3 de la mañana del martes
+    assert list(horarios.consultar(('municipio', 2), momento=datetime(2024, 1, 2, 3))) == ['B']
+    assert list(horarios.consultar(('municipio', 1), dias=(5, 6))) == ['A', 'A']
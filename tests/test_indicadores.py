@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+import indicadores
+from indicadores import COLOR_SIN_DATO, COLORES_INDICADOR, INDICADORES, escala_indicador, tabla_indicadores
+from poblacion import QUINQUENIOS, SEXOS
+
+
+def poblar(valores, sexo, quinquenio, n):
+    valores[SEXOS.index(sexo), QUINQUENIOS.index(quinquenio)] = n
+
+
+@pytest.fixture
+def tabla():
+    valores = np.zeros((3, len(SEXOS), len(QUINQUENIOS)), dtype=np.int32)
+    # 13001: 100 habitantes, 2 unidades; 13002: 50 mujeres sin unidades; 13003: sin población, 1 unidad
+    poblar(valores[0], 'h', '0-4 años', 10)
+    poblar(valores[0], 'h', '60-64 años', 20)
+    poblar(valores[0], 'm', '0-4 años', 30)
+    poblar(valores[0], 'm', '85+ años', 40)
+    poblar(valores[1], 'm', '20-24 años', 50)
+    cubo = SimpleNamespace(valores={'municipio': valores}, claves={'municipio': np.array([13001, 13002, 13003])})
+    unidades = pd.DataFrame({'CVE_MUNICIPIO': [13001, 13001, 13001, 13003], 'CLUES': ['A', 'A', 'B', 'C']})
+    cobertura = SimpleNamespace(
+        localidades=pd.DataFrame({'CVE_LOCALIDAD': [130010001, 130010002, 130020001]}),
+        poblacion=np.array([60, 40, 50]), distancia=np.array([2.0, 10.0, 20.0]), radio=5.0)
+    return tabla_indicadores(unidades, cubo, cobertura)
+
+
+def test_indicadores_por_municipio(tabla):
+    assert list(tabla.columns) == list(INDICADORES)
+    assert tabla.index.tolist() == [13001, 13002, 13003]
+    fila = tabla.loc[13001]
+    assert fila['unidades_10k'] == pytest.approx(200)
+    assert fila['habitantes_unidad'] == pytest.approx(50)
+    assert fila['mayores_60'] == pytest.approx(60)
+    assert fila['menores_5'] == pytest.approx(40)
+    assert fila['mujeres'] == pytest.approx(70)
+    assert fila['lejos_unidad'] == pytest.approx(40)
+    assert tabla.loc[13002, 'lejos_unidad'] == pytest.approx(100)
+
+
+def test_divisiones_entre_cero_quedan_sin_dato(tabla):
+    assert np.isfinite(tabla.to_numpy()[~np.isnan(tabla.to_numpy())]).all()
+    # Sin unidades: 0 por 10 mil pero sin habitantes por unidad
+    assert tabla.loc[13002, 'unidades_10k'] == 0
+    assert np.isnan(tabla.loc[13002, 'habitantes_unidad'])
+    # Sin población ni localidades
+    assert tabla.loc[13003, 'habitantes_unidad'] == 0
+    assert tabla.loc[13003, ['unidades_10k', 'mayores_60', 'menores_5', 'mujeres', 'lejos_unidad']].isna().all()
+
+
+def test_escala_indicador(monkeypatch):
+    serie = [np.nan] + list(np.arange(1, 21) / 3)
+    monkeypatch.setattr(indicadores, 'indicadores_entidad',
+                        lambda entidad: pd.DataFrame({'mujeres': serie}, index=range(13000, 13021)))
+    escala = escala_indicador('13', 'mujeres')
+    assert escala['nombre'] == INDICADORES['mujeres'][0]
+    assert escala['sin_dato'] == COLOR_SIN_DATO
+    assert '13000' not in escala['valores'] and len(escala['valores']) == 20
+    assert escala['valores']['13001'] == 0.3
+    assert escala['limites'] == sorted(escala['limites'])
+    assert len(escala['limites']) == len(COLORES_INDICADOR) - 1
+    assert escala['colores'] == COLORES_INDICADOR
+
+
+def test_escala_con_pocos_valores(monkeypatch):
+    # Cuantiles repetidos se juntan y sobran colores; sin datos no hay clases
+    monkeypatch.setattr(indicadores, 'indicadores_entidad',
+                        lambda entidad: pd.DataFrame({'mujeres': [50.0, 50.0, 50.0], 'menores_5': [np.nan] * 3}))
+    escala = escala_indicador('13', 'mujeres')
+    assert escala['limites'] == [50.0]
+    assert escala['colores'] == COLORES_INDICADOR[:2]
+    vacia = escala_indicador('13', 'menores_5')
+    assert vacia['valores'] == {} and vacia['limites'] == [] and vacia['colores'] == COLORES_INDICADOR[:1]
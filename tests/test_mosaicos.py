@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+import shapely
+from flask import Flask
+import mosaicos
+from mosaicos import EXTENSION, MunicipiosMercator, codificar_capa, geometria_poligonos, tamano_mosaico
+
+
+def leer_varint(datos, pos):
+    valor, desplazamiento = 0, 0
+    while True:
+        byte = datos[pos]
+        pos += 1
+        valor |= (byte & 0x7f) << desplazamiento
+        desplazamiento += 7
+        if not byte & 0x80:
+            return valor, pos
+
+
+def campos(datos):
+    # (número, valor) de cada campo de un mensaje protobuf; los de longitud como bytes
+    pos, resultado = 0, []
+    while pos < len(datos):
+        llave, pos = leer_varint(datos, pos)
+        if llave & 7 == 0:
+            valor, pos = leer_varint(datos, pos)
+        else:
+            largo, pos = leer_varint(datos, pos)
+            valor, pos = datos[pos:pos + largo], pos + largo
+        resultado.append((llave >> 3, valor))
+    return resultado
+
+
+def empaquetados(datos):
+    pos, valores = 0, []
+    while pos < len(datos):
+        valor, pos = leer_varint(datos, pos)
+        valores.append(valor)
+    return valores
+
+
+def decodificar(mosaico):
+    # {clave: (nombre, anillos con coordenadas absolutas)} de la única capa del mosaico
+    (numero, capa), = campos(mosaico)
+    assert numero == 3
+    capa = campos(capa)
+    assert (15, 2) in capa and (1, b'municipios') in capa and (5, EXTENSION) in capa
+    valores = []
+    for numero, valor in capa:
+        if numero == 4:
+            (tipo, dato), = campos(valor)
+            valores.append(dato.decode('utf-8') if tipo == 1 else dato)
+    features = {}
+    for numero, valor in capa:
+        if numero != 2:
+            continue
+        feature = dict(campos(valor))
+        etiquetas = empaquetados(feature[2])
+        propiedades = {['clave', 'nombre'][etiquetas[i]]: valores[etiquetas[i + 1]] for i in range(0, len(etiquetas), 2)}
+        assert feature[1] == propiedades['clave'] and feature[3] == 3
+        comandos, anillos, cursor, i = empaquetados(feature[4]), [], np.zeros(2, dtype=np.int64), 0
+        while i < len(comandos):
+            comando, cuenta = comandos[i] & 7, comandos[i] >> 3
+            i += 1
+            if comando == 7:
+                continue
+            if comando == 1:
+                anillos.append([])
+            for _ in range(cuenta):
+                delta = np.array([(v >> 1) ^ -(v & 1) for v in comandos[i:i + 2]])
+                cursor = cursor + delta
+                anillos[-1].append(cursor.tolist())
+                i += 2
+        features[propiedades['clave']] = (propiedades['nombre'], anillos)
+    return features
+
+
+def area(anillo):
+    puntos = np.array(anillo)
+    return np.sum(puntos[:, 0] * np.roll(puntos[:, 1], -1) - np.roll(puntos[:, 0], -1) * puntos[:, 1]) / 2
+
+
+def test_geometria_orienta_anillos_y_descarta_los_vacios():
+    exterior = [(0, 0), (0, 100), (100, 100), (100, 0)]  # Contrario a lo que pide MVT
+    hueco = [(10, 10), (20, 10), (20, 20), (10, 20)]
+    degenerado = shapely.Polygon([(200, 200), (200, 200.4), (200.4, 200.4)])
+    geometria = shapely.MultiPolygon([shapely.Polygon(exterior, [hueco]), degenerado])
+    geometria = shapely.transform(geometria, np.rint)
+    comandos = geometria_poligonos(geometria)
+    capa = codificar_capa('municipios', [(13001, 'ACATLAN', comandos)])
+    (nombre, anillos), = decodificar(capa).values()
+    assert nombre == 'ACATLAN'
+    assert len(anillos) == 2
+    # En coordenadas del mosaico (y hacia abajo) el exterior tiene área positiva y el hueco negativa
+    assert area(anillos[0]) == 10000 and area(anillos[1]) == -100
+    assert sorted(map(tuple, anillos[0])) == sorted(exterior)
+
+
+class TopologiaFalsa:
+    # Dos cuadrados en Web Mercator: uno cerca del origen y otro lejos de él
+    claves = np.array([13001, 13002])
+    nombres = np.array(['ACATLAN', 'ACTOPAN'], dtype=object)
+
+    def poligonos(self, nivel=None):
+        return np.array([shapely.MultiPolygon([shapely.box(1000, 1000, 500000, 500000)]),
+                         shapely.MultiPolygon([shapely.box(-9e6, 2e6, -8.9e6, 2.1e6)])], dtype=object)
+
+
+def test_mosaico_recorta_a_los_municipios_que_lo_tocan():
+    municipios = MunicipiosMercator(TopologiaFalsa())
+    # Zoom 1, mosaico noreste (x=1, y=0): solo el cuadrado del origen
+    features = decodificar(municipios.mosaico(1, 1, 0))
+    assert list(features) == [13001]
+    nombre, (anillo,) = features[13001]
+    escala = EXTENSION / tamano_mosaico(1)
+    esperado = area([(1000, -1000), (1000, -500000), (500000, -500000), (500000, -1000)]) * escala ** 2
+    assert area(anillo) == pytest.approx(esperado, rel=0.01)
+    # Un mosaico sobre el mar está vacío
+    assert municipios.mosaico(3, 7, 7) == b''
+
+
+def test_rutas_de_mosaicos(monkeypatch, tmp_path):
+    monkeypatch.setattr(mosaicos, 'DIRECTORIO_MOSAICOS', str(tmp_path))
+    monkeypatch.setattr(mosaicos, 'municipios_mercator', lambda: MunicipiosMercator(TopologiaFalsa()))
+    llamadas = []
+    original = MunicipiosMercator.mosaico
+    monkeypatch.setattr(MunicipiosMercator, 'mosaico', lambda self, z, x, y: llamadas.append((z, x, y)) or original(self, z, x, y))
+    servidor = Flask(__name__)
+    mosaicos.registrar_mosaicos(servidor)
+    cliente = servidor.test_client()
+    for _ in range(2):
+        respuesta = cliente.get('/tiles/1/1/0.mvt')
+        assert respuesta.status_code == 200 and respuesta.mimetype == mosaicos.TIPO_MVT
+        assert list(decodificar(respuesta.data)) == [13001]
+        # Los vacíos se guardan como archivos de cero bytes y se responden sin contenido
+        assert cliente.get('/tiles/3/7/7.mvt').status_code == 204
+    assert llamadas == [(1, 1, 0), (3, 7, 7)]
+    assert sorted(ruta.stat().st_size == 0 for ruta in tmp_path.glob('mosaico_*.mvt')) == [False, True]
+    assert cliente.get('/tiles/1/2/0.mvt').status_code == 404
+    assert cliente.get(f'/tiles/{mosaicos.ZOOM_MAXIMO + 1}/0/0.mvt').status_code == 404
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tabla import mascara_filtro, pagina, separar_filtro
+
+
+@pytest.mark.parametrize('parte, esperado', [
+    ('{LOCALIDAD} contains "valle de"', ('LOCALIDAD', 'contains', 'valle de')),
+    ('{LOCALIDAD} contains Calle Grande', ('LOCALIDAD', 'contains', 'Calle Grande')),
+    ('{NOMBRE DE LA UNIDAD} eq "CS San Juan"', ('NOMBRE DE LA UNIDAD', 'eq', 'CS San Juan')),
+    ('{CAMAS} ge 5', ('CAMAS', 'ge', 5.0)),
+    ('{CAMAS} >= 5', ('CAMAS', 'ge', 5.0)),
+    ('{CAMAS} < 2.5', ('CAMAS', 'lt', 2.5)),
+    ('{CAMAS} != 0', ('CAMAS', 'ne', 0.0)),
+    ("{FECHA} datestartswith '2024'", ('FECHA', 'datestartswith', '2024')),
+    ('{NOMBRE} contains "dice \\"hola\\""', ('NOMBRE', 'contains', 'dice "hola"')),
+    ('sin columna', (None, None, None)),
+])
+def test_separar_filtro(parte, esperado):
+    assert separar_filtro(parte) == esperado
+
+
+def test_el_valor_no_cambia_el_operador():
+    # "valle de" contiene "le " y "de"; antes se tomaba como comparación le
+    df = pd.DataFrame({'LOCALIDAD': ['Valle de Juarez', 'Pachuca', 'valle de x']})
+    assert mascara_filtro(df, '{LOCALIDAD} contains "valle de"').tolist() == [True, False, True]
+
+
+def test_filtros_combinados_y_columnas_desconocidas():
+    df = pd.DataFrame({'LOCALIDAD': ['Tula', 'Tulancingo', 'Apan'], 'CAMAS': [3, 10, '12']})
+    assert mascara_filtro(df, '{CAMAS} gt 4 && {LOCALIDAD} contains tula').tolist() == [False, True, False]
+    assert mascara_filtro(df, '{OTRA} eq 1').tolist() == [True, True, True]
+    assert mascara_filtro(df, None).tolist() == [True, True, True]
+
+
+def test_pagina_filtra_ordena_y_recorta():
+    df = pd.DataFrame({'CLUES': [f'C{i}' for i in range(25)], 'CAMAS': np.arange(25) % 7})
+    entrada = {'tabla': df}
+    orden = [{'column_id': 'CAMAS', 'direction': 'desc'}]
+    filas, paginas = pagina(entrada, 0, 10, orden, '{CAMAS} ge 3')
+    assert paginas == 2
+    assert [fila['CAMAS'] for fila in filas] == [6, 6, 6, 5, 5, 5, 4, 4, 4, 3]
+    # Una página fuera de rango devuelve la última
+    ultima, _ = pagina(entrada, 5, 10, orden, '{CAMAS} ge 3')
+    assert [fila['CAMAS'] for fila in ultima] == [3, 3, 3]
+    assert pagina(None, 0, 10, [], '') == ([], 1)
@@ -0,0 +1,112 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+import topologia
+from topologia import NIVELES, TopologiaMunicipios, geograficas, mercator, nivel_zoom
+
+# Frontera en zigzag entre los municipios 13001 y 13002, para que simplificar la cambie
+FRONTERA = [(-98.5 + 0.002 * (i % 2), 20 + i / 50) for i in range(51)]
+
+
+@pytest.fixture(scope='module')
+def municipios(tmp_path_factory):
+    izquierdo = shapely.Polygon([(-99, 21), (-99, 20)] + FRONTERA[:-1] + [FRONTERA[-1]])
+    derecho = shapely.Polygon([(-98, 20), (-98, 21)] + FRONTERA[::-1])
+    con_hueco = shapely.Polygon([(-97, 20), (-96, 20), (-96, 21), (-97, 21)],
+                                [[(-96.7, 20.3), (-96.3, 20.3), (-96.3, 20.7), (-96.7, 20.7)]])
+    tabla = gpd.GeoDataFrame({'CVE_ENT': ['13', '13', '13'], 'CVE_MUN': ['001', '002', '003'],
+                              'NOM_MUN': ['Acatlán', 'Actopan', 'Apan']},
+                             geometry=[izquierdo, derecho, con_hueco], crs='EPSG:4326')
+    ruta = tmp_path_factory.mktemp('shape') / 'municipios.shp'
+    tabla.to_file(ruta, encoding='UTF-8')
+    original = topologia.ARCHIVO_MUNICIPIOS
+    topologia.ARCHIVO_MUNICIPIOS = str(ruta)
+    try:
+        arcos, anillos = topologia._calcular_topologia.__wrapped__(None)
+    finally:
+        topologia.ARCHIVO_MUNICIPIOS = original
+    return tabla, TopologiaMunicipios(arcos, anillos)
+
+
+def test_nivel_zoom():
+    assert nivel_zoom(None) == NIVELES[0]
+    assert nivel_zoom(7) == 8
+    assert nivel_zoom(8) == 8
+    assert nivel_zoom(30) == NIVELES[-1]
+
+
+def test_mercator_ida_y_vuelta():
+    puntos = np.array([[-99.1, 19.4], [-86.8, 21.2], [-117.0, 32.5]])
+    assert np.allclose(geograficas(mercator(puntos)), puntos)
+
+
+def test_la_frontera_compartida_se_guarda_una_vez(municipios):
+    _, topo = municipios
+    arcos = [set(np.where(topo.referencias[i] < 0, ~topo.referencias[i], topo.referencias[i]).tolist())
+             for i in range(len(topo.referencias))]
+    izquierdo, derecho = (arcos[i] for i in np.flatnonzero(np.isin(topo.claves[topo.municipio], [13001, 13002])))
+    compartidos = izquierdo & derecho
+    assert len(compartidos) == 1
+    arco = compartidos.pop()
+    assert len(topo.coordenadas_arcos()[arco]) == len(FRONTERA)
+
+
+def test_poligonos_sin_simplificar_son_los_originales(municipios):
+    tabla, topo = municipios
+    for clave, original in zip([13001, 13002, 13003], tabla.geometry):
+        poligono = shapely.transform(topo.poligonos()[topo.posiciones[clave]], geograficas)
+        assert poligono.symmetric_difference(original).area < 1e-12
+    # El hueco se conserva
+    assert len(shapely.get_parts(topo.poligonos()[topo.posiciones[13003]])[0].interiors) == 1
+
+
+@pytest.mark.parametrize('nivel', [4, 8, 12])
+def test_simplificar_no_separa_vecinos(municipios, nivel):
+    _, topo = municipios
+    izquierdo, derecho = (topo.poligonos(nivel)[topo.posiciones[clave]] for clave in (13001, 13002))
+    assert izquierdo.intersection(derecho).area == pytest.approx(0, abs=1)
+    # La unión no tiene huecos entre los dos: su área es la suma de las áreas
+    assert shapely.union(izquierdo, derecho).area == pytest.approx(izquierdo.area + derecho.area, rel=1e-9)
+
+
+def test_simplificar_quita_puntos(municipios):
+    _, topo = municipios
+    assert sum(map(len, topo.coordenadas_arcos(4))) < sum(map(len, topo.coordenadas_arcos()))
+
+
+def decodificar(topojson):
+    # Igual que tablero.geojsonTopologia en assets/tablero.js
+    (kx, ky), (tx, ty) = topojson['transform']['scale'], topojson['transform']['translate']
+    arcos = [np.cumsum(np.array(arco), axis=0) * [kx, ky] + [tx, ty] for arco in topojson['arcs']]
+    geometrias = {}
+    for geometria in topojson['objects']['municipios']['geometries']:
+        poligonos = []
+        for partes in geometria['arcs']:
+            anillos = []
+            for referencias in partes:
+                tramos = [arcos[r] if r >= 0 else arcos[~r][::-1] for r in referencias]
+                anillos.append(np.concatenate([tramos[0]] + [tramo[1:] for tramo in tramos[1:]]))
+            poligonos.append(shapely.Polygon(anillos[0], anillos[1:]))
+        geometrias[geometria['id']] = shapely.MultiPolygon(poligonos)
+    return geometrias
+
+
+def test_topojson_y_geojson(municipios):
+    tabla, topo = municipios
+    nivel = 12
+    topojson = topo.topojson((13001, 13002, 99999), nivel)
+    geometrias = decodificar(topojson)
+    assert sorted(geometrias) == [13001, 13002]
+    # La frontera compartida va una vez: un municipio la usa al derecho y el otro al revés
+    referencias = [r for g in topojson['objects']['municipios']['geometries'] for parte in g['arcs'] for anillo in parte for r in anillo]
+    usados = [r if r >= 0 else ~r for r in referencias]
+    assert len(usados) - len(set(usados)) == 1
+    geojson = topo.geojson([13002, 13001], nivel)
+    assert [feature['id'] for feature in geojson['features']] == [13002, 13001]
+    assert geojson['features'][0]['properties'] == {'CVE_MUNICIPIO': 13002, 'NOM_MUN': 'ACTOPAN'}
+    for feature in geojson['features']:
+        desde_geojson = shapely.geometry.shape(feature['geometry'])
+        original = tabla.geometry[[13001, 13002, 13003].index(feature['id'])]
+        assert desde_geojson.symmetric_difference(original).area < 1e-4 * original.area
+        assert geometrias[feature['id']].symmetric_difference(original).area < 1e-4 * original.area
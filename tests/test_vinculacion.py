@@ -0,0 +1,56 @@
+import pandas as pd
+from vinculacion import limpiar_nombre, resumen_vinculacion, vincular
+
+
+def catalogo(filas):
+    return pd.DataFrame(filas, columns=['CLUES', 'NOMBRE DE LA UNIDAD', 'CLAVE DE LA ENTIDAD',
+                                        'CLAVE DEL MUNICIPIO', 'CLAVE DE LA LOCALIDAD'])
+
+
+def test_limpiar_nombre():
+    assert limpiar_nombre('  Centro de Salud  "San José", Ixmiquilpan. ') == 'CENTRO DE SALUD SAN JOSE IXMIQUILPAN'
+
+
+def test_nombre_igual_con_acentos_y_puntuacion():
+    izquierda = catalogo([['A1', 'Centro de Salud "San José".', 13, 1, 1]])
+    derecha = catalogo([['B1', 'CENTRO DE SALUD SAN JOSE', 13, 1, 1], ['B2', 'CENTRO DE SALUD SANTA ANA', 13, 1, 1]])
+    resultado = vincular(izquierda, derecha)
+    assert resultado.loc[0, 'CLUES_SSH'] == 'B1'
+    assert resultado.loc[0, 'CONFIANZA_SSH'] == 1
+    assert not resultado.loc[0, 'AMBIGUO_SSH']
+
+
+def test_se_busca_en_el_municipio_si_la_localidad_no_coincide():
+    izquierda = catalogo([['A1', 'CENTRO DE SALUD EL ARENAL', 13, 1, 5]])
+    derecha = catalogo([['B1', 'CENTRO DE SALUD EL ARENAL', 13, 1, 7]])
+    assert vincular(izquierda, derecha).loc[0, 'CLUES_SSH'] == 'B1'
+
+
+def test_no_se_vincula_fuera_del_municipio_ni_bajo_el_umbral():
+    izquierda = catalogo([['A1', 'CENTRO DE SALUD EL ARENAL', 13, 1, 1], ['A2', 'UNEME CAPASITS', 13, 1, 1]])
+    derecha = catalogo([['B1', 'CENTRO DE SALUD EL ARENAL', 13, 2, 1], ['B2', 'HOSPITAL GENERAL', 13, 1, 1]])
+    resultado = vincular(izquierda, derecha)
+    assert resultado['CLUES_SSH'].isna().all()
+    assert resultado['CONFIANZA_SSH'].isna().all()
+
+
+def test_candidatos_casi_iguales_son_ambiguos():
+    izquierda = catalogo([['A1', 'CENTRO DE SALUD SAN JUAN', 13, 1, 1]])
+    derecha = catalogo([['B1', 'CENTRO DE SALUD SAN JUAN 1', 13, 1, 1], ['B2', 'CENTRO DE SALUD SAN JUAN 2', 13, 1, 1]])
+    resultado = vincular(izquierda, derecha)
+    assert resultado.loc[0, 'CLUES_SSH'] == 'B1'
+    assert resultado.loc[0, 'AMBIGUO_SSH']
+
+
+def test_la_misma_pareja_para_varias_filas_es_ambigua():
+    izquierda = catalogo([['A1', 'CENTRO DE SALUD TULA', 13, 1, 1], ['A2', 'CENTRO DE SALUD TULA', 13, 1, 1],
+                          ['A3', 'CASA DE SALUD ZIMAPAN', 13, 1, 1]])
+    derecha = catalogo([['B1', 'CENTRO DE SALUD TULA', 13, 1, 1], ['B2', 'CASA DE SALUD ZIMAPAN', 13, 1, 1]])
+    resultado = vincular(izquierda, derecha)
+    # Nunca se agregan filas
+    assert len(resultado) == len(izquierda)
+    assert resultado['CLUES_SSH'].tolist() == ['B1', 'B1', 'B2']
+    assert resultado['AMBIGUO_SSH'].tolist() == [True, True, False]
+    assert resumen_vinculacion(izquierda.join(resultado)) == {
+        'unidades': 3, 'exactas': 3, 'aproximadas': 0, 'ambiguas': 2, 'sin_pareja': 0,
+    }
@@ -0,0 +1,235 @@
+# topologia.py
+# Topología de los municipios de todo el país: los contornos se parten en arcos en los puntos donde cambian
+# los vecinos y cada frontera compartida se guarda una sola vez. Los arcos se simplifican por nivel de zoom
+# y, como dos municipios vecinos usan el mismo arco, al simplificar no quedan huecos ni traslapes entre
+# ellos. De aquí salen el TopoJSON cuantizado, el GeoJSON redondeado y los polígonos de los mosaicos
+from functools import lru_cache
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from funciones import cache_dataframe, clave_municipio, firma_archivos, normalizar_nombres
+from geometrias import ARCHIVO_MUNICIPIOS, fuentes_municipios
+from metricas import instrumentar
+
+# Zooms para los que se simplifican los arcos; cada vista usa el primero con al menos su detalle
+NIVELES = (4, 6, 8, 10, 12, 14, 16)
+TOLERANCIA_PIXEL = 0.5  # Desviación máxima al simplificar, en píxeles del nivel
+POSICIONES_PIXEL = 4  # Posiciones por píxel del nivel al cuantizar o redondear coordenadas
+RADIO_TIERRA = 6378137.0  # Web Mercator (EPSG:3857)
+
+
+def nivel_zoom(zoom):
+    zoom = 0 if zoom is None else zoom
+    return next((nivel for nivel in NIVELES if nivel >= zoom), NIVELES[-1])
+
+
+def grados_pixel(nivel):
+    # Grados de longitud por píxel (mosaicos de 256) en el zoom del nivel
+    return 360 / (256 * 2 ** nivel)
+
+
+def mercator(lonlat):
+    return np.column_stack([np.radians(lonlat[:, 0]) * RADIO_TIERRA,
+                            np.log(np.tan(np.pi / 4 + np.radians(lonlat[:, 1]) / 2)) * RADIO_TIERRA])
+
+
+def geograficas(xy):
+    return np.column_stack([np.degrees(xy[:, 0] / RADIO_TIERRA),
+                            np.degrees(2 * np.arctan(np.exp(xy[:, 1] / RADIO_TIERRA)) - np.pi / 2)])
+
+
+@lru_cache(maxsize=1)
+def _calcular_topologia(version):
+    # Tabla de arcos (WKB en WGS84) y tabla de anillos (municipio, parte y arcos que lo forman; un arco
+    # negativo ~i es el arco i recorrido al revés, como en TopoJSON)
+    df_mpios_shape = gpd.read_file(ARCHIVO_MUNICIPIOS, encoding="UTF-8").to_crs(epsg=4326)
+    claves = clave_municipio(df_mpios_shape["CVE_ENT"].astype(int), df_mpios_shape["CVE_MUN"].astype(int)).to_numpy()
+    nombres = normalizar_nombres(df_mpios_shape["NOM_MUN"]).to_numpy()
+    partes, municipio_parte = shapely.get_parts(df_mpios_shape.geometry.values, return_index=True)
+    anillos, parte_anillo = shapely.get_rings(partes, return_index=True)
+    coordenadas, anillo_punto = shapely.get_coordinates(anillos, return_index=True)
+    # Sin el punto que cierra cada anillo ni puntos repetidos seguidos
+    cierre = np.r_[anillo_punto[1:] != anillo_punto[:-1], True]
+    repetido = np.r_[False, (coordenadas[1:] == coordenadas[:-1]).all(axis=1) & (anillo_punto[1:] == anillo_punto[:-1])]
+    coordenadas, anillo_punto = coordenadas[~cierre & ~repetido], anillo_punto[~cierre & ~repetido]
+    unicos, puntos = np.unique(coordenadas, axis=0, return_inverse=True)
+    puntos = puntos.reshape(-1)
+
+    # Un punto es unión si sus vecinos (anterior y siguiente) no son los mismos en todos los anillos
+    # en que aparece: ahí empieza o termina una frontera compartida
+    conteos = np.bincount(anillo_punto, minlength=len(anillos))
+    inicios = np.cumsum(conteos) - conteos
+    inicio, largo = inicios[anillo_punto], conteos[anillo_punto]
+    posicion = np.arange(len(puntos)) - inicio
+    anterior = puntos[inicio + (posicion - 1) % largo]
+    siguiente = puntos[inicio + (posicion + 1) % largo]
+    vecinos = np.minimum(anterior, siguiente) * len(unicos) + np.maximum(anterior, siguiente)
+    combinaciones = np.unique(np.column_stack([puntos, vecinos]), axis=0)
+    union = np.bincount(combinaciones[:, 0], minlength=len(unicos)) > 1
+
+    arcos, indice_arcos, referencias = [], {}, []
+    for anillo in range(len(anillos)):
+        secuencia = puntos[inicios[anillo]:inicios[anillo] + conteos[anillo]]
+        cortes = np.flatnonzero(union[secuencia])
+        # Se empieza en la primera unión (o, en un anillo sin uniones, en su punto de menor índice, para
+        # que el mismo anillo visto desde el municipio vecino dé el mismo arco)
+        primero = cortes[0] if len(cortes) else int(np.argmin(secuencia))
+        secuencia = np.r_[secuencia[primero:], secuencia[:primero + 1]]
+        cortes = np.r_[cortes - primero, len(secuencia) - 1] if len(cortes) else np.array([0, len(secuencia) - 1])
+        cortes = np.unique(cortes % len(secuencia))
+        referencias_anillo = []
+        for desde, hasta in zip(cortes[:-1], cortes[1:]):
+            tramo = secuencia[desde:hasta + 1]
+            llave = tramo.tobytes()
+            if llave in indice_arcos:
+                referencias_anillo.append(indice_arcos[llave])
+            elif tramo[::-1].tobytes() in indice_arcos:
+                referencias_anillo.append(~indice_arcos[tramo[::-1].tobytes()])
+            else:
+                indice_arcos[llave] = len(arcos)
+                referencias_anillo.append(len(arcos))
+                arcos.append(tramo)
+        referencias.append(referencias_anillo)
+
+    lineas = shapely.linestrings(unicos[np.concatenate(arcos)], indices=np.repeat(np.arange(len(arcos)), [len(arco) for arco in arcos]))
+    tabla_arcos = pd.DataFrame({'wkb': shapely.to_wkb(lineas)})
+    municipio_anillo = municipio_parte[parte_anillo]
+    tabla_anillos = pd.DataFrame({
+        'CVE_MUNICIPIO': claves[municipio_anillo],
+        'NOM_MUN': nombres[municipio_anillo],
+        'PARTE': parte_anillo,
+        'ARCOS': referencias,
+    })
+    return tabla_arcos, tabla_anillos
+
+
+class TopologiaMunicipios:
+    # arcos en Web Mercator; cada anillo tiene su municipio, su parte (el primer anillo de cada parte es el
+    # exterior) y sus referencias a arcos. Los arcos simplificados y los polígonos de cada nivel se
+    # calculan la primera vez que se piden
+
+    def __init__(self, tabla_arcos, tabla_anillos):
+        self.arcos = shapely.transform(shapely.from_wkb(tabla_arcos['wkb'].to_numpy()), mercator)
+        self.referencias = [np.asarray(arcos, dtype=np.int64) for arcos in tabla_anillos['ARCOS']]
+        self.parte = tabla_anillos['PARTE'].to_numpy(np.int64)
+        self.municipio, claves = pd.factorize(tabla_anillos['CVE_MUNICIPIO'])
+        self.claves = np.asarray(claves, dtype=np.int64)
+        self.nombres = tabla_anillos.groupby(self.municipio)['NOM_MUN'].first().to_numpy(dtype=object)
+        self.posiciones = {int(clave): i for i, clave in enumerate(self.claves)}
+        self.exterior = np.r_[True, self.parte[1:] != self.parte[:-1]]
+        self._coordenadas = {}
+        self._validos = {}
+        self._poligonos = {}
+
+    def coordenadas_arcos(self, nivel=None):
+        # Coordenadas de cada arco simplificado a TOLERANCIA_PIXEL del nivel (Douglas-Peucker: los extremos
+        # de cada arco, que son las uniones, no se mueven); None es sin simplificar
+        if nivel not in self._coordenadas:
+            arcos = self.arcos
+            if nivel is not None:
+                arcos = shapely.simplify(arcos, TOLERANCIA_PIXEL * 2 * np.pi * RADIO_TIERRA / (256 * 2 ** nivel),
+                                         preserve_topology=False)
+            coordenadas, indices = shapely.get_coordinates(arcos, return_index=True)
+            self._coordenadas[nivel] = np.split(coordenadas, np.cumsum(np.bincount(indices, minlength=len(arcos)))[:-1])
+        return self._coordenadas[nivel]
+
+    def anillos_validos(self, nivel=None):
+        # Anillos que conservan al menos tres puntos distintos en el nivel; si el exterior se pierde (islas
+        # más chicas que un píxel) se pierde toda la parte
+        if nivel not in self._validos:
+            arcos = self.coordenadas_arcos(nivel)
+            largos = np.array([sum(len(arcos[~arco if arco < 0 else arco]) - 1 for arco in referencias)
+                               for referencias in self.referencias])
+            validos = largos >= 3
+            self._validos[nivel] = validos & validos[self.exterior][np.cumsum(self.exterior) - 1]
+        return self._validos[nivel]
+
+    def anillo(self, referencias, arcos):
+        tramos = [arcos[~arco][::-1] if arco < 0 else arcos[arco] for arco in referencias]
+        return np.concatenate([tramos[0]] + [tramo[1:] for tramo in tramos[1:]])
+
+    def poligonos(self, nivel=None):
+        # Multipolígono en Web Mercator de cada municipio (en el orden de claves)
+        if nivel not in self._poligonos:
+            arcos = self.coordenadas_arcos(nivel)
+            filas = np.flatnonzero(self.anillos_validos(nivel))
+            anillos = [self.anillo(self.referencias[fila], arcos) for fila in filas]
+            anillos = shapely.linearrings(np.concatenate(anillos), indices=np.repeat(np.arange(len(anillos)), [len(anillo) for anillo in anillos]))
+            _, parte = np.unique(self.parte[filas], return_inverse=True)
+            poligonos = shapely.polygons(anillos, indices=parte)
+            _, primero = np.unique(parte, return_index=True)
+            self._poligonos[nivel] = shapely.multipolygons(poligonos, indices=self.municipio[filas][primero],
+                                                           out=np.full(len(self.claves), shapely.MultiPolygon(), dtype=object))
+        return self._poligonos[nivel]
+
+    def filas_claves(self, claves):
+        return [self.posiciones[clave] for clave in claves if clave in self.posiciones]
+
+    def geojson(self, claves, nivel):
+        # FeatureCollection (WGS84) de los municipios con coordenadas redondeadas a POSICIONES_PIXEL por
+        # píxel del nivel; las fronteras compartidas se redondean igual de los dos lados
+        decimales = max(0, int(np.ceil(-np.log10(grados_pixel(nivel) / POSICIONES_PIXEL))))
+        features = []
+        for fila in self.filas_claves(claves):
+            poligono = self.poligonos(nivel)[fila]
+            if poligono.is_empty:
+                continue
+            poligono = shapely.transform(poligono, lambda xy: np.round(geograficas(xy), decimales))
+            features.append({'type': 'Feature', 'id': int(self.claves[fila]), 'geometry': poligono.__geo_interface__,
+                             'properties': {'CVE_MUNICIPIO': int(self.claves[fila]), 'NOM_MUN': self.nombres[fila]}})
+        return {'type': 'FeatureCollection', 'features': features}
+
+    def topojson(self, claves, nivel):
+        # TopoJSON de los municipios con los arcos del nivel cuantizados (POSICIONES_PIXEL por píxel) y
+        # codificados como diferencias; cada frontera compartida va una sola vez
+        filas = set(self.filas_claves(claves))
+        validos = self.anillos_validos(nivel)
+        anillos = [anillo for anillo in np.flatnonzero(validos) if self.municipio[anillo] in filas]
+        usados = np.unique(np.concatenate([np.where(self.referencias[anillo] < 0, ~self.referencias[anillo], self.referencias[anillo])
+                                           for anillo in anillos])) if anillos else np.array([], dtype=np.int64)
+        nuevo = {int(arco): i for i, arco in enumerate(usados)}
+        arcos = self.coordenadas_arcos(nivel)
+        escala = grados_pixel(nivel) / POSICIONES_PIXEL
+        geograficos = [geograficas(arcos[arco]) for arco in usados]
+        origen = np.min([arco.min(axis=0) for arco in geograficos], axis=0) if geograficos else np.zeros(2)
+        arcos_topologia = []
+        for arco in geograficos:
+            cuantizado = np.rint((arco - origen) / escala).astype(np.int64)
+            cuantizado = cuantizado[np.r_[True, (cuantizado[1:] != cuantizado[:-1]).any(axis=1)]]
+            if len(cuantizado) == 1:
+                cuantizado = np.repeat(cuantizado, 2, axis=0)
+            arcos_topologia.append(np.diff(cuantizado, axis=0, prepend=[[0, 0]]).tolist())
+        geometrias = {}
+        for anillo in anillos:
+            referencias = [~nuevo[int(~arco)] if arco < 0 else nuevo[int(arco)] for arco in self.referencias[anillo]]
+            partes = geometrias.setdefault(self.municipio[anillo], {})
+            partes.setdefault(self.parte[anillo], []).append(referencias)
+        return {
+            'type': 'Topology',
+            'transform': {'scale': [escala, escala], 'translate': origen.tolist()},
+            'objects': {'municipios': {'type': 'GeometryCollection', 'geometries': [
+                {'type': 'MultiPolygon', 'id': int(self.claves[fila]), 'arcs': list(partes.values()),
+                 'properties': {'CVE_MUNICIPIO': int(self.claves[fila]), 'NOM_MUN': self.nombres[fila]}}
+                for fila, partes in geometrias.items()
+            ]}},
+            'arcs': arcos_topologia,
+        }
+
+
+@instrumentar
+def construir_topologia():
+    version = firma_archivos(fuentes_municipios())
+    arcos = cache_dataframe('topologia_arcos', fuentes_municipios(), lambda: _calcular_topologia(version)[0])
+    anillos = cache_dataframe('topologia_anillos', fuentes_municipios(), lambda: _calcular_topologia(version)[1])
+    return TopologiaMunicipios(arcos, anillos)
+
+
+@lru_cache(maxsize=1)
+def _topologia_municipios(version):
+    return construir_topologia()
+
+
+def topologia_municipios():
+    # Se vuelve a calcular cuando cambia el shapefile
+    return _topologia_municipios(firma_archivos(fuentes_municipios()))
@@ -1,23 +1,349 @@
+import argparse
+import json
+import logging
 import os
-import pandas as pd
-#Convertir archivo federal de CLUES a Parquet filtrando HGO e IMB
+import shutil
+import tempfile
+from datetime import date, datetime, time
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+from funciones import PARTICIONES_CLUES, PARTICIONES_HORARIOS, hash_archivo
+#Convertir archivo federal de CLUES a Parquet filtrando la entidad e IMB / SSH en una sola lectura
 directorio = os.path.dirname(os.path.abspath(__file__))
-excel_establecimientos = os.path.join(directorio, 'files', 'ESTABLECIMIENTO_SALUD_202501.xlsx')
-if os.path.exists(excel_establecimientos):
-    establecimientos = pd.read_excel(excel_establecimientos)
-    establecimientos = establecimientos[(establecimientos['CLAVE DE LA ENTIDAD'] == 13) & (establecimientos['NOMBRE DE LA INSTITUCION'] == "SERVICIOS DE SALUD IMSS BIENESTAR ") & (establecimientos['NOMBRE TIPO ESTABLECIMIENTO'] == "DE CONSULTA EXTERNA")]
-    ruta_parquet = os.path.join(directorio, 'files', 'ESTABLECIMIENTO_SALUD_202501.parquet')
-    establecimientos.to_parquet(ruta_parquet)
-    print(f"Archivo Parquet guardado en: {ruta_parquet}")
-else:
-    print(f"El archivo Excel no se encontró en: {excel_establecimientos}")
-
-
-excel_establecimientos_ssh = os.path.join(directorio, 'files', 'ESTABLECIMIENTO_SALUD_202501.xlsx')
-if os.path.exists(excel_establecimientos_ssh):
-    establecimientos_ssh = pd.read_excel(excel_establecimientos_ssh)
-    establecimientos_ssh = establecimientos_ssh[(establecimientos_ssh['CLAVE DE LA ENTIDAD'] == 13) & (establecimientos_ssh['NOMBRE DE LA INSTITUCION'] == "SECRETARIA DE SALUD") & 
-                                                (establecimientos_ssh['NOMBRE TIPO ESTABLECIMIENTO'] == "DE CONSULTA EXTERNA") & (establecimientos_ssh['CLAVE MOTIVO BAJA'] == 9)]
-    ruta_parquet_ssh = os.path.join(directorio, 'files', 'ESTABLECIMIENTO_SALUD_202501_SSH.parquet')
-    establecimientos_ssh.to_parquet(ruta_parquet_ssh)
-    print(f"Archivo Parquet guardado en: {ruta_parquet_ssh}")
\ No newline at end of file
+PERIODO = '202501'
+DATASET_CLUES = os.path.join(directorio, 'files', 'clues')
+DATASET_HORARIOS = os.path.join(directorio, 'files', 'clues_horarios')
+MANIFIESTO = os.path.join(DATASET_CLUES, '_manifiesto.json')
+TAMANO_LOTE = 5000  # Filas que se acumulan antes de escribir un row group
+
+# Tipos de las columnas numéricas del catálogo; el resto se guarda como texto
+COLUMNAS_ENTERAS = ['CLAVE DE LA ENTIDAD', 'CLAVE DEL MUNICIPIO', 'CLAVE DE LA LOCALIDAD', 'CLAVE DE LA JURISDICCION',
+                    'CLAVE DEL TIPO ESTABLECIMIENTO', 'CLAVE ESTATUS DE OPERACION', 'CLAVE NIVEL ATENCION',
+                    'CLAVE ESTRATO UNIDAD']
+COLUMNAS_DECIMALES = ['CLAVE TIPO DE VIALIDAD', 'CLAVE TIPO DE ASENTAMIENTO', 'CODIGO POSTAL',
+                      'TELEFONO 2 DEL ESTABLECIMIENTO', 'CLAVE UNIDAD MOVIL MARCA', 'UNIDAD MOVIL MODELO',
+                      'CLAVE UNIDAD MOVIL TIPOLOGIA', 'CLAVE TIPO OBRA', 'CLAVE PROPIEDAD DEL INMUEBLE',
+                      'LATITUD', 'LONGITUD', 'CLAVE MOTIVO BAJA']
+
+
+ENTIDAD = 13  # Entidad que se convierte por omisión (None = todas)
+
+logger = logging.getLogger(__name__)
+
+
+def es_imss_bienestar(fila, entidad=ENTIDAD):
+    return ((entidad is None or fila['CLAVE DE LA ENTIDAD'] == entidad)
+            and fila['NOMBRE DE LA INSTITUCION'] == "SERVICIOS DE SALUD IMSS BIENESTAR "
+            and fila['NOMBRE TIPO ESTABLECIMIENTO'] == "DE CONSULTA EXTERNA")
+
+
+def es_secretaria_salud(fila, entidad=ENTIDAD):
+    return ((entidad is None or fila['CLAVE DE LA ENTIDAD'] == entidad)
+            and fila['NOMBRE DE LA INSTITUCION'] == "SECRETARIA DE SALUD"
+            and fila['NOMBRE TIPO ESTABLECIMIENTO'] == "DE CONSULTA EXTERNA" and fila['CLAVE MOTIVO BAJA'] == 9)
+
+
+def salidas(periodo, entidad=ENTIDAD):
+    # Archivo de salida -> condición que debe cumplir cada fila de la hoja de establecimientos
+    return {
+        f'ESTABLECIMIENTO_SALUD_{periodo}.parquet': lambda fila: es_imss_bienestar(fila, entidad),
+        f'ESTABLECIMIENTO_SALUD_{periodo}_SSH.parquet': lambda fila: es_secretaria_salud(fila, entidad),
+    }
+
+
+def a_entero(valor):
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def a_decimal(valor):
+    if valor is None or valor == '':
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def a_texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, time):
+        return valor.strftime('%H:%M')
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def esquema_establecimientos(columnas):
+    campos = []
+    for columna in columnas:
+        if columna in COLUMNAS_ENTERAS:
+            campos.append(pa.field(columna, pa.int64()))
+        elif columna in COLUMNAS_DECIMALES:
+            campos.append(pa.field(columna, pa.float64()))
+        else:
+            campos.append(pa.field(columna, pa.string()))
+    return pa.schema(campos)
+
+
+def convertidor(columna):
+    if columna in COLUMNAS_ENTERAS:
+        return a_entero
+    if columna in COLUMNAS_DECIMALES:
+        return a_decimal
+    return a_texto
+
+
+class EscritorParquet:
+    # Acumula filas en columnas y escribe un row group cada TAMANO_LOTE filas,
+    # así la memoria depende del tamaño del lote y no del archivo completo
+    def __init__(self, ruta, esquema):
+        self.ruta = ruta
+        self.esquema = esquema
+        self.temporal = f"{ruta}.tmp"
+        self.escritor = pq.ParquetWriter(self.temporal, esquema)
+        self.columnas = {nombre: [] for nombre in esquema.names}
+        self.pendientes = 0
+        self.total = 0
+
+    def agregar(self, fila):
+        for nombre, lista in self.columnas.items():
+            lista.append(fila[nombre])
+        self.pendientes += 1
+        if self.pendientes >= TAMANO_LOTE:
+            self.vaciar()
+
+    def vaciar(self):
+        if self.pendientes:
+            self.escritor.write_table(pa.Table.from_pydict(self.columnas, schema=self.esquema))
+            self.total += self.pendientes
+            self.columnas = {nombre: [] for nombre in self.esquema.names}
+            self.pendientes = 0
+
+    def cerrar(self):
+        self.vaciar()
+        self.escritor.close()
+        os.replace(self.temporal, self.ruta)
+        logger.info("Archivo Parquet guardado en: %s (%d filas)", self.ruta, self.total)
+
+
+def filas(hoja):
+    # Iterar las filas de la hoja como diccionarios usando la primera fila como encabezado
+    iterador = hoja.iter_rows(values_only=True)
+    encabezado = [str(c).strip() if c is not None else '' for c in next(iterador)]
+    yield encabezado
+    for valores in iterador:
+        if valores is None or all(v is None for v in valores):
+            continue
+        yield dict(zip(encabezado, valores))
+
+
+def filas_establecimientos(hoja):
+    # Primero el esquema y después cada fila ya convertida a los tipos del esquema
+    iterador = filas(hoja)
+    columnas = [c for c in next(iterador) if c]
+    yield esquema_establecimientos(columnas)
+    convertidores = [(columna, convertidor(columna)) for columna in columnas]
+    for crudo in iterador:
+        yield {columna: convertir(crudo.get(columna)) for columna, convertir in convertidores}
+
+
+def filas_horarios(hoja):
+    iterador = filas(hoja)
+    next(iterador)
+    for crudo in iterador:
+        inicio = a_texto(crudo.get('HORA INICIO'))
+        if inicio is None:
+            continue
+        fin = a_texto(crudo.get('HORA FIN'))
+        yield {
+            'CLUES': a_texto(crudo.get('CLUES')),
+            'HORA INICIO': inicio,
+            'HORA FIN': fin,
+            'HORARIO': f"De {inicio} a {fin}",
+        }
+
+
+ESQUEMA_HORARIOS = pa.schema([(c, pa.string()) for c in ['CLUES', 'HORA INICIO', 'HORA FIN', 'HORARIO']])
+
+
+def convertir_establecimientos(hoja, periodo, entidad=ENTIDAD):
+    iterador = filas_establecimientos(hoja)
+    esquema = next(iterador)
+    escritores = {
+        nombre: (EscritorParquet(os.path.join(directorio, 'files', nombre), esquema), condicion)
+        for nombre, condicion in salidas(periodo, entidad).items()
+    }
+    for fila in iterador:
+        for escritor, condicion in escritores.values():
+            if condicion(fila):
+                escritor.agregar(fila)
+    for escritor, _ in escritores.values():
+        escritor.cerrar()
+
+
+def convertir_horarios(hoja, periodo):
+    # Antes se hacía a mano en data.ipynb: CLUES, HORA INICIO, HORA FIN y el texto HORARIO
+    ruta = os.path.join(directorio, 'files', f'ESTABLECIMIENTO_SALUD_{periodo}_horarios.parquet')
+    escritor = EscritorParquet(ruta, ESQUEMA_HORARIOS)
+    for fila in filas_horarios(hoja):
+        escritor.agregar(fila)
+    escritor.cerrar()
+
+
+def convertir(ruta_excel, periodo, entidad=ENTIDAD):
+    # read_only hace que openpyxl lea las hojas como flujo de filas en vez de cargar todo el libro
+    libro = load_workbook(ruta_excel, read_only=True, data_only=True)
+    try:
+        convertir_establecimientos(libro.worksheets[0], periodo, entidad)
+        hoja_horarios = f'HORARIOS_{periodo}'
+        if hoja_horarios in libro.sheetnames:
+            convertir_horarios(libro[hoja_horarios], periodo)
+        else:
+            logger.warning("El libro no contiene la hoja %s", hoja_horarios)
+    finally:
+        libro.close()
+
+
+def lotes(iterador, esquema, columnas_extra=None):
+    # Agrupar filas en RecordBatch de TAMANO_LOTE filas para escribir el dataset sin cargarlo completo
+    columnas_extra = columnas_extra or {}
+    nombres = esquema.names
+    columnas = {nombre: [] for nombre in nombres}
+    for fila in iterador:
+        for nombre in nombres:
+            columnas[nombre].append(columnas_extra[nombre](fila) if nombre in columnas_extra else fila[nombre])
+        if len(columnas[nombres[0]]) >= TAMANO_LOTE:
+            yield pa.RecordBatch.from_pydict(columnas, schema=esquema)
+            columnas = {nombre: [] for nombre in nombres}
+    if columnas[nombres[0]]:
+        yield pa.RecordBatch.from_pydict(columnas, schema=esquema)
+
+
+def leer_manifiesto():
+    if os.path.exists(MANIFIESTO):
+        with open(MANIFIESTO, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    return {'periodos': {}}
+
+
+def hash_particion(ruta):
+    return [hash_archivo(os.path.join(ruta, nombre)) for nombre in sorted(os.listdir(ruta))]
+
+
+def publicar_particiones(origen, destino, periodo, anteriores):
+    # Mover a su lugar solo las particiones cuyo contenido cambió; devuelve los hashes nuevos
+    hashes = {}
+    base = os.path.join(origen, f"periodo={periodo}")
+    for raiz, carpetas, archivos in os.walk(base):
+        if carpetas or not archivos:
+            continue
+        relativa = os.path.relpath(raiz, origen)
+        hashes[relativa] = hash_particion(raiz)
+        final = os.path.join(destino, relativa)
+        if anteriores.get(relativa) == hashes[relativa] and os.path.isdir(final):
+            continue
+        if os.path.isdir(final):
+            shutil.rmtree(final)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        shutil.move(raiz, final)
+        logger.info("Partición actualizada: %s", final)
+    # Particiones que ya no existen en la nueva versión del periodo
+    for relativa in set(anteriores) - set(hashes):
+        final = os.path.join(destino, relativa)
+        if os.path.isdir(final):
+            shutil.rmtree(final)
+            logger.info("Partición eliminada: %s", final)
+    return hashes
+
+
+def convertir_incremental(ruta_excel, periodo):
+    # Escribe el catálogo completo del periodo particionado por periodo/entidad/institución;
+    # si el libro no cambió desde la última corrida no se vuelve a leer
+    manifiesto = leer_manifiesto()
+    registro = manifiesto['periodos'].get(periodo, {})
+    info = os.stat(ruta_excel)
+    fuente = {'tamano': info.st_size, 'mtime': info.st_mtime_ns}
+    anterior = registro.get('fuente', {})
+    mismo_tamano = anterior.get('tamano') == info.st_size
+    # El hash (leer todo el libro) solo hace falta si cambió la fecha; se calcula una sola vez
+    if not (mismo_tamano and anterior.get('mtime') == info.st_mtime_ns):
+        fuente['hash'] = hash_archivo(ruta_excel)
+    if mismo_tamano and (anterior.get('mtime') == info.st_mtime_ns or anterior.get('hash') == fuente['hash']):
+        logger.info("El periodo %s no cambió; se omite la conversión", periodo)
+        return
+
+    os.makedirs(DATASET_CLUES, exist_ok=True)
+    os.makedirs(DATASET_HORARIOS, exist_ok=True)
+    # Los directorios temporales empiezan con "." para que pyarrow los ignore al leer el dataset
+    temporal_clues = tempfile.mkdtemp(prefix='.tmp-', dir=DATASET_CLUES)
+    temporal_horarios = tempfile.mkdtemp(prefix='.tmp-', dir=DATASET_HORARIOS)
+    libro = load_workbook(ruta_excel, read_only=True, data_only=True)
+    try:
+        iterador = filas_establecimientos(libro.worksheets[0])
+        esquema = next(iterador)
+        esquema_dataset = esquema
+        for campo in PARTICIONES_CLUES.schema:
+            esquema_dataset = esquema_dataset.append(campo)
+        extra = {
+            'periodo': lambda fila: periodo,
+            'entidad': lambda fila: fila['CLAVE DE LA ENTIDAD'],
+            'institucion': lambda fila: (fila['CLAVE DE LA INSTITUCION'] or 'NA').strip(),
+        }
+        # use_threads=False mantiene el orden de las filas y hace comparables los hashes entre corridas
+        ds.write_dataset(lotes(iterador, esquema_dataset, extra), temporal_clues, schema=esquema_dataset,
+                         format='parquet', partitioning=PARTICIONES_CLUES, use_threads=False,
+                         max_rows_per_group=TAMANO_LOTE, basename_template='parte-{i}.parquet')
+
+        hoja_horarios = f'HORARIOS_{periodo}'
+        if hoja_horarios in libro.sheetnames:
+            esquema_horarios = ESQUEMA_HORARIOS.append(pa.field('periodo', pa.string()))
+            ds.write_dataset(lotes(filas_horarios(libro[hoja_horarios]), esquema_horarios, {'periodo': lambda fila: periodo}),
+                             temporal_horarios, schema=esquema_horarios, format='parquet',
+                             partitioning=PARTICIONES_HORARIOS, use_threads=False,
+                             max_rows_per_group=TAMANO_LOTE, basename_template='parte-{i}.parquet')
+        else:
+            logger.warning("El libro no contiene la hoja %s", hoja_horarios)
+
+        particiones = publicar_particiones(temporal_clues, DATASET_CLUES, periodo, registro.get('particiones', {}))
+        horarios = publicar_particiones(temporal_horarios, DATASET_HORARIOS, periodo, registro.get('horarios', {}))
+    finally:
+        libro.close()
+        shutil.rmtree(temporal_clues, ignore_errors=True)
+        shutil.rmtree(temporal_horarios, ignore_errors=True)
+
+    manifiesto['periodos'][periodo] = {'fuente': fuente, 'particiones': particiones, 'horarios': horarios}
+    temporal = f"{MANIFIESTO}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=2)
+    os.replace(temporal, MANIFIESTO)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertir el catálogo CLUES de Excel a Parquet")
+    parser.add_argument('--periodo', default=PERIODO, help="Periodo AAAAMM del archivo ESTABLECIMIENTO_SALUD_<periodo>.xlsx")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Escribir el dataset particionado files/clues en lugar de los Parquet de una entidad")
+    parser.add_argument('--entidad', type=int, default=ENTIDAD,
+                        help="Clave INEGI de la entidad de los Parquet (0 = todas las entidades)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    excel_establecimientos = os.path.join(directorio, 'files', f'ESTABLECIMIENTO_SALUD_{args.periodo}.xlsx')
+    if not os.path.exists(excel_establecimientos):
+        logger.error("El archivo Excel no se encontró en: %s", excel_establecimientos)
+    elif args.incremental:
+        convertir_incremental(excel_establecimientos, args.periodo)
+    else:
+        convertir(excel_establecimientos, args.periodo, args.entidad or None)
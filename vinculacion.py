@@ -0,0 +1,121 @@
+# vinculacion.py
+# Vinculación de registros entre catálogos CLUES (por ejemplo IMSS Bienestar contra Secretaría de Salud)
+# por nombre de la unidad, sin exigir que el nombre esté escrito exactamente igual
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+# Bloques en los que se buscan candidatos, del más estricto al más amplio: solo se comparan unidades
+# del mismo bloque, así nunca se compara cada unidad contra todo el catálogo
+BLOQUES = [
+    ['CLAVE DE LA ENTIDAD', 'CLAVE DEL MUNICIPIO', 'CLAVE DE LA LOCALIDAD'],
+    ['CLAVE DE LA ENTIDAD', 'CLAVE DEL MUNICIPIO'],
+]
+UMBRAL = 0.6  # Similitud mínima (Dice de trigramas) para aceptar una pareja
+MARGEN = 0.05  # Si el segundo mejor candidato queda a menos de esto del primero, la pareja es ambigua
+
+
+@lru_cache(maxsize=None)
+def limpiar_nombre(nombre):
+    # Mayúsculas, sin acentos y sin signos de puntuación
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', unidecode(str(nombre)).upper()).split())
+
+
+def trigramas(nombres):
+    # Tabla larga (fila, trigrama) con los trigramas distintos de cada nombre; cada palabra se rellena
+    # con espacios para que el inicio y el final de las palabras cuenten
+    codigos, unicos = pd.factorize(nombres)
+    listas = []
+    for nombre in unicos:
+        texto = ' ' + limpiar_nombre(nombre).replace(' ', '  ') + ' '
+        listas.append(sorted({texto[i:i + 3] for i in range(len(texto) - 2)}))
+    por_nombre = pd.Series(listas, dtype=object).explode().dropna()
+    tabla = pd.DataFrame({'nombre': por_nombre.index.to_numpy(), 'trigrama': por_nombre.to_numpy()})
+    filas = pd.DataFrame({'fila': np.arange(len(codigos)), 'nombre': codigos})
+    return filas[filas['nombre'] >= 0].merge(tabla, on='nombre')[['fila', 'trigrama']]
+
+
+def bloques(izquierda, derecha, columnas):
+    # Mismo código de bloque para las dos tablas
+    claves = pd.concat([izquierda[columnas], derecha[columnas]], ignore_index=True)
+    codigos = claves.groupby(columnas, dropna=False, sort=False).ngroup().to_numpy()
+    return codigos[:len(izquierda)], codigos[len(izquierda):]
+
+
+def vincular(izquierda, derecha, columna_nombre='NOMBRE DE LA UNIDAD', columna_clave='CLUES', sufijo='_SSH',
+             bloques_busqueda=BLOQUES):
+    # Para cada fila de izquierda devuelve la clave de su pareja en derecha, la similitud (1 = mismo nombre)
+    # y si la pareja es ambigua (otro candidato casi igual de parecido, o la misma pareja para varias filas).
+    # Nunca agrega filas: cada fila de izquierda tiene a lo más una pareja
+    trigramas_izq = trigramas(izquierda[columna_nombre])
+    trigramas_der = trigramas(derecha[columna_nombre])
+    # Trigramas como enteros para que las uniones sean sobre números
+    codigos, _ = pd.factorize(pd.concat([trigramas_izq['trigrama'], trigramas_der['trigrama']], ignore_index=True))
+    trigramas_izq['trigrama'] = codigos[:len(trigramas_izq)]
+    trigramas_der['trigrama'] = codigos[len(trigramas_izq):]
+    total_izq = np.bincount(trigramas_izq['fila'], minlength=len(izquierda))
+    total_der = np.bincount(trigramas_der['fila'], minlength=len(derecha))
+
+    pareja = np.full(len(izquierda), -1)
+    similitud = np.full(len(izquierda), np.nan)
+    ambigua = np.zeros(len(izquierda), dtype=bool)
+    for columnas in bloques_busqueda:
+        pendientes = pareja < 0
+        if not pendientes.any():
+            break
+        bloque_izq, bloque_der = bloques(izquierda, derecha, columnas)
+        izq = trigramas_izq[pendientes[trigramas_izq['fila'].to_numpy()]]
+        izq = izq.assign(bloque=bloque_izq[izq['fila'].to_numpy()])
+        der = trigramas_der.assign(bloque=bloque_der[trigramas_der['fila'].to_numpy()])
+        # Solo se generan los pares que comparten bloque y al menos un trigrama
+        pares = izq.merge(der, on=['bloque', 'trigrama'], suffixes=('_izq', '_der'))
+        if pares.empty:
+            continue
+        pares = pares.groupby(['fila_izq', 'fila_der'], sort=False).size().rename('comunes').reset_index()
+        pares['dice'] = 2 * pares['comunes'] / (total_izq[pares['fila_izq']] + total_der[pares['fila_der']])
+        pares = pares.sort_values(['fila_izq', 'dice', 'fila_der'], ascending=[True, False, True], kind='mergesort')
+        pares['orden'] = pares.groupby('fila_izq').cumcount()
+        mejores = pares[pares['orden'] == 0].set_index('fila_izq')
+        segundos = pares[pares['orden'] == 1].set_index('fila_izq')['dice']
+        mejores = mejores[mejores['dice'] >= UMBRAL]
+        if mejores.empty:
+            continue
+        filas = mejores.index.to_numpy()
+        pareja[filas] = mejores['fila_der'].to_numpy()
+        similitud[filas] = mejores['dice'].to_numpy()
+        ambigua[filas] = (segundos.reindex(mejores.index) >= mejores['dice'] - MARGEN).to_numpy()
+
+    # La misma fila de derecha como pareja de varias filas de izquierda también es ambigua
+    asignadas = pareja >= 0
+    repetidas = pd.Series(pareja[asignadas]).duplicated(keep=False).to_numpy()
+    ambigua[np.flatnonzero(asignadas)[repetidas]] = True
+
+    claves = derecha[columna_clave].to_numpy(dtype=object)
+    return pd.DataFrame({
+        f'{columna_clave}{sufijo}': np.where(asignadas, claves[np.maximum(pareja, 0)], None),
+        f'CONFIANZA{sufijo}': np.round(similitud, 4),
+        f'AMBIGUO{sufijo}': ambigua,
+    }, index=izquierda.index)
+
+
+def resumen_vinculacion(df, sufijo='_SSH'):
+    confianza = df[f'CONFIANZA{sufijo}']
+    return {
+        'unidades': len(df),
+        'exactas': int((confianza == 1).sum()),
+        'aproximadas': int(((confianza < 1) & confianza.notna()).sum()),
+        'ambiguas': int(df[f'AMBIGUO{sufijo}'].sum()),
+        'sin_pareja': int(confianza.isna().sum()),
+    }
+
+
+if __name__ == "__main__":
+    # Reporte de la vinculación del periodo actual: conteos y parejas que conviene revisar
+    from funciones import procesar_datos
+    df = procesar_datos()
+    print(resumen_vinculacion(df))
+    revisar = df[(df['CONFIANZA_SSH'] < 1) | df['AMBIGUO_SSH'] | df['CONFIANZA_SSH'].isna()]
+    print(revisar[['CLUES', 'CLUES_SSH', 'CONFIANZA_SSH', 'AMBIGUO_SSH', 'MUNICIPIO', 'NOMBRE DE LA UNIDAD']]
+          .to_string(index=False))